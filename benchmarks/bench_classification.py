@@ -0,0 +1,241 @@
+"""
+End-to-end benchmark of ticket classification and the automated replies,
+against the local fake LLM (benchmarks/fake_llm_server.py).
+
+Builds N open tickets with seeded multilingual messages and runs them through
+`categorise_ticket` (and, for a share of already-categorised tickets,
+`handle_categorised_unforwarded_ticket`) concurrently, as the poller would.
+`query_nano_gpt` makes real HTTP calls to the fake server, so client session
+setup, JSON handling and the injected latency/429/error mix are all included.
+
+The database, Bot and admin forwarding (Telethon) are in-memory fakes, and the
+6-8s pauses between automated reply messages are skipped unless
+`--reply-delays` is given.
+
+Usage:
+    python -m benchmarks.bench_classification [--tickets 200] [--latency-ms 900 --rate-429 0.05]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+import types
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from config.config import Config
+from benchmarks.fake_llm_server import add_server_arguments, server_from_args
+from models import Ticket
+from utils.logger import logger
+
+SAMPLE_MESSAGES = [
+    "How do I pay with crypto?",
+    "Kā maksāt ar karti?",
+    "Как оплатить заказ?",
+    "I can't find the drop, looked everywhere",
+    "Neatrodu dropu",
+    "Не нашел закладку",
+    "Ei leia seda kohta",
+    "Is the product still available in Riga?",
+    "Vai prece vēl ir pieejama?",
+    "Когда будет restock?",
+    "When will you have more?",
+    "How long does it take to arrive?",
+    "Thanks, found it!",
+    "Paldies!",
+    "Спасибо",
+    "hello??",
+    "(photo)",
+]
+
+
+class FakeBot:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+
+    async def _call(self):
+        await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+        await self._call()
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._call()
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.sent += 1
+        await self._call()
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.sent += 1
+        await self._call()
+        return []
+
+
+class FakeDatabase:
+    """Answers the DatabaseController calls made by the classifier and replies."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.categories: dict[int, tuple[str, str]] = {}
+        self.calls = Counter()
+
+    async def _call(self, name: str):
+        self.calls[name] += 1
+        await asyncio.sleep(self.latency)
+
+    async def get_user_by_id(self, user_id):
+        await self._call("get_user_by_id")
+        return {"user_id": user_id, "username": f"user{user_id}"}
+
+    async def transition_ticket(self, ticket_id, replied_upto=None, lang=None, category=None, closed=None, forwarded=None):
+        await self._call("transition_ticket")
+        if category is not None:
+            self.categories[ticket_id] = (lang, category)
+
+    async def get_previous_users_category_key(self, user_id):
+        await self._call("get_previous_users_category_key")
+        return None
+
+    async def get_bot_settings(self):
+        await self._call("get_bot_settings")
+        return {}
+
+    async def get_cached_media_ref(self, content_hash, owner):
+        await self._call("get_cached_media_ref")
+        return "fake-file-id"
+
+    def __getattr__(self, name):
+        # Writes whose result the handlers ignore (close_support_ticket, mute_user, ...)
+        async def call(*args, **kwargs):
+            await self._call(name)
+        return call
+
+
+def make_tickets(args) -> list[Ticket]:
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    tickets = []
+    message_pk = 0
+    for ticket_id in range(1, args.tickets + 1):
+        user_id = 9_000_000_000 + ticket_id
+        categorised = rng.random() < args.categorised_ratio
+        messages = []
+        for n in range(rng.randint(1, args.max_messages)):
+            message_pk += 1
+            messages.append({
+                "id": message_pk,
+                "ticket_id": ticket_id,
+                "user_id": user_id,
+                "message_id": n + 1,
+                "user_text": rng.choice(SAMPLE_MESSAGES[:-1] if categorised else SAMPLE_MESSAGES),
+                "replied": False,
+                "is_deleted": False,
+                "created_at": now - timedelta(minutes=5),
+            })
+        tickets.append(Ticket.from_record({
+            "ticket_id": ticket_id,
+            "user_id": user_id,
+            "closed": False,
+            "messages_forwarded": False,
+            "support_issue": "cant_find_product_or_drop_or_dead_drop" if categorised else None,
+            "lang": rng.choice(["lv", "eng", "ru", "ee"]) if categorised else None,
+            "created_at": now,
+            "messages": messages,
+        }))
+    return tickets
+
+
+def install_fakes(args, forwarded: list[int]):
+    """Swap admin forwarding (Telethon) and reply pauses for in-process fakes."""
+    from handlers import handle_unforwarded_tickets as poller
+    from handlers.automated_replies import misc_replies, not_received_drop, product_availability
+
+    async def fake_forward(db, bot, user, ticket, lang):
+        forwarded.append(ticket.ticket_id)
+
+    poller.forward_ticket_to_admin = fake_forward
+    for key, handler in list(poller.USER_CONVERSATIONS.items()):
+        if getattr(handler, "__name__", "") == "forward_ticket_to_admin":
+            poller.USER_CONVERSATIONS[key] = fake_forward
+
+    if not args.reply_delays:
+        async def no_sleep(_):
+            await asyncio.sleep(0)
+        for module in (misc_replies, not_received_drop, product_availability):
+            module.asyncio = types.SimpleNamespace(sleep=no_sleep)
+
+    return poller
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+async def run(args):
+    server = server_from_args(args)
+    Config.NANO_GPT_API_URL = await server.start()
+
+    forwarded: list[int] = []
+    poller = install_fakes(args, forwarded)
+    db = FakeDatabase(args.db_latency)
+    bot = FakeBot(args.bot_latency)
+    tickets = make_tickets(args)
+    latencies: list[float] = []
+
+    async def process(ticket: Ticket):
+        started = time.perf_counter()
+        if ticket.support_issue:
+            await poller.handle_categorised_unforwarded_ticket(db, bot, ticket)
+        else:
+            await poller.categorise_ticket(db, bot, ticket)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(process(ticket) for ticket in tickets))
+    finally:
+        elapsed = time.perf_counter() - started
+        await server.stop()
+
+    uncategorised = [t for t in tickets if not t.support_issue]
+    categories = Counter(category for _, category in db.categories.values())
+    print(f"tickets                  {len(tickets)} ({len(uncategorised)} to categorise)")
+    print(f"seconds                  {elapsed:.3f}")
+    print(f"throughput_per_s         {len(tickets) / elapsed:.1f}")
+    print(f"p50_ms                   {percentile(latencies, 50) * 1000:.1f}")
+    print(f"p95_ms                   {percentile(latencies, 95) * 1000:.1f}")
+    print(f"p99_ms                   {percentile(latencies, 99) * 1000:.1f}")
+    print(f"llm_requests             {dict(server.stats)}")
+    print(f"categorised              {len(db.categories)}/{len(uncategorised)}")
+    print(f"forwarded_to_admin       {len(forwarded)}")
+    print(f"bot_messages             {bot.sent}")
+    for category, count in categories.most_common():
+        print(f"  {category:<45} {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--max-messages", type=int, default=3, help="max messages per ticket")
+    parser.add_argument("--categorised-ratio", type=float, default=0.2,
+                        help="share of tickets that already have a support_issue (resolution check path)")
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--bot-latency", type=float, default=0.05)
+    parser.add_argument("--reply-delays", action="store_true", help="keep the 6-8s pauses between reply messages")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    # Per-ticket INFO lines would flood the output; failures still show
+    logger.setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Memory/allocation benchmark: dict(Record) tickets vs slotted Ticket/SupportMessage models.
+
+Simulates what `get_active_support_tickets` hands to the poller for N open
+tickets. asyncpg Records are stood in for by plain dicts (Record supports the
+same `record["column"]` access used by `from_record`).
+
+Usage:
+    python -m benchmarks.bench_ticket_models [--tickets 10000] [--messages 4]
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from models import Ticket
+
+
+def make_rows(tickets: int, messages_per_ticket: int) -> list[dict]:
+    """Build fake joined rows shaped like the `array_agg(m ...)` query result."""
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    rows = []
+    message_pk = 0
+    for ticket_id in range(1, tickets + 1):
+        user_id = 100_000_000 + ticket_id
+        messages = []
+        for n in range(messages_per_ticket):
+            message_pk += 1
+            messages.append({
+                "id": message_pk,
+                "ticket_id": ticket_id,
+                "user_id": user_id,
+                "message_id": 1000 + n,
+                "user_text": f"message {n} for ticket {ticket_id}",
+                "replied": False,
+                "is_deleted": False,
+                "created_at": now - timedelta(seconds=rng.randint(0, 3600)),
+            })
+        rows.append({
+            "ticket_id": ticket_id,
+            "user_id": user_id,
+            "closed": False,
+            "messages_forwarded": False,
+            "support_issue": None,
+            "lang": None,
+            "created_at": now,
+            "messages": messages,
+        })
+    return rows
+
+
+def as_dicts(rows: list[dict]) -> list[dict]:
+    """Old path: dict(row) per ticket, messages left as per-row mappings, sorted every poll."""
+    tickets = []
+    for row in rows:
+        ticket = dict(row)
+        ticket["messages"] = [dict(m) for m in row["messages"]]
+        ticket["messages"].sort(key=lambda msg: msg["message_id"])
+        tickets.append(ticket)
+    return tickets
+
+
+def as_models(rows: list[dict]) -> list[Ticket]:
+    """New path: slotted models, ordering already done by Postgres."""
+    return [Ticket.from_record(row) for row in rows]
+
+
+def measure(label: str, build, rows: list[dict]) -> None:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(rows)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<8} retained={current / 1024 / 1024:8.2f} MiB  "
+        f"peak={peak / 1024 / 1024:8.2f} MiB  build={elapsed * 1000:8.1f} ms  "
+        f"tickets={len(result)}"
+    )
+    del result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=4, help="messages per ticket")
+    args = parser.parse_args()
+
+    rows = make_rows(args.tickets, args.messages)
+    print(f"{args.tickets} open tickets x {args.messages} messages")
+    measure("dict", as_dicts, rows)
+    measure("slots", as_models, rows)
+
+
+if __name__ == "__main__":
+    main()
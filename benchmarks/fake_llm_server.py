@@ -0,0 +1,304 @@
+"""
+Local stand-in for the nano-gpt chat completions API, for offline benchmarks.
+
+Speaks the OpenAI chat-completions schema on POST /api/v1/chat/completions
+(same path as nano-gpt), so pointing NANO_GPT_API_URL at it is enough for
+`query_nano_gpt`. Answers are deterministic and derived from the prompt:
+    - categorisation prompts ("lang:category") get a keyword-based
+      `lang:category` answer, using only categories listed in the prompt;
+      batched prompts get the same per ticket as a JSON array
+    - resolution prompts ("Complaint or Resolved") get Resolved for thanks,
+      Complaint otherwise
+    - translation prompts asking for "exactly N lines" get N distinct lines
+
+Time to first token follows a fixed, uniform or lognormal distribution, then
+the answer is generated in ~token chunks (`--chunk-ms` each), streamed as SSE
+when the request asks for `stream`. Stop sequences are honoured, and
+`--trailing-chars` makes structured answers ramble on afterwards, as models
+often do. A share of requests can be answered with 429 or 500. All randomness
+comes from `--seed`.
+GET /stats returns request counters as JSON.
+
+Usage:
+    python -m benchmarks.fake_llm_server [--port 8089] [--latency lognormal --latency-ms 900 --spread 0.4]
+    NANO_GPT_API_URL=http://127.0.0.1:8089/api/v1/chat/completions python main.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+
+from aiohttp import web
+
+COMPLETIONS_PATH = "/api/v1/chat/completions"
+CHUNK_CHARS = 4  # roughly one token per streamed chunk
+
+# First match wins; checked against the lower-cased user messages
+CATEGORY_KEYWORDS = [
+    ("user_says_thanks", ("thank", "paldies", "aitäh", "спасибо")),
+    ("cant_find_product_or_drop_or_dead_drop", ("can't find", "cant find", "neatrodu", "ei leia", "не нашел", "не нашёл")),
+    ("dont_know_how_to_pay", ("how to pay", "how do i pay", "kā maksāt", "kuidas maksta", "как оплатить")),
+    ("restock_request_for_product_or_location", ("restock", "papildin", "when will you have", "когда будет")),
+    ("is_product_still_available", ("available", "pieejam", "saadaval", "в наличии")),
+    ("what_is_usual_product_arrival_time", ("how long", "cik ilgi", "kui kaua", "сколько ждать")),
+]
+THANKS_KEYWORDS = CATEGORY_KEYWORDS[0][1]
+
+LATVIAN_CHARS = set("āēīūčšžģķļņ")
+ESTONIAN_CHARS = set("õäöü")
+
+
+class LatencyModel:
+    """Samples a response delay in seconds."""
+
+    def __init__(self, kind: str, median_ms: float, spread: float, rng: random.Random):
+        self.kind = kind
+        self.median = median_ms / 1000
+        self.spread = spread
+        self._rng = rng
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.median
+        if self.kind == "uniform":
+            return self._rng.uniform(self.median * (1 - self.spread), self.median * (1 + self.spread))
+        # lognormal: long right tail like real LLM latencies
+        return self.median * self._rng.lognormvariate(0, self.spread)
+
+
+def _quoted_block_after(prompt: str, marker: str) -> str:
+    match = re.search(re.escape(marker) + r'[^"]*"""(.*?)"""', prompt, re.S)
+    return match.group(1) if match else ""
+
+
+def detect_lang(text: str) -> str:
+    lowered = text.lower()
+    if re.search("[а-яё]", lowered):
+        return "ru"
+    if LATVIAN_CHARS & set(lowered):
+        return "lv"
+    if ESTONIAN_CHARS & set(lowered):
+        return "ee"
+    if re.search("[a-z]", lowered):
+        return "eng"
+    return "other"
+
+
+def classify_text(text: str, categories: set[str]) -> tuple[str, str]:
+    lowered = text.lower()
+    category = next(
+        (name for name, words in CATEGORY_KEYWORDS if name in categories and any(w in lowered for w in words)),
+        "other",
+    )
+    return detect_lang(text), category
+
+
+def answer_for(prompt: str) -> str:
+    """Deterministic answer for the prompts the bot sends."""
+    if "lang:category" in prompt:
+        categories = set(_quoted_block_after(prompt, "categories").split())
+        lang, category = classify_text(_quoted_block_after(prompt, "User messages:"), categories)
+        return f"{lang}:{category}"
+
+    tickets = re.search(r"Tickets:\n(\[.*?\])\n\nRespond", prompt, re.S)
+    if tickets:
+        categories = set(_quoted_block_after(prompt, "categories").split())
+        answers = []
+        for ticket in json.loads(tickets.group(1)):
+            lang, category = classify_text(ticket["messages"], categories)
+            answers.append({"ticket_id": ticket["ticket_id"], "lang": lang, "category": category})
+        return json.dumps(answers, ensure_ascii=False)
+
+    if "Complaint or Resolved" in prompt:
+        text = _quoted_block_after(prompt, "User messages:").lower()
+        return "Resolved" if any(word in text for word in THANKS_KEYWORDS) else "Complaint"
+
+    lines = re.search(r"exactly (\d+) lines", prompt)
+    if lines:
+        return "\n".join(f"Translated and rephrased message number {n}" for n in range(1, int(lines.group(1)) + 1))
+
+    return "Translated and rephrased message"
+
+
+class FakeLLMServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8089,
+        latency: LatencyModel | None = None,
+        rate_429: float = 0.0,
+        rate_error: float = 0.0,
+        chunk_ms: float = 0.0,
+        trailing_chars: int = 0,
+        seed: int = 42,
+    ):
+        self.host = host
+        self.port = port
+        self._rng = random.Random(seed)
+        self.latency = latency or LatencyModel("fixed", 0, 0, self._rng)
+        self.rate_429 = rate_429
+        self.rate_error = rate_error
+        self.chunk_seconds = chunk_ms / 1000
+        self.trailing_chars = trailing_chars
+        self.stats = Counter()
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}{COMPLETIONS_PATH}"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post(COMPLETIONS_PATH, self._handle_completion)
+        app.router.add_get("/stats", self._handle_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_stats(self, _: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    async def _handle_completion(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        payload = await request.json()
+        # Decide the outcome up front so a given seed gives the same sequence
+        roll = self._rng.random()
+        first_token_delay = self.latency.sample()
+
+        if roll < self.rate_429 + self.rate_error:
+            await asyncio.sleep(first_token_delay)
+            if roll < self.rate_429:
+                self.stats["rate_limited"] += 1
+                return web.json_response(
+                    {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                    status=429,
+                    headers={"Retry-After": "1"},
+                )
+            self.stats["errors"] += 1
+            return web.json_response({"error": {"message": "Injected failure", "type": "server_error"}}, status=500)
+
+        prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []) if m.get("role") == "user")
+        content = answer_for(prompt)
+        if self.trailing_chars and is_structured(prompt):
+            # Models often keep going after a structured answer; stop sequences/early close should cut this
+            content += ("\n\nThe answer is based on the wording of the messages." * 100)[:self.trailing_chars]
+        content = apply_stop(content, payload.get("stop") or ())
+        chunks = [content[i:i + CHUNK_CHARS] for i in range(0, len(content), CHUNK_CHARS)]
+
+        if payload.get("stream"):
+            return await self._stream(request, payload, chunks, first_token_delay)
+
+        await asyncio.sleep(first_token_delay + len(chunks) * self.chunk_seconds)
+        self.stats["ok"] += 1
+        return web.json_response({
+            "id": f"chatcmpl-fake-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4,
+            },
+        })
+
+    async def _stream(self, request: web.Request, payload: dict, chunks: list[str], first_token_delay: float):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        await asyncio.sleep(first_token_delay)
+        try:
+            for chunk in chunks:
+                event = {
+                    "id": f"chatcmpl-fake-{self.stats['requests']}",
+                    "object": "chat.completion.chunk",
+                    "model": payload.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+                }
+                await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+                await asyncio.sleep(self.chunk_seconds)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            self.stats["ok"] += 1
+        except ConnectionResetError:
+            # Client had its answer and closed the stream
+            self.stats["stream_closed_by_client"] += 1
+        return response
+
+
+def is_structured(prompt: str) -> bool:
+    return "lang:category" in prompt or "Tickets:" in prompt or "Complaint or Resolved" in prompt
+
+
+def apply_stop(text: str, stop) -> str:
+    content_start = len(text) - len(text.lstrip())
+    indexes = [text.find(sequence, content_start) for sequence in stop]
+    indexes = [index for index in indexes if index != -1]
+    return text[:min(indexes)] if indexes else text
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=900, help="median response time")
+    parser.add_argument("--spread", type=float, default=0.4, help="lognormal sigma / uniform +- fraction")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--rate-error", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--chunk-ms", type=float, default=10, help="generation time per ~token chunk")
+    parser.add_argument("--trailing-chars", type=int, default=0,
+                        help="extra text generated after structured answers (cut by stop/early close)")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def server_from_args(args, host: str = "127.0.0.1", port: int = 0) -> FakeLLMServer:
+    rng = random.Random(args.seed)
+    return FakeLLMServer(
+        host=host,
+        port=port,
+        latency=LatencyModel(args.latency, args.latency_ms, args.spread, rng),
+        rate_429=args.rate_429,
+        rate_error=args.rate_error,
+        chunk_ms=args.chunk_ms,
+        trailing_chars=args.trailing_chars,
+        seed=args.seed,
+    )
+
+
+async def _serve(args):
+    server = server_from_args(args, args.host, args.port)
+    url = await server.start()
+    print(f"Fake LLM listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_server_arguments(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
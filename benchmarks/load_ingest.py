@@ -0,0 +1,348 @@
+"""
+Load benchmark for the message ingestion path: UserMiddleware + DatabaseController.
+
+N simulated users send bursts of text, photo and edited messages concurrently.
+Each update goes through `UserMiddleware.__call__` exactly as the dispatcher
+would call it, with a no-op handler, a fake Bot (simulated API latency) and
+either:
+    - a stub asyncpg pool (default): canned answers with simulated query
+      round trips, so the numbers show middleware/controller overhead and how
+      many round trips each message costs, not Postgres itself
+    - a real Postgres (`--postgres`): uses the DB_* settings from the
+      environment. Synthetic users only pass the orders check if they have rows
+      in `orders`, so point `--first-user-id` at such a range. Tickets created
+      by the run are deleted afterwards.
+
+Traffic is generated from a fixed seed, so two runs with the same arguments
+send the same messages in the same order. Results can be written with
+`--json` and compared with `--baseline`, which exits non-zero if p95 latency
+or throughput regressed by more than `--tolerance`.
+
+Usage:
+    python -m benchmarks.load_ingest [--users 200] [--bursts 3] [--pool-size 5]
+    python -m benchmarks.load_ingest --json current.json --baseline previous.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from aiogram.types import Chat, Message, PhotoSize, Update, User
+
+from config.config import Config
+from controllers.db_controller import DatabaseController
+from controllers.customer_index import CustomerIndex
+from controllers.db_instrumentation import InstrumentedPool
+from middlewares import UserMiddleware
+from utils.logger import logger
+
+
+# --- Fakes -------------------------------------------------------------------
+
+class FakeBot:
+    """Only the Bot API calls UserMiddleware makes, each costing `latency` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def _call(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call()
+
+    async def forward_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._call()
+
+
+class StubState:
+    """The little bit of state the canned answers need: open tickets per user."""
+
+    def __init__(self):
+        self.open_tickets: dict[int, int] = {}
+        self.next_ticket_id = 1
+        self.round_trips = 0
+
+    def row_for(self, query: str, args: tuple):
+        if "support_user_muted" in query:
+            return None
+        if "FROM orders" in query:
+            return {"count": 1}
+        if "support_group_ids" in query:
+            return {"group_id": -1_000_000_000_000 - args[0]}
+        if "FROM support_messages sm" in query:
+            return {"messages_forwarded": False, "replied": False}
+        if "RETURNING ticket_id" in query:
+            user_id = args[0]
+            ticket_id = self.open_tickets.get(user_id)
+            if ticket_id is None:
+                ticket_id = self.open_tickets[user_id] = self.next_ticket_id
+                self.next_ticket_id += 1
+            return {"ticket_id": ticket_id}
+        if "FROM support_tickets" in query and "closed = FALSE" in query and args:
+            ticket_id = self.open_tickets.get(args[0])
+            return {"ticket_id": ticket_id} if ticket_id else None
+        return None
+
+
+class StubConnection:
+    """Answers like an asyncpg connection; every call is one simulated round trip."""
+
+    def __init__(self, state: StubState, rng: random.Random, latency: float):
+        self._state = state
+        self._rng = rng
+        self._latency = latency
+
+    async def _round_trip(self):
+        self._state.round_trips += 1
+        # Mostly fast, with an occasional slow query
+        await asyncio.sleep(self._latency * self._rng.lognormvariate(0, 0.5))
+
+    @asynccontextmanager
+    async def transaction(self):
+        await self._round_trip()  # BEGIN
+        yield
+        await self._round_trip()  # COMMIT
+
+    async def execute(self, query: str, *args):
+        await self._round_trip()
+        verb = query.lstrip().split(None, 1)[0].upper()
+        if verb == "INSERT":
+            self._state.row_for(query, args)
+            return "INSERT 0 1"
+        if verb in ("UPDATE", "DELETE"):
+            return f"{verb} 1"
+        return verb
+
+    async def fetchrow(self, query: str, *args):
+        await self._round_trip()
+        return self._state.row_for(query, args)
+
+    async def fetchval(self, query: str, *args):
+        row = await self.fetchrow(query, *args)
+        return next(iter(row.values())) if row else None
+
+    async def fetch(self, query: str, *args):
+        await self._round_trip()
+        return []
+
+
+class StubPool:
+    """asyncpg.Pool stand-in with a bounded number of connections."""
+
+    def __init__(self, size: int, latency: float, seed: int):
+        self._size = size
+        self._free = asyncio.Semaphore(size)
+        self._in_use = 0
+        self.state = StubState()
+        self._rng = random.Random(seed)
+        self._latency = latency
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._free:
+            self._in_use += 1
+            try:
+                yield StubConnection(self.state, self._rng, self._latency)
+            finally:
+                self._in_use -= 1
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_idle_size(self) -> int:
+        return self._size - self._in_use
+
+    async def close(self):
+        pass
+
+
+# --- Traffic -----------------------------------------------------------------
+
+def build_traffic(args) -> list[list[tuple[float, Update]]]:
+    """
+    Per user, a list of (delay_before, update). Seeded, so repeatable.
+    Edits refer to one of the user's earlier text messages.
+    """
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    update_id = 0
+    users = []
+    for n in range(args.users):
+        user_id = args.first_user_id + n
+        user = User(id=user_id, is_bot=False, first_name=f"load{n}")
+        chat = Chat(id=user_id, type="private")
+        sent_text = []
+        message_id = 0
+        script = []
+        for burst in range(args.bursts):
+            pause = rng.uniform(0, args.burst_gap) if burst else rng.uniform(0, args.burst_gap / 2)
+            for i in range(rng.randint(1, args.burst_size)):
+                update_id += 1
+                delay = pause if i == 0 else rng.uniform(0.02, 0.3)
+                kind = rng.random()
+                if sent_text and kind < args.edit_ratio:
+                    edited = rng.choice(sent_text)
+                    msg = Message(message_id=edited, date=now, edit_date=int(now.timestamp()), chat=chat,
+                                  from_user=user, text=f"edited text {edited}")
+                    update = Update(update_id=update_id, edited_message=msg)
+                else:
+                    message_id += 1
+                    if kind < args.edit_ratio + args.photo_ratio:
+                        photo = [PhotoSize(file_id=f"p{update_id}", file_unique_id=f"u{update_id}", width=90, height=90)]
+                        msg = Message(message_id=message_id, date=now, chat=chat, from_user=user, photo=photo)
+                    else:
+                        msg = Message(message_id=message_id, date=now, chat=chat, from_user=user,
+                                      text=f"where is my order? message {message_id}")
+                        sent_text.append(message_id)
+                    update = Update(update_id=update_id, message=msg)
+                script.append((delay * args.time_scale, update))
+        users.append(script)
+    return users
+
+
+async def _noop_handler(event, data):
+    return None
+
+
+async def run_user(middleware: UserMiddleware, script, latencies: list[float]):
+    for delay, update in script:
+        if delay:
+            await asyncio.sleep(delay)
+        started = time.perf_counter()
+        await middleware(_noop_handler, update, {})
+        latencies.append(time.perf_counter() - started)
+
+
+async def sample_pool(pool, samples: list[tuple[int, int]], interval: float = 0.005):
+    while True:
+        size = pool.get_size()
+        samples.append((size - pool.get_idle_size(), size))
+        await asyncio.sleep(interval)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# --- Main --------------------------------------------------------------------
+
+async def run(args) -> dict:
+    traffic = build_traffic(args)
+    bot = FakeBot(args.bot_latency)
+    db = DatabaseController(bot)
+
+    if args.postgres:
+        db.config["min_size"] = db.config["max_size"] = args.pool_size
+        await db.initialize()
+        stub = None
+    else:
+        stub = StubPool(args.pool_size, args.db_latency, args.seed)
+        db.pool = InstrumentedPool(stub)
+        # As in initialize(); the stub has no customer list, so each user's first message checks EXISTS
+        db.customers = CustomerIndex(
+            db.fetch_customer_ids, db.has_orders, Config.CUSTOMER_NEGATIVE_TTL, Config.CUSTOMER_INDEX_REFRESH_SECONDS
+        )
+        await db.customers.start()
+
+    middleware = UserMiddleware(db, bot)
+    latencies: list[float] = []
+    samples: list[tuple[int, int]] = []
+    sampler = asyncio.create_task(sample_pool(db.pool, samples))
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_user(middleware, script, latencies) for script in traffic))
+    finally:
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+        if args.postgres:
+            async with db.pool.acquire() as conn:
+                user_ids = list(range(args.first_user_id, args.first_user_id + args.users))
+                await conn.execute("DELETE FROM support_tickets WHERE user_id = ANY($1::bigint[])", user_ids)
+            await db.close()
+        else:
+            await db.customers.stop()
+
+    in_use = [used for used, _ in samples]
+    saturated = sum(1 for used, size in samples if size and used >= size)
+    result = {
+        "messages": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies, default=0) * 1000, 2),
+        "pool_size": args.pool_size,
+        "pool_peak_in_use": max(in_use, default=0),
+        "pool_saturated_pct": round(100 * saturated / len(samples), 1) if samples else 0.0,
+        "bot_api_calls": bot.calls,
+    }
+    if stub is not None:
+        result["db_round_trips"] = stub.state.round_trips
+        result["round_trips_per_message"] = round(stub.state.round_trips / len(latencies), 2) if latencies else 0.0
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    if result["p95_ms"] > baseline["p95_ms"] * (1 + tolerance):
+        regressions.append(f"p95 {baseline['p95_ms']}ms -> {result['p95_ms']}ms")
+    if result["throughput_per_s"] < baseline["throughput_per_s"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput_per_s']}/s -> {result['throughput_per_s']}/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--bursts", type=int, default=3, help="bursts per user")
+    parser.add_argument("--burst-size", type=int, default=5, help="max messages per burst")
+    parser.add_argument("--burst-gap", type=float, default=2.0, help="max seconds between bursts")
+    parser.add_argument("--photo-ratio", type=float, default=0.15)
+    parser.add_argument("--edit-ratio", type=float, default=0.1)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply all think times (0 = flood)")
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--db-latency", type=float, default=0.001, help="stub round trip, seconds")
+    parser.add_argument("--bot-latency", type=float, default=0.05, help="fake Bot API call, seconds")
+    parser.add_argument("--postgres", action="store_true", help="use the DB_* Postgres instead of the stub pool")
+    parser.add_argument("--first-user-id", type=int, default=9_000_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON from a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    # One INFO line per message would dominate the measurement
+    logger.setLevel(logging.WARNING)
+
+    result = asyncio.run(run(args))
+    for key, value in result.items():
+        print(f"{key:<24} {value}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("REGRESSION: " + "; ".join(regressions))
+            raise SystemExit(1)
+        print("No regression against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,11 +13,61 @@ class Config:
     DB_NAME = os.getenv("DB_NAME", "mydb")
     DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))  
     DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))  
+    DB_RUN_MIGRATIONS = os.getenv("DB_RUN_MIGRATIONS", "true") == "true" # Apply migrations/*.sql on startup
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 5000)) # statement_timeout for interactive queries
+    DB_REPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_REPORT_STATEMENT_TIMEOUT_MS", 30000)) # statement_timeout for scans/aggregates
+    DB_SLOW_QUERY_MS = int(os.getenv("DB_SLOW_QUERY_MS", 500)) # Log DatabaseController calls slower than this
+
+    BOT_SETTINGS_TTL = int(os.getenv("BOT_SETTINGS_TTL", 300)) # Seconds, fallback if a change notification is missed
+    CUSTOMER_INDEX_REFRESH_SECONDS = int(os.getenv("CUSTOMER_INDEX_REFRESH_SECONDS", 3600)) # Full reload of the customer id set
+    CUSTOMER_NEGATIVE_TTL = int(os.getenv("CUSTOMER_NEGATIVE_TTL", 60)) # How long a "no orders" answer is trusted before rechecking
 
     SUPPORT_ADMIN_USERNAME = 'guncha420' # @guncha420 for testing
 
+    # "groups": a group per user, created by userbot sessions (sessions/narvesensupportbot)
+    # "topics": one bot-owned forum supergroup (SUPPORT_FORUM_CHAT_ID) with a topic per user
+    SUPPORT_ROUTING_MODE = os.getenv("SUPPORT_ROUTING_MODE", "groups")
+    SUPPORT_FORUM_CHAT_ID = int(os.getenv("SUPPORT_FORUM_CHAT_ID", 0)) # The bot needs the "Manage topics" admin right there
+
     NANO_GPT_API_KEY = os.getenv("NANO_GPT_API_KEY")
+    NANO_GPT_API_URL = os.getenv("NANO_GPT_API_URL", "https://nano-gpt.com/api/v1/chat/completions") # Any OpenAI-compatible chat completions endpoint
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 30)) # Hard cap per LLM HTTP request
+    LLM_HEDGING = os.getenv("LLM_HEDGING") == "true" # Duplicate requests slower than the recent p95, first answer wins
+    LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", 20)) # Recent calls considered by the circuit breaker
+    LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", 0.5)) # Share of failed/slow calls that opens it
+    LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", 15)) # Calls slower than this count as failed
+    LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", 60)) # How long to fail fast before probing again
+    CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", 20)) # Max tickets per classification prompt
+    CLASSIFY_BATCH_WAIT_MS = int(os.getenv("CLASSIFY_BATCH_WAIT_MS", 300)) # How long to collect tickets before sending a batch
 
     IPROYAL_PROXY_AUTH = os.getenv("IPROYAL_PROXY_AUTH")
 
+    SESSION_STORAGE = os.getenv("SESSION_STORAGE", "files") # "files" (sessions/narvesensupportbot) or "postgres" (python -m utils.pg_session import); still one bot replica either way
+    SESSION_GROUP_LIMIT = int(os.getenv("SESSION_GROUP_LIMIT", 45)) # Support groups one userbot session may own
+    SESSION_BACKOFF_SECONDS = float(os.getenv("SESSION_BACKOFF_SECONDS", 60)) # First quarantine of a failing session, doubled per failure
+    SESSION_MAX_BACKOFF_SECONDS = float(os.getenv("SESSION_MAX_BACKOFF_SECONDS", 3600)) # Cap, and the quarantine for auth failures
+
+    TICKET_QUIET_SECONDS = float(os.getenv("TICKET_QUIET_SECONDS", 5)) # Handle a ticket once its user has been quiet this long
+    TICKET_MAX_WAIT_SECONDS = float(os.getenv("TICKET_MAX_WAIT_SECONDS", 60)) # ...or this long after the first message, if they keep typing
+    TICKET_HOUSEKEEPING_INTERVAL = float(os.getenv("TICKET_HOUSEKEEPING_INTERVAL", 600)) # Closing stale tickets, re-arming missed timers
+
+    EDIT_COALESCE_SECONDS = float(os.getenv("EDIT_COALESCE_SECONDS", 3)) # Only the final text of a burst of edits is handled
+    EDIT_COALESCE_MAX_WAIT_SECONDS = float(os.getenv("EDIT_COALESCE_MAX_WAIT_SECONDS", 15))
+
+    FLOOD_WINDOW_SECONDS = float(os.getenv("FLOOD_WINDOW_SECONDS", 60)) # Sliding window for per-user message limits
+    FLOOD_LIMIT_TEXT = int(os.getenv("FLOOD_LIMIT_TEXT", 30)) # Text messages per window before dropping
+    FLOOD_LIMIT_MEDIA = int(os.getenv("FLOOD_LIMIT_MEDIA", 20)) # Photos/videos/stickers/... per window, an album counts once
+    FLOOD_LIMIT_EDIT = int(os.getenv("FLOOD_LIMIT_EDIT", 20)) # Edits per window
+    FLOOD_MUTE_FACTOR = float(os.getenv("FLOOD_MUTE_FACTOR", 3)) # Mute when a limit is exceeded this many times over
+
+    GROUP_RECYCLING = os.getenv("GROUP_RECYCLING") == "true" # Free inactive groups for reuse instead of deleting them
+    CLEANUP_MAX_PARALLEL_SESSIONS = int(os.getenv("CLEANUP_MAX_PARALLEL_SESSIONS", 5))
+    CLEANUP_DELETE_INTERVAL = float(os.getenv("CLEANUP_DELETE_INTERVAL", 30)) # Seconds between deletions per session
+
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+    LOG_JSON = os.getenv("LOG_JSON") == "true" # One JSON object per line (with user_id/ticket_id when available)
+
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1") # Unauthenticated; set 0.0.0.0 only where the port is firewalled (e.g. scraped from another container)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0)) # 0 disables the /metrics endpoint
+
     DEVELOPMENT_MODE = os.getenv("DEVELOPMENT_MODE") == "true"
\ No newline at end of file
@@ -0,0 +1,137 @@
+# bot_settings_cache.py
+import asyncio
+import time
+from types import MappingProxyType
+from typing import Awaitable, Callable, Mapping, Optional
+
+import asyncpg
+
+from utils.logger import logger
+
+
+class BotSettingsCache:
+    """
+    In-memory copy of the single bot_settings row.
+
+    Loaded once at startup and refreshed when Postgres sends a
+    `bot_settings_changed` notification (fired by the trigger from
+    migrations/0003, which is only created if this role owns bot_settings).
+    The LISTEN runs on its own connection, outside the pool, and is
+    re-established when that connection drops. If a notification is missed,
+    or there is no trigger, entries older than `ttl` seconds are reloaded on access.
+    """
+
+    CHANNEL = "bot_settings_changed"
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[Optional[Mapping]]],
+        connect: Callable[[], Awaitable[asyncpg.Connection]],
+        ttl: float,
+        reconnect_delay: float = 5.0,
+        max_reconnect_delay: float = 300.0,
+    ):
+        self._loader = loader
+        self._connect = connect
+        self._ttl = ttl
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._settings: Mapping = MappingProxyType({})
+        self._loaded_at: float = 0.0
+        self._lock = asyncio.Lock()
+        self._listen_conn: asyncpg.Connection | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._stopped = False
+
+    async def start(self):
+        """Load the settings and subscribe to change notifications."""
+        await self.refresh()
+        try:
+            await self._listen()
+        except Exception as e:
+            # TTL refresh keeps the cache reasonably fresh until the LISTEN is back
+            logger.warning(f"Could not LISTEN for bot_settings changes, relying on TTL meanwhile: {e}")
+            self._schedule_reconnect()
+
+    async def stop(self):
+        self._stopped = True
+        for task in (self._refresh_task, self._reconnect_task):
+            if task and not task.done():
+                task.cancel()
+        await self._close_listen_conn()
+
+    async def get(self) -> Mapping:
+        """Return the cached settings, reloading them first if the TTL has expired."""
+        if time.monotonic() - self._loaded_at > self._ttl:
+            async with self._lock:
+                # Another caller may have refreshed while we waited for the lock
+                if time.monotonic() - self._loaded_at > self._ttl:
+                    await self._load()
+        return self._settings
+
+    async def refresh(self):
+        async with self._lock:
+            await self._load()
+
+    async def _load(self):
+        row = await self._loader()
+        self._settings = MappingProxyType(dict(row) if row else {})
+        self._loaded_at = time.monotonic()
+        logger.debug("Loaded bot_settings into cache: %s", self._settings)
+
+    async def _listen(self):
+        conn = await self._connect()
+        try:
+            conn.add_termination_listener(self._on_terminated)
+            await conn.add_listener(self.CHANNEL, self._on_notify)
+        except Exception:
+            await conn.close()
+            raise
+        self._listen_conn = conn
+        logger.info(f"Listening for bot_settings changes on '{self.CHANNEL}'")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        logger.info(f"bot_settings changed ({payload}), refreshing cache")
+        self._refresh_task = asyncio.create_task(self._refresh_safely())
+
+    def _on_terminated(self, connection):
+        if connection is not self._listen_conn or self._stopped:
+            return
+        self._listen_conn = None
+        logger.warning("bot_settings LISTEN connection lost, reconnecting")
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if not self._stopped and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = self._reconnect_delay
+        while not self._stopped:
+            await asyncio.sleep(delay)
+            try:
+                await self._listen()
+            except Exception as e:
+                delay = min(delay * 2, self._max_reconnect_delay)
+                logger.warning(f"bot_settings LISTEN reconnect failed, retrying in {delay:.0f}s: {e}")
+                continue
+            # Changes made while disconnected weren't notified
+            await self._refresh_safely()
+            return
+
+    async def _refresh_safely(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Force a reload on the next access instead
+            self._loaded_at = 0.0
+            logger.error(f"Failed to refresh bot_settings cache: {e}")
+
+    async def _close_listen_conn(self):
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.debug("Failed to close bot_settings listen connection: %s", e)
@@ -0,0 +1,95 @@
+# customer_index.py
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable
+
+from utils.logger import logger
+from utils.metrics import CUSTOMER_INDEX_LOOKUPS
+
+
+class CustomerIndex:
+    """
+    In-memory set of user ids that have at least one order.
+
+    Loaded at startup from `SELECT DISTINCT user_id FROM orders` and reloaded
+    every `refresh_interval` seconds. A user missing from the set is checked
+    with an EXISTS query, so a first order is picked up on that user's next
+    message; the "no orders" answer is then remembered for `negative_ttl`
+    seconds, so non-customers don't cost a query per message either.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[Iterable[int]]],
+        checker: Callable[[int], Awaitable[bool]],
+        negative_ttl: float,
+        refresh_interval: float,
+    ):
+        self._loader = loader
+        self._checker = checker
+        self._negative_ttl = negative_ttl
+        self._refresh_interval = refresh_interval
+        self._customers: set[int] = set()
+        self._not_customers: dict[int, float] = {}  # user_id -> when the EXISTS check said no
+        self._added_during_refresh: set[int] | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    async def start(self):
+        """Load the customer ids and start the periodic reload."""
+        await self.refresh()
+        self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self):
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        self._refresh_task = None
+
+    async def is_customer(self, user_id: int) -> bool:
+        if user_id in self._customers:
+            CUSTOMER_INDEX_LOOKUPS.inc(result="hit")
+            return True
+
+        checked_at = self._not_customers.get(user_id)
+        if checked_at is not None and time.monotonic() - checked_at < self._negative_ttl:
+            CUSTOMER_INDEX_LOOKUPS.inc(result="negative_cached")
+            return False
+
+        if await self._checker(user_id):
+            CUSTOMER_INDEX_LOOKUPS.inc(result="new_customer")
+            self._customers.add(user_id)
+            self._not_customers.pop(user_id, None)
+            if self._added_during_refresh is not None:
+                self._added_during_refresh.add(user_id)
+            return True
+
+        CUSTOMER_INDEX_LOOKUPS.inc(result="negative")
+        self._not_customers[user_id] = time.monotonic()
+        return False
+
+    def __len__(self) -> int:
+        return len(self._customers)
+
+    async def refresh(self):
+        started = time.monotonic()
+        # Customers found by EXISTS while the reload runs are kept in the new set
+        self._added_during_refresh = set()
+        try:
+            customers = set(await self._loader()) | self._added_during_refresh
+        finally:
+            self._added_during_refresh = None
+        self._customers = customers
+        cutoff = time.monotonic() - self._negative_ttl
+        self._not_customers = {
+            user_id: checked_at for user_id, checked_at in self._not_customers.items()
+            if checked_at > cutoff and user_id not in customers
+        }
+        logger.info(f"Loaded {len(customers)} customer ids in {time.monotonic() - started:.2f}s")
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the previous set; misses still fall back to EXISTS
+                logger.error(f"Failed to reload customer ids: {e}")
@@ -6,9 +6,15 @@ from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, List, Tuple
 
 from config.config import Config
+from controllers.bot_settings_cache import BotSettingsCache
+from controllers.customer_index import CustomerIndex
+from controllers.db_instrumentation import instrumented, InstrumentedPool
+from controllers.migrations import run_migrations
+from models import Ticket
 from utils.logger import logger
 
 
+@instrumented
 class DatabaseController:
     def __init__(self, bot: Bot):
         self.pool = None
@@ -20,8 +26,15 @@ class DatabaseController:
             "database": Config.DB_NAME,
             "min_size": Config.DB_POOL_SIZE,
             "max_size": int(Config.DB_MAX_OVERFLOW) + int(Config.DB_POOL_SIZE),
+            # Default for "interactive" methods; longer classes SET it per acquire
+            "server_settings": {"statement_timeout": str(Config.DB_STATEMENT_TIMEOUT_MS)},
         }
         self.bot = bot
+        self.settings = None  # BotSettingsCache, set up in initialize()
+        self.customers = None  # CustomerIndex, set up in initialize()
+        # user_id <-> (group_id, thread_id), kept in sync by set_user_group_id/delete_support_group
+        self._user_chats: dict[int, tuple[int, int | None]] = {}
+        self._thread_users: dict[tuple[int, int], int] = {}
         self._validate_config()  # Validate config during initialization
 
     def _validate_config(self):
@@ -50,8 +63,19 @@ class DatabaseController:
         if self.pool is None:
             try:
                 logger.info("Initializing database connection pool...")
-                self.pool = await asyncpg.create_pool(**self.config)
+                self.pool = InstrumentedPool(await asyncpg.create_pool(**self.config))
                 logger.info("Database connection pool initialized successfully.")
+                if Config.DB_RUN_MIGRATIONS:
+                    await run_migrations(self.pool)
+                self.settings = BotSettingsCache(self.fetch_bot_settings, self._connect_listener, Config.BOT_SETTINGS_TTL)
+                await self.settings.start()
+                self.customers = CustomerIndex(
+                    self.fetch_customer_ids,
+                    self.has_orders,
+                    Config.CUSTOMER_NEGATIVE_TTL,
+                    Config.CUSTOMER_INDEX_REFRESH_SECONDS,
+                )
+                await self.customers.start()
             except PostgresError as e:
                 logger.error(f"Failed to initialize database connection pool: {e}")
                 raise
@@ -60,12 +84,26 @@ class DatabaseController:
                 raise
         return self
 
+    def _connection_settings(self) -> dict:
+        """asyncpg.connect() arguments for long-lived connections kept outside the pool."""
+        return {key: value for key, value in self.config.items() if key not in ("min_size", "max_size")}
+
+    async def _connect_listener(self) -> asyncpg.Connection:
+        """A connection for LISTEN, without the pool's statement_timeout."""
+        return await asyncpg.connect(**{**self._connection_settings(), "server_settings": {"statement_timeout": "0"}})
+
     async def close(self):
         """
         Close the connection pool.
         """
         if self.pool:
             try:
+                if self.settings:
+                    await self.settings.stop()
+                    self.settings = None
+                if self.customers:
+                    await self.customers.stop()
+                    self.customers = None
                 logger.info("Closing database connection pool...")
                 await self.pool.close()
                 logger.info("Database connection pool closed successfully.")
@@ -96,7 +134,7 @@ class DatabaseController:
             roles = await self.get_user_roles(user_id)
             is_role = required_role in roles
             logger.debug(
-                f"Checked {required_role} status for user {user_id}: {is_role}"
+                "Checked %s status for user %s: %s", required_role, user_id, is_role
             )
             return is_role
         except PostgresError as e:
@@ -134,7 +172,7 @@ class DatabaseController:
                 """
                 row = await conn.fetchrow(query, user_id)
                 if row is None:
-                    logger.debug(f"User {user_id} is not muted (no record found).")
+                    logger.debug("User %s is not muted (no record found).", user_id)
                     return False
 
                 muted_until = row["muted_until"]
@@ -147,10 +185,10 @@ class DatabaseController:
                         WHERE user_id = $1
                     """
                     await conn.execute(delete_query, user_id)
-                    logger.debug(f"Mute expired for user {user_id}; unmuted automatically.")
+                    logger.debug("Mute expired for user %s; unmuted automatically.", user_id)
                     return False
 
-                logger.debug(f"User {user_id} is currently muted until {muted_until}.")
+                logger.debug("User %s is currently muted until %s.", user_id, muted_until)
                 return True
 
         except PostgresError as e:
@@ -191,7 +229,7 @@ class DatabaseController:
                     DO UPDATE SET muted_until = EXCLUDED.muted_until
                 """
                 await conn.execute(query, user_id, until)
-                logger.debug(f"Muted user {user_id} until {until.isoformat()}.")
+                logger.debug("Muted user %s until %s.", user_id, until)
         except PostgresError as e:
             logger.error(f"Database error muting user {user_id}: {e}")
             raise
@@ -262,7 +300,7 @@ class DatabaseController:
                     user_id,
                 )
                 role_names = [row["role_name"] for row in roles]
-                logger.debug(f"Retrieved roles for user {user_id}: {role_names}")
+                logger.debug("Retrieved roles for user %s: %s", user_id, role_names)
                 return role_names
             except PostgresError as e:
                 logger.error(f"Database error fetching roles for user {user_id}: {e}")
@@ -311,7 +349,7 @@ class DatabaseController:
                 drop_row = await conn.fetchrow(drop_query, drop_id)
 
                 if not drop_row:
-                    logger.debug(f"No ready drop found for {drop_id}")
+                    logger.debug("No ready drop found for %s", drop_id)
                     return None
 
                 # Fetch media paths from drop_medias
@@ -338,9 +376,8 @@ class DatabaseController:
                 drop_info["description"] = description
 
                 logger.debug(
-                    f"Fetched drop: drop_id={drop_id}, media_paths={media_paths}, "
-                    f"description={description}, batch_id={drop_info.get('batch_id')}, "
-                    f"area_id={drop_info.get('area_id')}"
+                    "Fetched drop: drop_id=%s, media_paths=%s, description=%s, batch_id=%s, area_id=%s",
+                    drop_id, media_paths, description, drop_info.get('batch_id'), drop_info.get('area_id')
                 )
                 return drop_info
 
@@ -351,39 +388,48 @@ class DatabaseController:
                 logger.error(f"Unexpected error retrieving drop by id {drop_id}: {e}")
                 raise
 
-    async def get_order_count_for_user(self, user_id: int):
-        """Retrieve the count of orders for a user.
+    async def is_customer(self, user_id: int) -> bool:
+        """
+        Whether the user has at least one order, answered from the in-memory
+        customer index (see controllers/customer_index.py).
 
         Args:
-            user_id (int): The ID of the user whose orders are to be counted.
+            user_id (int): The ID of the user.
 
         Returns:
-            int: The number of orders, or 0 if none are found.
-
-        Raises:
-            PostgresError: If a database error occurs during the query.
-            Exception: If an unexpected error occurs during the retrieval process.
+            bool: True if the user has ordered before.
         """
-        async with self.pool.acquire() as conn:
-            try:
-                query = """
-                    SELECT COUNT(*)
-                    FROM orders
-                    WHERE user_id = $1
-                """
-                # Use fetch() to get all rows instead of execute()
-                orders = await conn.fetchval(query, user_id)
-                # Extract user_id from each row and return as a list
-                return orders or 0
+        if self.customers is None:
+            return await self.has_orders(user_id)
+        return await self.customers.is_customer(user_id)
 
-            except PostgresError as e:
-                logger.error(f"Failed to get orders for user: {e}")
-                raise
-            except Exception as e:
-                logger.error(
-                    f"Unexpected error getting orders for user: {e}"
+    async def has_orders(self, user_id: int) -> bool:
+        """Check with the database whether a user has at least one order."""
+        try:
+            async with self.pool.acquire() as conn:
+                return await conn.fetchval(
+                    "SELECT EXISTS (SELECT 1 FROM orders WHERE user_id = $1)",
+                    user_id
                 )
-                raise  
+        except PostgresError as e:
+            logger.error(f"Failed to check orders for user {user_id}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error checking orders for user {user_id}: {e}")
+            raise
+
+    async def fetch_customer_ids(self) -> list[int]:
+        """Load the ids of all users with at least one order, for the customer index."""
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch("SELECT DISTINCT user_id FROM orders")
+                return [row["user_id"] for row in rows]
+        except PostgresError as e:
+            logger.error(f"Failed to load customer ids: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error loading customer ids: {e}")
+            raise
 
     async def get_orders_for_user(self, user_id: int):
         """
@@ -414,6 +460,19 @@ class DatabaseController:
 
     
     async def get_bot_settings(self):
+        """Retrieve the bot settings from the in-memory cache.
+
+        Falls back to querying bot_settings directly if the cache hasn't been
+        set up (e.g. the controller was not initialized).
+
+        Returns:
+            Mapping: The bot settings (read-only), empty if the table has no row.
+        """
+        if self.settings:
+            return await self.settings.get()
+        return await self.fetch_bot_settings() or {}
+
+    async def fetch_bot_settings(self):
         """Retrieve all bot settings from the bot_settings table.
 
         Args:
@@ -429,7 +488,7 @@ class DatabaseController:
         async with self.pool.acquire() as conn:
             try:
                 result = await conn.fetchrow("SELECT * FROM bot_settings")
-                logger.debug(f"Retrieved bot_settings: {result}")
+                logger.debug("Retrieved bot_settings: %s", result)
                 return result
 
             except PostgresError as e:
@@ -513,7 +572,9 @@ class DatabaseController:
                 logger.error(f"Unexpected error retrieving user and drops: {e}")
                 raise
     
-    async def save_user_message(self, user_id: int, message_id: int, user_text: str, replied: bool = False) -> bool:
+    async def save_user_message(
+        self, user_id: int, message_id: int, user_text: str, replied: bool = False, forwarded_message_id: int = None
+    ) -> bool:
         """
         Log a support message sent by a user into the support_messages table,
         creating a support ticket if necessary.
@@ -523,63 +584,64 @@ class DatabaseController:
             message_id (int): Telegram message ID.
             user_text (str): Text content of the message.
             replied (bool, optional): Whether the message has already been replied to. Defaults to False.
+            forwarded_message_id (int, optional): Id of the message's forwarded copy in the user's admin group.
 
         Returns:
-            bool: True if message was logged successfully, False otherwise.
+            bool: True if the message was logged, False if it was already logged (a replayed update).
 
         Raises:
             PostgresError: If a database-related error occurs.
             Exception: For unexpected runtime errors.
         """
-        async with self.pool.acquire() as conn:
-            try:
-                async with conn.transaction():
-                    logger.debug(f"Checking for open ticket for user {user_id}")
-
-                    # Step 1: Check for open ticket
-                    select_ticket_query = """
+        try:
+            async with self.pool.acquire() as conn:
+                # One statement: reuse the open ticket (or create it, relying on
+                # support_tickets_open_user_uidx when two messages race), then
+                # insert the message unless this update was already stored.
+                query = """
+                    WITH open_ticket AS (
                         SELECT ticket_id FROM support_tickets
-                        WHERE user_id = $1 AND closed = FALSE
-                        LIMIT 1
-                    """
-                    row = await conn.fetchrow(select_ticket_query, user_id)
-
-                    if row:
-                        ticket_id = row["ticket_id"]
-                        logger.debug(f"Found open ticket {ticket_id} for user {user_id}")
-                    else:
-                        # Step 2: Create new ticket
-                        insert_ticket_query = """
-                            INSERT INTO support_tickets (user_id)
-                            VALUES ($1)
-                            RETURNING ticket_id
-                        """
-                        ticket_row = await conn.fetchrow(insert_ticket_query, user_id)
-                        ticket_id = ticket_row["ticket_id"]
-                        logger.debug(f"Created new ticket {ticket_id} for user {user_id}")
-
-                    # Step 3: Insert support message
-                    insert_message_query = """
-                        INSERT INTO support_messages (ticket_id, user_id, message_id, user_text, replied)
-                        VALUES ($1, $2, $3, $4, $5)
-                    """
-                    await conn.execute(insert_message_query, ticket_id, user_id, message_id, user_text, replied)
-                    logger.debug(f"Logged message for ticket {ticket_id} from user {user_id}")
+                        WHERE user_id = $1::bigint AND closed = FALSE
+                    ),
+                    new_ticket AS (
+                        INSERT INTO support_tickets (user_id)
+                        SELECT $1
+                        WHERE NOT EXISTS (SELECT 1 FROM open_ticket)
+                          AND NOT EXISTS (
+                              SELECT 1 FROM support_messages
+                              WHERE user_id = $1 AND message_id = $2::bigint
+                          )
+                        ON CONFLICT (user_id) WHERE closed = FALSE
+                        DO UPDATE SET user_id = EXCLUDED.user_id
+                        RETURNING ticket_id
+                    )
+                    INSERT INTO support_messages (ticket_id, user_id, message_id, user_text, replied, forwarded_message_id)
+                    SELECT ticket_id, $1, $2, $3::text, $4::boolean, $5::bigint
+                    FROM (SELECT ticket_id FROM open_ticket UNION ALL SELECT ticket_id FROM new_ticket) t
+                    LIMIT 1
+                    ON CONFLICT (user_id, message_id) DO NOTHING
+                    RETURNING ticket_id
+                """
+                ticket_id = await conn.fetchval(query, user_id, message_id, user_text, replied, forwarded_message_id)
 
-                    return True
+                if ticket_id is None:
+                    logger.debug("Message %s from user %s was already logged", message_id, user_id, extra={"user_id": user_id})
+                    return False
+                logger.debug("Logged message for ticket %s from user %s", ticket_id, user_id, extra={"user_id": user_id, "ticket_id": ticket_id})
+                return True
 
-            except PostgresError as e:
-                logger.error(f"Database error while logging message from user {user_id}: {e}")
-                raise
-            except Exception as e:
-                logger.error(f"Unexpected error while logging message from user {user_id}: {e}")
-                raise
+        except PostgresError as e:
+            logger.error(f"Database error while logging message from user {user_id}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error while logging message from user {user_id}: {e}")
+            raise
 
     async def get_active_support_tickets(
         self,
         messages_forwarded: bool | None = None,
         user_id: int | None = None
-    ) -> list[dict]:
+    ) -> list[Ticket]:
         """
         Retrieve all unclosed support tickets with multiple messages, 
         optionally filtering by forwarding status and user.
@@ -592,7 +654,7 @@ class DatabaseController:
             user_id (int | None, optional): If provided, only return tickets for this user.
 
         Returns:
-            list[dict]: A list of tickets with multiple messages (as dictionaries).
+            list[Ticket]: A list of tickets, each with its messages ordered by message_id.
         """
         try:
             async with self.pool.acquire() as conn:
@@ -620,8 +682,9 @@ class DatabaseController:
 
                 query = f"""
                     SELECT 
-                        t.*,
-                        array_agg(m.*) AS messages
+                        t.ticket_id, t.user_id, t.closed, t.messages_forwarded,
+                        t.support_issue, t.lang, t.created_at,
+                        array_agg(m ORDER BY m.message_id) FILTER (WHERE m.id IS NOT NULL) AS messages
                     FROM support_tickets t
                     LEFT JOIN support_messages m ON t.ticket_id = m.ticket_id
                     {where_clause}
@@ -629,7 +692,7 @@ class DatabaseController:
                 """
 
                 rows = await conn.fetch(query, *values)
-                return [dict(row) for row in rows]
+                return [Ticket.from_record(row) for row in rows]
 
         except PostgresError as e:
             logger.error(f"Database error retrieving support tickets: {e}")
@@ -669,102 +732,89 @@ class DatabaseController:
             logger.error(f"Unexpected error while closing support ticket {ticket_id}: {e}")
             raise
     
-    async def set_messages_forwarded_for_ticket(self, ticket_id: int) -> bool:
-        """Mark a support ticket as forwarded.
-
-        Args:
-            ticket_id (int): The ID of the support ticket to mark as forwarded.
-
-        Returns:
-            bool: True if the ticket was successfully updated, False otherwise.
+    async def transition_ticket(
+        self,
+        ticket_id: int | list[int],
+        replied_upto: int | None = None,
+        lang: str | None = None,
+        category: str | None = None,
+        closed: bool | None = None,
+        forwarded: bool | None = None,
+    ) -> Optional[Ticket] | list[Ticket]:
         """
-        try:
-            async with self.pool.acquire() as conn:
-                result = await conn.execute(
-                    """
-                    UPDATE support_tickets
-                    SET messages_forwarded = TRUE
-                    WHERE ticket_id = $1
-                    """,
-                    ticket_id
-                )
-
-                # Check if any rows were affected
-                return result.endswith("UPDATE 1")
-
-        except PostgresError as e:
-            logger.error(f"Database error while forwarding support ticket {ticket_id}: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected error while forwarding support ticket {ticket_id}: {e}")
-            raise
+        Apply a ticket outcome in one statement and return the updated ticket.
 
-    async def get_ticket(self, ticket_id: int) -> Optional[Dict]:
-        """
-        Retrieve a support ticket by its ID, including its messages.
+        Arguments left as None are not changed.
 
         Args:
-            ticket_id (int): The ID of the support ticket to retrieve.
+            ticket_id (int | list[int]): The ticket, or several tickets to apply the same outcome to.
+            replied_upto (int | None): Mark the ticket's messages up to this Telegram message_id as replied.
+            lang (str | None): Language to set.
+            category (str | None): Category key to set as support_issue.
+            closed (bool | None): Close (or reopen) the ticket.
+            forwarded (bool | None): Set messages_forwarded.
 
         Returns:
-            Optional[Dict]: A dictionary containing the ticket data if found, None otherwise.
+            Optional[Ticket] | list[Ticket]: The updated ticket with its messages ordered by message_id
+            (None if it doesn't exist), or a list of the updated tickets when given a list of ids.
         """
+        ticket_ids = ticket_id if isinstance(ticket_id, list) else [ticket_id]
         try:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(
+                rows = await conn.fetch(
                     """
-                    SELECT st.*,
-                        array_agg(sm.*) AS messages
-                    FROM support_tickets st
-                    JOIN support_messages sm ON sm.ticket_id = st.ticket_id
-                    WHERE st.ticket_id = $1
-                    GROUP BY st.ticket_id
+                    WITH ticket AS (
+                        UPDATE support_tickets t
+                        SET lang = COALESCE($2, t.lang),
+                            support_issue = COALESCE($3, t.support_issue),
+                            closed = COALESCE($4, t.closed),
+                            messages_forwarded = COALESCE($5, t.messages_forwarded)
+                        WHERE t.ticket_id = ANY($1::bigint[])
+                        RETURNING t.ticket_id, t.user_id, t.closed, t.messages_forwarded,
+                            t.support_issue, t.lang, t.created_at
+                    ),
+                    replied AS (
+                        UPDATE support_messages m
+                        SET replied = TRUE
+                        WHERE $6::bigint IS NOT NULL
+                          AND m.ticket_id = ANY($1::bigint[])
+                          AND m.message_id <= $6
+                          AND m.replied = FALSE
+                    )
+                    SELECT t.*,
+                        (SELECT array_agg(m ORDER BY m.message_id)
+                         FROM support_messages m
+                         WHERE m.ticket_id = t.ticket_id) AS messages
+                    FROM ticket t
                     """,
-                    ticket_id
+                    ticket_ids,
+                    lang,
+                    category,
+                    closed,
+                    forwarded,
+                    replied_upto,
                 )
 
-                if row:
-                    return dict(row)
-                return None
-
-        except PostgresError as e:
-            logger.error(f"Database error while retrieving support ticket {ticket_id}: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected error while retrieving support ticket {ticket_id}: {e}")
-            raise
-
-
-    async def mark_messages_as_replied(self, ticket_id: int) -> bool:
-        """Mark all messages for a given ticket as replied.
-
-        Args:
-            ticket_id (int): The ID of the ticket whose messages should be marked as replied.
-
-        Returns:
-            bool: True if one or more messages were updated, False otherwise.
-        """
-        try:
-            async with self.pool.acquire() as conn:
-                result = await conn.execute(
-                    """
-                    UPDATE support_messages
-                    SET replied = TRUE
-                    WHERE ticket_id = $1
-                    """,
-                    ticket_id
-                )
+                tickets = [Ticket.from_record(row) for row in rows]
+                if replied_upto is not None:
+                    # The messages were read from the statement's snapshot, before the update above
+                    for ticket in tickets:
+                        for msg in ticket.messages:
+                            if msg.message_id <= replied_upto:
+                                msg.replied = True
 
-                return result.endswith("UPDATE 0") is False
+                if isinstance(ticket_id, list):
+                    return tickets
+                return tickets[0] if tickets else None
 
         except PostgresError as e:
-            logger.error(f"Database error marking messages as replied for ticket {ticket_id}: {e}")
+            logger.error(f"Database error while transitioning support ticket(s) {ticket_id}: {e}")
             raise
         except Exception as e:
-            logger.error(f"Unexpected error marking messages as replied for ticket {ticket_id}: {e}")
+            logger.error(f"Unexpected error while transitioning support ticket(s) {ticket_id}: {e}")
             raise
 
-    async def set_user_group_id(self, user_id: int, group_id: int, created_by: str) -> None:
+    async def set_user_group_id(self, user_id: int, group_id: int, created_by: str, thread_id: int = None) -> None:
         """
         Sets or updates the group ID and creator associated with a user.
 
@@ -772,18 +822,22 @@ class DatabaseController:
             user_id (int): Telegram user ID.
             group_id (int): Telegram group ID (must be a negative long integer).
             created_by (str): Session name or identifier that created the group.
+            thread_id (int, optional): Forum topic of the user, when group_id is the shared forum supergroup.
         """
         try:
             async with self.pool.acquire() as conn:
                 query = """
-                    INSERT INTO support_group_ids (user_id, group_id, created_by)
-                    VALUES ($1, $2, $3)
+                    INSERT INTO support_group_ids (user_id, group_id, created_by, thread_id)
+                    VALUES ($1, $2, $3, $4)
                     ON CONFLICT (user_id)
                     DO UPDATE SET group_id = EXCLUDED.group_id,
-                                  created_by = EXCLUDED.created_by
+                                  created_by = EXCLUDED.created_by,
+                                  thread_id = EXCLUDED.thread_id
                 """
-                await conn.execute(query, user_id, group_id, created_by)
-                logger.debug(f"Set group_id {group_id} and created_by '{created_by}' for user_id {user_id}")
+                await conn.execute(query, user_id, group_id, created_by, thread_id)
+                self._forget_user_chat(user_id)
+                self._remember_user_chat(user_id, group_id, thread_id)
+                logger.debug("Set group_id %s (thread %s) and created_by '%s' for user_id %s", group_id, thread_id, created_by, user_id)
         except Exception as e:
             logger.error(f"Failed to set group_id for user_id {user_id}: {e}")
             raise
@@ -798,17 +852,76 @@ class DatabaseController:
         Returns:
             int | None: The associated group ID, or None if not set.
         """
+        user_chat = await self.get_user_chat(user_id)
+        return user_chat[0] if user_chat else None
+
+    async def get_user_chat(self, user_id: int) -> tuple[int, int | None] | None:
+        """
+        Retrieves where a user's admin conversation lives: their own group, or
+        a topic of the forum supergroup.
+
+        Served from memory once seen; the bot runs as a single replica, so this
+        process is the only writer of support_group_ids, and
+        set_user_group_id/delete_support_group keep the cache in sync.
+
+        Args:
+            user_id (int): Telegram user ID.
+
+        Returns:
+            tuple[int, int | None] | None: (group_id, thread_id), thread_id being None
+            for a dedicated group, or None if not set.
+        """
+        user_chat = self._user_chats.get(user_id)
+        if user_chat is not None:
+            return user_chat
         try:
             async with self.pool.acquire() as conn:
-                query = "SELECT group_id FROM support_group_ids WHERE user_id = $1"
+                query = "SELECT group_id, thread_id FROM support_group_ids WHERE user_id = $1"
                 row = await conn.fetchrow(query, user_id)
                 if row:
-                    return row["group_id"]
+                    return self._remember_user_chat(user_id, row["group_id"], row["thread_id"])
                 return None
         except Exception as e:
             logger.error(f"Failed to retrieve group_id for user_id {user_id}: {e}")
             raise
 
+    async def get_user_by_thread(self, group_id: int, thread_id: int) -> int | None:
+        """
+        Retrieves the user whose forum topic `thread_id` is.
+
+        Args:
+            group_id (int): Chat ID of the forum supergroup.
+            thread_id (int): Topic (message_thread_id) in that supergroup.
+
+        Returns:
+            int | None: The user's Telegram ID, or None if the topic isn't a user's.
+        """
+        user_id = self._thread_users.get((group_id, thread_id))
+        if user_id is not None:
+            return user_id
+        try:
+            async with self.pool.acquire() as conn:
+                query = "SELECT user_id FROM support_group_ids WHERE group_id = $1 AND thread_id = $2"
+                row = await conn.fetchrow(query, group_id, thread_id)
+                if row:
+                    self._remember_user_chat(row["user_id"], group_id, thread_id)
+                    return row["user_id"]
+                return None
+        except Exception as e:
+            logger.error(f"Failed to retrieve user for thread {thread_id} in {group_id}: {e}")
+            raise
+
+    def _remember_user_chat(self, user_id: int, group_id: int, thread_id: int | None) -> tuple[int, int | None]:
+        user_chat = self._user_chats[user_id] = (group_id, thread_id)
+        if thread_id is not None:
+            self._thread_users[user_chat] = user_id
+        return user_chat
+
+    def _forget_user_chat(self, user_id: int):
+        user_chat = self._user_chats.pop(user_id, None)
+        if user_chat and user_chat[1] is not None:
+            self._thread_users.pop(user_chat, None)
+
     async def mark_message_as_deleted(self, id: int) -> bool:
         """Mark a support message as deleted.
 
@@ -906,41 +1019,36 @@ class DatabaseController:
             logger.error(f"Unexpected error while updating message {message_id} from user {user_id}: {e}")
             raise
 
-    async def set_lang_and_category_for_ticket(self, category_key: str, lang: str, ticket_id: int) -> bool:
-        """Set the support issue category and language for a support ticket.
+    async def set_forwarded_message_ids(self, user_id: int, forwarded: list[tuple[int, int]]) -> None:
+        """
+        Record where a user's messages were forwarded to in their admin group.
 
         Args:
-            category_key (str): The classification key to assign to the ticket.
-            lang (str): The detected language code (e.g., lv, eng).
-            ticket_id (int): The ID of the support ticket to update.
-
-        Returns:
-            bool: True if the ticket was successfully updated, False otherwise.
+            user_id (int): The ID of the user who sent the messages.
+            forwarded (list[tuple[int, int]]): (message_id, forwarded_message_id) pairs.
         """
+        if not forwarded:
+            return
         try:
             async with self.pool.acquire() as conn:
-                result = await conn.execute(
+                await conn.execute(
                     """
-                    UPDATE support_tickets
-                    SET support_issue = $1,
-                        lang = $2
-                    WHERE ticket_id = $3
+                    UPDATE support_messages sm
+                    SET forwarded_message_id = f.forwarded_message_id
+                    FROM unnest($2::bigint[], $3::bigint[]) AS f(message_id, forwarded_message_id)
+                    WHERE sm.user_id = $1 AND sm.message_id = f.message_id
                     """,
-                    category_key,
-                    lang,
-                    ticket_id
+                    user_id,
+                    [message_id for message_id, _ in forwarded],
+                    [forwarded_message_id for _, forwarded_message_id in forwarded],
                 )
-
-                return result.endswith("UPDATE 1")
-
         except PostgresError as e:
-            logger.error(f"Database error while setting category/lang for ticket {ticket_id}: {e}")
+            logger.error(f"Database error while setting forwarded message ids for user {user_id}: {e}")
             raise
         except Exception as e:
-            logger.error(f"Unexpected error while setting category/lang for ticket {ticket_id}: {e}")
+            logger.error(f"Unexpected error while setting forwarded message ids for user {user_id}: {e}")
             raise
 
-
     async def get_previous_users_category_key(self, user_id: int) -> Optional[str]:
         """
         Retrieve the support_issue of the second latest ticket for a given user.
@@ -976,83 +1084,350 @@ class DatabaseController:
             logger.error(f"Unexpected error while retrieving second latest ticket for user {user_id}: {e}")
             raise
 
-    async def count_of_groups_created_by(self, created_by: str) -> int:
-            """
-            Counts the number of rows in support_group_ids where created_by matches the given value.
-
-            Args:
-                created_by (str): The value to match in the created_by column.
+    async def count_groups_by_creator(self) -> Dict[str, int]:
+        """
+        Counts the support groups created by each session.
 
-            Returns:
-                int: The number of matching rows.
-            """
-            try:
-                async with self.pool.acquire() as conn:
-                    query = """
-                        SELECT COUNT(*) FROM support_group_ids
-                        WHERE created_by = $1
-                    """
-                    count = await conn.fetchval(query, created_by)
-                    logger.debug(f"Found {count} rows where created_by = '{created_by}'")
-                    return count
-            except Exception as e:
-                logger.error(f"Error counting rows by created_by = '{created_by}': {e}")
-                raise
+        Returns:
+            Dict[str, int]: created_by -> number of groups.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT created_by, COUNT(*) AS groups
+                    FROM support_group_ids
+                    WHERE created_by IS NOT NULL
+                    GROUP BY created_by
+                """)
+                return {row["created_by"]: row["groups"] for row in rows}
+        except Exception as e:
+            logger.error(f"Error counting groups by creator: {e}")
+            raise
 
-    async def get_user_open_tickets(self, user_id: int) -> list:
+    async def delete_support_group(self, user_id: int) -> None:
         """
-        Returns a list of open support tickets for a given user.
+        Deletes the support group entry for a given user_id.
         """
         try:
             async with self.pool.acquire() as conn:
-                return await conn.fetch("""
-                    SELECT * FROM support_tickets
-                    WHERE user_id = $1 AND closed = false
+                await conn.execute("""
+                    DELETE FROM support_group_ids
+                    WHERE user_id = $1
                 """, user_id)
+                self._forget_user_chat(user_id)
+                logger.info(f"Deleted support group for user_id {user_id}")
         except Exception as e:
-            logger.error(f"Error fetching open tickets for user_id {user_id}: {e}")
-            return []
+            logger.error(f"Error deleting support group for user_id {user_id}: {e}")
 
-    async def get_user_latest_ticket_date(self, user_id: int) -> Optional[datetime]:
+
+    async def free_support_group(self, user_id: int) -> None:
         """
-        Returns the latest created_at datetime for a user's tickets.
+        Detaches a user's group so it can be reassigned (GROUP_RECYCLING).
+        The row is kept, so the group still counts towards its session's limit.
         """
         try:
             async with self.pool.acquire() as conn:
-                result = await conn.fetchrow("""
-                    SELECT MAX(created_at) as latest FROM support_tickets
+                await conn.execute("""
+                    UPDATE support_group_ids
+                    SET user_id = NULL, freed_at = now()
                     WHERE user_id = $1
                 """, user_id)
-                return result["latest"] if result and result["latest"] else None
+                self._forget_user_chat(user_id)
+                logger.info(f"Freed support group of user_id {user_id}")
+        except Exception as e:
+            logger.error(f"Error freeing support group for user_id {user_id}: {e}")
+            raise
+
+    async def claim_free_support_group(self, user_id: int, created_by: list[str]) -> Optional[Tuple[int, str]]:
+        """
+        Assigns the longest-free group created by one of `created_by` to a user.
+
+        Args:
+            user_id (int): Telegram user ID.
+            created_by (list[str]): Creators whose groups may be claimed, without the leading '+'
+                (created_by is stored as '+' and the phone, session names may lack it).
+
+        Returns:
+            Optional[Tuple[int, str]]: (group_id, created_by) of the claimed group, or None if none is free.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                # SKIP LOCKED: concurrent claims take different groups instead of waiting on each other
+                row = await conn.fetchrow("""
+                    UPDATE support_group_ids g
+                    SET user_id = $1, freed_at = NULL
+                    WHERE g.user_id IS NULL
+                      AND g.group_id = (
+                          SELECT group_id FROM support_group_ids
+                          WHERE user_id IS NULL
+                            AND thread_id IS NULL
+                            AND ltrim(created_by, '+') = ANY($2::text[])
+                          ORDER BY freed_at
+                          LIMIT 1
+                          FOR UPDATE SKIP LOCKED
+                      )
+                    RETURNING g.group_id, g.created_by
+                """, user_id, created_by)
+                if not row:
+                    return None
+                self._remember_user_chat(user_id, row["group_id"], None)
+                return row["group_id"], row["created_by"]
+        except Exception as e:
+            logger.error(f"Error claiming a free support group for user_id {user_id}: {e}")
+            raise
+
+    async def get_cached_media_ref(self, content_hash: str, owner: str) -> Optional[str]:
+        """
+        Returns the stored Telegram reference for a media file, or None if it was never uploaded.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                return await conn.fetchval("""
+                    SELECT file_ref FROM support_media_cache
+                    WHERE content_hash = $1 AND owner = $2
+                """, content_hash, owner)
         except Exception as e:
-            logger.error(f"Error getting latest ticket date for user_id {user_id}: {e}")
+            logger.error(f"Error fetching cached media {content_hash} for {owner}: {e}")
             return None
 
-    async def delete_support_group(self, user_id: int) -> None:
+    async def set_cached_media_ref(self, content_hash: str, owner: str, file_ref: str) -> None:
         """
-        Deletes the support group entry for a given user_id.
+        Stores (or replaces) the Telegram reference for a media file.
         """
         try:
             async with self.pool.acquire() as conn:
                 await conn.execute("""
-                    DELETE FROM support_group_ids
-                    WHERE user_id = $1
-                """, user_id)
-                logger.info(f"Deleted support group for user_id {user_id}")
+                    INSERT INTO support_media_cache (content_hash, owner, file_ref)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (content_hash, owner)
+                    DO UPDATE SET file_ref = EXCLUDED.file_ref,
+                                  updated_at = now()
+                """, content_hash, owner, file_ref)
         except Exception as e:
-            logger.error(f"Error deleting support group for user_id {user_id}: {e}")
+            logger.error(f"Error storing cached media {content_hash} for {owner}: {e}")
 
+    async def delete_cached_media_ref(self, content_hash: str, owner: str) -> None:
+        """
+        Removes a stored Telegram reference that turned out to be invalid.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute("""
+                    DELETE FROM support_media_cache
+                    WHERE content_hash = $1 AND owner = $2
+                """, content_hash, owner)
+        except Exception as e:
+            logger.error(f"Error deleting cached media {content_hash} for {owner}: {e}")
 
-    async def get_all_support_groups_with_creator(self) -> List[Tuple[int, int, Optional[str]]]:
+    async def get_stale_support_groups(self, cutoff: datetime) -> List[Tuple[int, int, str]]:
         """
-        Returns a list of (user_id, group_id, created_by) from support_group_ids.
+        Returns (user_id, group_id, created_by) for groups whose user has no open
+        ticket and whose latest ticket was created before `cutoff`.
+        Groups without a creator session or without any tickets are left alone.
+
+        Rows are ordered by created_by so they can be batched per session.
         """
         try:
             async with self.pool.acquire() as conn:
+                # support_tickets.created_at is naive Helsinki time
                 rows = await conn.fetch("""
-                    SELECT user_id, group_id, created_by FROM support_group_ids
-                """)
+                    SELECT g.user_id, g.group_id, g.created_by
+                    FROM support_group_ids g
+                    WHERE g.created_by IS NOT NULL
+                      AND g.user_id IS NOT NULL
+                      AND NOT EXISTS (
+                          SELECT 1 FROM support_tickets o
+                          WHERE o.user_id = g.user_id AND o.closed = FALSE
+                      )
+                      AND (
+                          SELECT MAX(t.created_at) FROM support_tickets t
+                          WHERE t.user_id = g.user_id
+                      ) < ($1::timestamptz AT TIME ZONE 'Europe/Helsinki')
+                    ORDER BY g.created_by, g.user_id
+                """, cutoff)
                 return [(row['user_id'], row['group_id'], row['created_by']) for row in rows]
         except Exception as e:
-            logger.error(f"Error fetching support groups with creator: {e}")
-            return []
\ No newline at end of file
+            logger.error(f"Error fetching stale support groups: {e}")
+            return []
+
+    async def list_telethon_sessions(self) -> List[str]:
+        """Names of the userbot sessions stored in Postgres (SESSION_STORAGE=postgres)."""
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch("SELECT session_name FROM telethon_sessions ORDER BY session_name")
+                return [row["session_name"] for row in rows]
+        except Exception as e:
+            logger.error(f"Error listing telethon sessions: {e}")
+            raise
+
+    async def acquire_session_lease(self, session_name: str) -> Optional[asyncpg.Connection]:
+        """
+        Takes a userbot session's advisory lock on a dedicated connection, so its
+        auth key is never connected from two processes at once (Telegram answers
+        that with AUTH_KEY_DUPLICATED and revokes the key). The lock is held
+        until the returned connection is closed.
+
+        Returns:
+            Optional[asyncpg.Connection]: The connection holding the lock, or None
+            if another process holds it.
+        """
+        conn = await asyncpg.connect(**self._connection_settings())
+        try:
+            if await conn.fetchval(
+                "SELECT pg_try_advisory_lock(hashtext('telethon_session'), hashtext($1))", session_name
+            ):
+                return conn
+        except Exception as e:
+            logger.error(f"Error locking telethon session {session_name}: {e}")
+            await conn.close()
+            raise
+        await conn.close()
+        return None
+
+    async def get_telethon_session(self, session_name: str) -> Optional[Dict]:
+        """
+        Loads a stored userbot session.
+
+        Returns:
+            Optional[Dict]: The telethon_sessions row, plus `entities` as a list of
+            (id, hash, username, phone, name) tuples, or None if there is no such session.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow("""
+                    SELECT s.*,
+                        (SELECT array_agg(ROW(e.id, e.hash, e.username, e.phone, e.name))
+                         FROM telethon_entities e
+                         WHERE e.session_name = s.session_name) AS entities
+                    FROM telethon_sessions s
+                    WHERE s.session_name = $1
+                """, session_name)
+                if not row:
+                    return None
+                session = dict(row)
+                session["entities"] = [tuple(entity) for entity in row["entities"] or ()]
+                return session
+        except Exception as e:
+            logger.error(f"Error loading telethon session {session_name}: {e}")
+            raise
+
+    async def upsert_telethon_session(
+        self,
+        session_name: str,
+        api_id: int,
+        api_hash: str,
+        dc_id: int,
+        server_address: Optional[str],
+        port: Optional[int],
+        auth_key: Optional[bytes],
+        takeout_id: Optional[int],
+        entities: List[Tuple[int, int, Optional[str], Optional[str], Optional[str]]] = (),
+    ) -> None:
+        """
+        Stores a userbot session and adds/updates entities of its cache.
+
+        Args:
+            entities: (id, hash, username, phone, name) rows, as Telethon's session keeps them.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute("""
+                        INSERT INTO telethon_sessions
+                            (session_name, api_id, api_hash, dc_id, server_address, port, auth_key, takeout_id)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                        ON CONFLICT (session_name) DO UPDATE
+                        SET api_id = EXCLUDED.api_id,
+                            api_hash = EXCLUDED.api_hash,
+                            dc_id = EXCLUDED.dc_id,
+                            server_address = EXCLUDED.server_address,
+                            port = EXCLUDED.port,
+                            auth_key = EXCLUDED.auth_key,
+                            takeout_id = EXCLUDED.takeout_id,
+                            updated_at = now()
+                    """, session_name, api_id, api_hash, dc_id, server_address, port, auth_key, takeout_id)
+                    if entities:
+                        ids, hashes, usernames, phones, names = map(list, zip(*entities))
+                        await conn.execute("""
+                            INSERT INTO telethon_entities (session_name, id, hash, username, phone, name)
+                            SELECT $1, * FROM unnest($2::bigint[], $3::bigint[], $4::text[], $5::text[], $6::text[])
+                            ON CONFLICT (session_name, id) DO UPDATE
+                            SET hash = EXCLUDED.hash,
+                                username = EXCLUDED.username,
+                                phone = EXCLUDED.phone,
+                                name = EXCLUDED.name
+                        """, session_name, ids, hashes, usernames, phones, names)
+        except Exception as e:
+            logger.error(f"Error saving telethon session {session_name}: {e}")
+            raise
+
+    async def delete_telethon_session(self, session_name: str) -> None:
+        """Removes a stored userbot session (and its entities), e.g. after log_out()."""
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute("DELETE FROM telethon_sessions WHERE session_name = $1", session_name)
+        except Exception as e:
+            logger.error(f"Error deleting telethon session {session_name}: {e}")
+            raise
+
+    async def get_task_run(self, task_name: str) -> Optional[Dict]:
+        """
+        Returns {'started_at', 'finished_at'} of the last run of a background task, or None.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow("""
+                    SELECT started_at, finished_at FROM support_task_runs
+                    WHERE task_name = $1
+                """, task_name)
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error fetching task run for {task_name}: {e}")
+            return None
+
+    async def mark_task_started(self, task_name: str) -> None:
+        """
+        Records the start of a background task run (clears finished_at).
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO support_task_runs (task_name, started_at, finished_at)
+                    VALUES ($1, now(), NULL)
+                    ON CONFLICT (task_name)
+                    DO UPDATE SET started_at = EXCLUDED.started_at,
+                                  finished_at = NULL
+                """, task_name)
+        except Exception as e:
+            logger.error(f"Error marking task {task_name} as started: {e}")
+
+    async def mark_task_finished(self, task_name: str) -> None:
+        """
+        Records that the current run of a background task completed.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute("""
+                    UPDATE support_task_runs
+                    SET finished_at = now()
+                    WHERE task_name = $1
+                """, task_name)
+        except Exception as e:
+            logger.error(f"Error marking task {task_name} as finished: {e}")
+
+    async def count_open_tickets(self) -> Tuple[int, int]:
+        """
+        Returns (open tickets, open tickets not yet forwarded to an admin).
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow("""
+                    SELECT COUNT(*) AS open,
+                           COUNT(*) FILTER (WHERE messages_forwarded = FALSE) AS unforwarded
+                    FROM support_tickets
+                    WHERE closed = FALSE
+                """)
+                return row["open"], row["unforwarded"]
+        except Exception as e:
+            logger.error(f"Error counting open tickets: {e}")
+            raise
@@ -0,0 +1,208 @@
+# db_instrumentation.py
+"""
+One instrumentation layer for DatabaseController.
+
+Every public coroutine method is wrapped by `@instrumented`. The wrapper
+records, per outermost method call (used as the statement name):
+    - time spent waiting for a pool connection vs. executing
+    - rows returned
+    - failures
+and logs calls slower than DB_SLOW_QUERY_MS with their parameters redacted.
+
+Connections come from `InstrumentedPool`, which measures acquire wait and
+applies the statement_timeout of the method's class. The pool's default
+timeout is a server setting (see DatabaseController.config), so only
+non-default classes pay for a `SET`; asyncpg's RESET ALL on release puts
+the connection back to the default.
+"""
+import functools
+import inspect
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from config.config import Config
+from utils.logger import logger
+from utils.metrics import (
+    registry,
+    DB_QUERY_SECONDS,
+    DB_QUERY_ERRORS,
+    DB_ACQUIRE_WAIT_SECONDS,
+    DB_EXECUTE_SECONDS,
+    DB_ROWS,
+    DB_SLOW_QUERIES,
+    DB_POOL_SIZE,
+    DB_POOL_IN_USE,
+    TICKETS_OPEN,
+    TICKETS_UNFORWARDED,
+    CUSTOMER_INDEX_SIZE,
+)
+
+# Lifecycle methods, in-memory lookups (their misses are measured as has_orders) and
+# session leases (held on their own connection for as long as a userbot is connected), not queries
+UNINSTRUMENTED = {"initialize", "close", "is_customer", "acquire_session_lease"}
+
+# statement_timeout (ms) per method class. "interactive" is the pool default.
+STATEMENT_TIMEOUTS = {
+    "interactive": Config.DB_STATEMENT_TIMEOUT_MS,
+    "report": Config.DB_REPORT_STATEMENT_TIMEOUT_MS,
+}
+
+# Methods that scan many rows or aggregate; everything else is "interactive"
+METHOD_CLASSES = {
+    "get_user_and_drops": "report",
+    "get_drop_by_id": "report",
+    "get_active_support_tickets": "report",
+    "get_stale_support_groups": "report",
+    "count_open_tickets": "report",
+    "fetch_customer_ids": "report",
+}
+
+
+class _CallStats:
+    __slots__ = ("method", "statement_class", "acquire_wait")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.statement_class = METHOD_CLASSES.get(method, "interactive")
+        self.acquire_wait = 0.0
+
+
+_current_call: ContextVar[_CallStats | None] = ContextVar("db_current_call", default=None)
+
+
+class InstrumentedPool:
+    """
+    Thin wrapper over asyncpg.Pool; everything except acquire() is passed through.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    @property
+    def raw(self):
+        return self._pool
+
+    @asynccontextmanager
+    async def acquire(self):
+        call = _current_call.get()
+        started = time.perf_counter()
+        async with self._pool.acquire() as conn:
+            wait = time.perf_counter() - started
+            if call is not None:
+                call.acquire_wait += wait
+                timeout_ms = STATEMENT_TIMEOUTS[call.statement_class]
+                if timeout_ms != STATEMENT_TIMEOUTS["interactive"]:
+                    await conn.execute(f"SET statement_timeout = {int(timeout_ms)}")
+            yield conn
+
+
+def instrumented(cls):
+    """
+    Class decorator: wrap every public coroutine method of a controller so
+    its latency, acquire wait, row count and failures are recorded under
+    the method's name.
+    """
+    for name, func in list(vars(cls).items()):
+        if name.startswith("_") or name in UNINSTRUMENTED or not inspect.iscoroutinefunction(func):
+            continue
+        setattr(cls, name, _instrument(name, func))
+    return cls
+
+
+def _row_count(result) -> int | None:
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, (bool, int, float, str)):
+        return None  # status or scalar, not rows
+    return 1
+
+
+def _redact(value) -> str:
+    if value is None:
+        return "None"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (list, tuple, set)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def _redacted_params(func, args, kwargs) -> str:
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        params = list(bound.arguments.items())[1:]  # skip the controller instance
+    except TypeError:
+        params = [(str(index), value) for index, value in enumerate(args[1:])] + list(kwargs.items())
+    return ", ".join(f"{name}={_redact(value)}" for name, value in params)
+
+
+def _instrument(name: str, func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _current_call.get() is not None:
+            # Called from another instrumented method (e.g. is_role -> get_user_roles):
+            # its queries are part of the outer call and recorded there only
+            return await func(*args, **kwargs)
+
+        call = _CallStats(name)
+        token = _current_call.set(call)
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await func(*args, **kwargs)
+            return result
+        except Exception:
+            DB_QUERY_ERRORS.inc(method=name)
+            raise
+        finally:
+            _current_call.reset(token)
+            total = time.perf_counter() - started
+            execute = max(0.0, total - call.acquire_wait)
+            rows = _row_count(result)
+
+            DB_QUERY_SECONDS.observe(total, method=name)
+            DB_ACQUIRE_WAIT_SECONDS.observe(call.acquire_wait, method=name)
+            DB_EXECUTE_SECONDS.observe(execute, method=name)
+            if rows:
+                DB_ROWS.inc(rows, method=name)
+
+            if total * 1000 >= Config.DB_SLOW_QUERY_MS:
+                DB_SLOW_QUERIES.inc(method=name)
+                logger.warning(
+                    "Slow DB call %s [%s]: total=%.1fms acquire_wait=%.1fms execute=%.1fms rows=%s params=(%s)",
+                    name,
+                    call.statement_class,
+                    total * 1000,
+                    call.acquire_wait * 1000,
+                    execute * 1000,
+                    "-" if rows is None else rows,
+                    _redacted_params(func, args, kwargs),
+                )
+
+    return wrapper
+
+
+def register_db_collectors(db):
+    """Expose pool usage and open ticket counts on each metrics scrape."""
+
+    async def collect_db():
+        if db.pool is None:
+            return
+        size = db.pool.get_size()
+        DB_POOL_SIZE.set(size)
+        DB_POOL_IN_USE.set(size - db.pool.get_idle_size())
+
+        if db.customers is not None:
+            CUSTOMER_INDEX_SIZE.set(len(db.customers))
+
+        open_tickets, unforwarded_tickets = await db.count_open_tickets()
+        TICKETS_OPEN.set(open_tickets)
+        TICKETS_UNFORWARDED.set(unforwarded_tickets)
+
+    registry.add_collector(collect_db)
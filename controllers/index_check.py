@@ -0,0 +1,205 @@
+# index_check.py
+"""
+EXPLAIN-based check that every DatabaseController query is served by an index.
+
+Each DatabaseController method is called with sample arguments against a
+connection proxy that replaces fetch/fetchrow/fetchval/execute with
+`EXPLAIN (FORMAT JSON) <query>`. Nothing is executed, so the check is safe
+to run against production. Sequential scans are disabled for the session so
+any remaining Seq Scan means no usable index exists for that predicate.
+
+Run with: python -m controllers.migrations --check-indexes
+"""
+import inspect
+import json
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from controllers.db_controller import DatabaseController
+from utils.logger import logger
+
+# Sample arguments for each DatabaseController method that talks to the database.
+SAMPLE_CALLS: dict[str, dict] = {
+    "is_role": {"user_id": 1, "required_role": "admin"},
+    "is_muted": {"user_id": 1},
+    "mute_user": {"user_id": 1},
+    "get_user_by_id": {"user_id": 1},
+    "get_user_roles": {"user_id": 1},
+    "get_drop_by_id": {"drop_id": 1},
+    "has_orders": {"user_id": 1},
+    "get_orders_for_user": {"user_id": 1},
+    "fetch_bot_settings": {},
+    "get_user_and_drops": {"client_id": 1, "drop_statuses": ["paid"]},
+    "save_user_message": {"user_id": 1, "message_id": 1, "user_text": "x"},
+    "get_active_support_tickets": {"messages_forwarded": False, "user_id": 1},
+    "close_support_ticket": {"ticket_id": 1},
+    "transition_ticket": {"ticket_id": 1, "replied_upto": 1, "lang": "eng", "category": "other"},
+    "set_user_group_id": {"user_id": 1, "group_id": -1, "created_by": "+1"},
+    "get_user_group_id": {"user_id": 1},
+    "get_user_chat": {"user_id": 1},
+    "get_user_by_thread": {"group_id": -1, "thread_id": 1},
+    "mark_message_as_deleted": {"id": 1},
+    "get_message": {"user_id": 1, "message_id": 1},
+    "update_edited_message": {"user_id": 1, "message_id": 1, "new_text": "x"},
+    "set_forwarded_message_ids": {"user_id": 1, "forwarded": [(1, 1)]},
+    "get_previous_users_category_key": {"user_id": 1},
+    "delete_support_group": {"user_id": 1},
+    "free_support_group": {"user_id": 1},
+    "claim_free_support_group": {"user_id": 1, "created_by": ["1"]},
+    "get_cached_media_ref": {"content_hash": "0", "owner": "bot"},
+    "set_cached_media_ref": {"content_hash": "0", "owner": "bot", "file_ref": "x"},
+    "delete_cached_media_ref": {"content_hash": "0", "owner": "bot"},
+    "get_stale_support_groups": {"cutoff": datetime.now(timezone.utc)},
+    "get_task_run": {"task_name": "delete_unused_groups"},
+    "mark_task_started": {"task_name": "delete_unused_groups"},
+    "mark_task_finished": {"task_name": "delete_unused_groups"},
+    "count_open_tickets": {},
+    "get_telethon_session": {"session_name": "+1"},
+    "upsert_telethon_session": {
+        "session_name": "+1", "api_id": 1, "api_hash": "x", "dc_id": 2, "server_address": None,
+        "port": None, "auth_key": None, "takeout_id": None, "entities": [(1, 1, "x", None, "x")],
+    },
+    "delete_telethon_session": {"session_name": "+1"},
+}
+
+# Tables that a method reads in full by design (small tables / the driving side of a join).
+FULL_SCAN_ALLOWED: dict[str, set[str]] = {
+    "get_bot_settings": {"bot_settings"},
+    "fetch_bot_settings": {"bot_settings"},
+    "get_stale_support_groups": {"support_group_ids"},
+    "count_groups_by_creator": {"support_group_ids"},
+    "fetch_customer_ids": {"orders"},
+    "list_telethon_sessions": {"telethon_sessions"},
+}
+
+SKIPPED_METHODS = {"initialize", "close", "acquire_session_lease"}
+
+INDEX_NODE_TYPES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan", "Bitmap Heap Scan"}
+
+
+@dataclass
+class QueryCheck:
+    method: str
+    queries: int = 0
+    seq_scans: list[str] = field(default_factory=list)
+    index_scans: list[str] = field(default_factory=list)
+    note: str = ""
+
+
+def _walk_plan(node: dict, check: QueryCheck, full_scan_allowed: set[str]):
+    node_type = node.get("Node Type")
+    relation = node.get("Relation Name")
+    if relation:
+        label = f"{relation} ({node.get('Index Name') or node_type})"
+        if node_type == "Seq Scan":
+            if relation not in full_scan_allowed:
+                check.seq_scans.append(relation)
+        elif node_type in INDEX_NODE_TYPES:
+            check.index_scans.append(label)
+    for child in node.get("Plans", ()):
+        _walk_plan(child, check, full_scan_allowed)
+
+
+class _ExplainConnection:
+    """Stands in for an asyncpg connection; explains queries instead of running them."""
+
+    def __init__(self, conn, check: QueryCheck, full_scan_allowed: set[str]):
+        self._conn = conn
+        self._check = check
+        self._full_scan_allowed = full_scan_allowed
+
+    async def _explain(self, query: str, *args):
+        raw = await self._conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+        plan = json.loads(raw) if isinstance(raw, str) else raw
+        self._check.queries += 1
+        _walk_plan(plan[0]["Plan"], self._check, self._full_scan_allowed)
+
+    async def fetch(self, query, *args, **kwargs):
+        await self._explain(query, *args)
+        return []
+
+    async def fetchrow(self, query, *args, **kwargs):
+        await self._explain(query, *args)
+        return None
+
+    async def fetchval(self, query, *args, **kwargs):
+        await self._explain(query, *args)
+        return None
+
+    async def execute(self, query, *args, **kwargs):
+        await self._explain(query, *args)
+        return "UPDATE 0"
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class _ExplainPool:
+    def __init__(self, conn):
+        self._conn = conn
+        self.current: _ExplainConnection | None = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.current
+
+
+async def check_index_usage(pool) -> list[QueryCheck]:
+    """
+    Explain the queries of every DatabaseController method.
+
+    Returns:
+        list[QueryCheck]: One entry per method; `seq_scans` lists relations read
+        without an index.
+    """
+    results = []
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+
+            explain_pool = _ExplainPool(conn)
+            db = DatabaseController(bot=None)
+            db.pool = explain_pool
+
+            for name, method in inspect.getmembers(db, inspect.iscoroutinefunction):
+                if name.startswith("_") or name in SKIPPED_METHODS:
+                    continue
+                check = QueryCheck(method=name)
+                results.append(check)
+
+                kwargs = SAMPLE_CALLS.get(name)
+                if kwargs is None:
+                    if name in FULL_SCAN_ALLOWED:
+                        kwargs = {}
+                    else:
+                        check.note = "no sample arguments in SAMPLE_CALLS"
+                        continue
+
+                explain_pool.current = _ExplainConnection(conn, check, FULL_SCAN_ALLOWED.get(name, set()))
+                try:
+                    # Savepoint, so a failing EXPLAIN doesn't abort the remaining checks
+                    async with conn.transaction():
+                        await method(**kwargs)
+                except Exception as e:
+                    # Result handling in the method may choke on the empty stand-in
+                    # rows; the queries explained up to that point are still reported.
+                    check.note = f"stopped after {check.queries} quer{'y' if check.queries == 1 else 'ies'}: {type(e).__name__}"
+                    logger.debug("Index check for %s stopped early: %s", name, e)
+
+    return results
+
+
+def format_report(results: list[QueryCheck]) -> str:
+    lines = [f"Index usage check ({datetime.now(timezone.utc):%Y-%m-%d %H:%M} UTC)"]
+    for check in sorted(results, key=lambda c: (not c.seq_scans, c.method)):
+        status = "SEQ SCAN" if check.seq_scans else ("ok" if check.queries else "skipped")
+        detail = ", ".join(sorted(set(check.seq_scans))) if check.seq_scans else ", ".join(sorted(set(check.index_scans)))
+        line = f"  [{status:>8}] {check.method}"
+        if detail:
+            line += f": {detail}"
+        if check.note:
+            line += f" ({check.note})"
+        lines.append(line)
+    return "\n".join(lines)
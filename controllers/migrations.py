@@ -0,0 +1,128 @@
+# migrations.py
+import argparse
+import asyncio
+import re
+from pathlib import Path
+
+import asyncpg
+from asyncpg.exceptions import PostgresError
+
+from utils.logger import logger
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Arbitrary constant so that only one process applies migrations at a time
+MIGRATION_LOCK_ID = 73120041
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> list[tuple[int, str, Path]]:
+    """
+    List migration files as (version, name, path), ordered by version.
+
+    Files must be named NNNN_description.sql. Duplicate versions are rejected.
+    """
+    migrations = []
+    seen = set()
+    for path in sorted(directory.glob("*.sql")):
+        match = MIGRATION_FILE_PATTERN.match(path.name)
+        if not match:
+            logger.warning(f"Ignoring migration file with unexpected name: {path.name}")
+            continue
+        version = int(match.group(1))
+        if version in seen:
+            raise ValueError(f"Duplicate migration version {version}: {path.name}")
+        seen.add(version)
+        migrations.append((version, match.group(2), path))
+    return migrations
+
+
+async def run_migrations(pool: asyncpg.Pool) -> list[int]:
+    """
+    Apply all pending migrations, each in its own transaction.
+
+    Applied versions are tracked in schema_migrations. An advisory lock
+    serializes concurrent runners (e.g. two bot replicas starting together).
+
+    Returns:
+        list[int]: Versions applied by this call.
+    """
+    applied_now = []
+    async with pool.acquire() as conn:
+        # Index builds can outlast the pool's statement_timeout; reset on release
+        await conn.execute("SET statement_timeout = 0")
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version    INTEGER     PRIMARY KEY,
+                    name       TEXT        NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            )
+            applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+
+            for version, name, path in discover_migrations():
+                if version in applied:
+                    continue
+                sql = path.read_text(encoding="utf-8")
+                try:
+                    async with conn.transaction():
+                        await conn.execute(sql)
+                        await conn.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                            version,
+                            name,
+                        )
+                except PostgresError as e:
+                    logger.error(f"Migration {version:04d}_{name} failed: {e}")
+                    raise
+                applied_now.append(version)
+                logger.info(f"Applied migration {version:04d}_{name}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    if not applied_now:
+        logger.debug("Database schema is up to date")
+    return applied_now
+
+
+async def _cli():
+    from config.config import Config
+
+    parser = argparse.ArgumentParser(description="Apply support bot schema migrations.")
+    parser.add_argument(
+        "--check-indexes",
+        action="store_true",
+        help="After migrating, EXPLAIN every DatabaseController query and report sequential scans.",
+    )
+    args = parser.parse_args()
+
+    pool = await asyncpg.create_pool(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASS,
+        database=Config.DB_NAME,
+        min_size=1,
+        max_size=2,
+    )
+    try:
+        applied = await run_migrations(pool)
+        print(f"Applied {len(applied)} migration(s): {applied}" if applied else "Schema up to date")
+
+        if args.check_indexes:
+            from controllers.index_check import check_index_usage, format_report
+
+            results = await check_index_usage(pool)
+            print(format_report(results))
+            if any(result.seq_scans for result in results):
+                raise SystemExit(1)
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_cli())
@@ -9,7 +9,7 @@ async def handle_voice_message(db, bot, user, ticket, lang):
 
 async def handle_thanks(db, bot, user, ticket, lang):
     user_id = user.get("user_id")
-    await db.close_support_ticket(ticket.get('ticket_id'))
+    await db.close_support_ticket(ticket.ticket_id)
     await bot.send_message(user_id, "👍")
     return
 
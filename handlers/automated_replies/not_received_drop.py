@@ -36,7 +36,7 @@ Message 3:
 \"\"\"{message3_lv}\"\"\"
 """
 
-    ai_response = await query_nano_gpt(prompt)
+    ai_response = await query_nano_gpt(prompt, call_site="not_received_drop")
 
     fallback_variations = {
         "lv": [
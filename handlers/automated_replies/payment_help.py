@@ -1,13 +1,13 @@
 from aiogram import Bot
-from aiogram.types import InputMediaPhoto, FSInputFile
 from controllers.db_controller import DatabaseController
 from utils.telegram_helpers import forward_ticket_to_admin
+from utils.media_registry import send_cached_media_group
 import asyncio
 import random
 
 
 async def handle_payment_help(db, bot, user, ticket, lang):
-    await db.close_support_ticket(ticket.get('ticket_id'))
+    await db.close_support_ticket(ticket.ticket_id)
     user_id = user.get("user_id")
 
     # --- Localized crypto guide messages ---
@@ -136,11 +136,8 @@ async def handle_payment_help(db, bot, user, ticket, lang):
         disable_web_page_preview=True
     )
 
-    # --- Send card payment media ---
-    photo1 = FSInputFile("data/card_payment_1.jpg")
-    photo2 = FSInputFile("data/card_payment_2.jpg")
-    media = [
-        InputMediaPhoto(media=photo1, caption=card_caption, parse_mode="HTML"),
-        InputMediaPhoto(media=photo2)
-    ]
-    await bot.send_media_group(user_id, media)
+    # --- Send card payment media (uploaded once, then re-sent by file_id) ---
+    await send_cached_media_group(db, bot, user_id, [
+        ("data/card_payment_1.jpg", {"caption": card_caption, "parse_mode": "HTML"}),
+        ("data/card_payment_2.jpg", {}),
+    ])
@@ -3,7 +3,7 @@ import random
 
 async def handle_product_arrival_time(db, bot, user, ticket, lang):
     user_id = user.get("user_id")
-    await db.close_support_ticket(ticket.get('ticket_id'))
+    await db.close_support_ticket(ticket.ticket_id)
 
     messages = {
     "lv": """Piegādes laiks pēc maksājuma:
@@ -3,7 +3,7 @@ import random
 from utils.helpers import query_nano_gpt
 
 async def handle_check_product_availability(db, bot, user, ticket, lang):
-    await db.close_support_ticket(ticket.get('ticket_id'))
+    await db.close_support_ticket(ticket.ticket_id)
 
     bot_settings = await db.get_bot_settings()
     bot_username = bot_settings.get('bot_username', 'narvesen247')
@@ -32,7 +32,7 @@ Message 2:
 """
 
     # Ask AI to handle both messages
-    ai_response = await query_nano_gpt(prompt)
+    ai_response = await query_nano_gpt(prompt, call_site="product_availability")
 
     if ai_response:
         ai_response = ai_response.replace("\\n", "\n")
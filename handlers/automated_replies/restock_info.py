@@ -2,7 +2,7 @@ from utils.helpers import query_nano_gpt
 
 async def handle_restock_info(db, bot, user, ticket, lang):
     user_id = user.get("user_id")
-    await db.close_support_ticket(ticket.get('ticket_id'))
+    await db.close_support_ticket(ticket.ticket_id)
 
     # Normalize language
     target_lang = lang if lang in ["lv", "ee", "ru", "eng"] else "eng"
@@ -23,7 +23,7 @@ Original text:
 """
 
     # Query the AI for the translated and rephrased message
-    ai_response = await query_nano_gpt(prompt)
+    ai_response = await query_nano_gpt(prompt, call_site="restock_info")
 
     # Send the AI-generated message to the user
     if ai_response:
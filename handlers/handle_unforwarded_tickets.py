@@ -1,10 +1,14 @@
 import asyncio
+import time
 import pytz
 from aiogram import Bot
 from datetime import datetime, timedelta, timezone
 from config.config import Config
 from utils.logger import logger
 from utils.helpers import query_nano_gpt, is_emoji_only
+from utils.ticket_classifier import TicketClassifier
+from utils.debouncer import Debouncer
+from utils.metrics import POLLER_LOOP_SECONDS, POLLER_LAG_SECONDS
 from utils.telegram_helpers import is_message_deleted, forward_ticket_to_admin
 from handlers.automated_replies import *
 from handlers.automated_replies.misc_replies import get_time_based_message
@@ -40,60 +44,99 @@ USER_CONVERSATIONS = {
 
 LANGUAGES = ['lv', 'eng', 'ru', 'ee']
 
+ticket_classifier = TicketClassifier(
+    categories=list(USER_CONVERSATIONS),
+    languages=LANGUAGES,
+    max_batch=Config.CLASSIFY_BATCH_SIZE,
+    max_wait=Config.CLASSIFY_BATCH_WAIT_MS / 1000,
+)
 
-async def handle_unforwarded_tickets(db: DatabaseController, bot: Bot):
-    """
-    Periodically checks for unclosed and unforwardeed tickets (not forwarded to admin for further processing).
-    For each one, runs a separate task to handle it.
 
-    If ticket uncategorised (support_issue=None) then categorise the issue.
-    Else retrieve additional info from user to complete ticket.
+async def handle_unforwarded_tickets(db: DatabaseController, bot: Bot, debouncer: Debouncer):
+    """
+    Unforwarded tickets are handed to processing by `debouncer` (see
+    handle_quiet_ticket), which UserMiddleware re-arms on every message, so a
+    ticket is handled as soon as its user has been quiet for
+    TICKET_QUIET_SECONDS (at most TICKET_MAX_WAIT_SECONDS after the first
+    message of the burst).
+
+    This task only:
+        - on startup, re-arms timers for tickets left pending by a restart
+        - every TICKET_HOUSEKEEPING_INTERVAL, closes replied tickets inactive
+          for 2 days and re-arms any pending ticket that has no timer
     """
+    interval = Config.TICKET_HOUSEKEEPING_INTERVAL
+    next_run = time.monotonic()
     while True:
+        started = time.monotonic()
+        POLLER_LAG_SECONDS.set(max(0.0, started - next_run))
         try:
             active_unforwarded_tickets = await db.get_active_support_tickets(messages_forwarded=False)
+            now = datetime.now(timezone.utc)
+            stale_ticket_ids = []
 
             for ticket in active_unforwarded_tickets:
-                ticket_id = ticket.get("ticket_id")
-                messages = ticket.get("messages", [])
-                support_issue = ticket.get("support_issue")
-
-                messages.sort(key=lambda msg: msg["message_id"])
+                # Messages arrive ordered by message_id, no need to sort
+                last_msg = ticket.last_message
+                if last_msg is None:
+                    continue
 
-                # Skip if user hasn't replied
-                last_msg = messages[-1]
-                last_msg_time = last_msg.get("created_at") # UTC
-                time_diff = datetime.now(timezone.utc) - last_msg_time
-                if last_msg.get("replied"): 
+                time_diff = now - last_msg.created_at # UTC
+                if last_msg.replied:
                     # Close inactive tickets older than 2 days (if not forwarded to admin)
                     if time_diff > timedelta(days=2):
-                        await db.close_support_ticket(ticket_id)
+                        stale_ticket_ids.append(ticket.ticket_id)
                     continue
 
-                # Reply to user if his latest message was more than 2 minutes ago
-                if time_diff > timedelta(seconds=5): # TODO Placeholer 5sec for testing
-                    # Mark as handled
-                    await db.mark_messages_as_replied(ticket_id)
-                    if not support_issue:
-                        asyncio.create_task(categorise_ticket(db, bot, ticket))
-                    else:
-                        asyncio.create_task(handle_categorised_unforwarded_ticket(db, bot, ticket))
+                if not debouncer.is_pending(ticket.user_id):
+                    first_unreplied = next(msg for msg in ticket.messages if not msg.replied)
+                    debouncer.touch(
+                        ticket.user_id,
+                        delay=max(0.0, debouncer.quiet_period - time_diff.total_seconds()),
+                        started_ago=(now - first_unreplied.created_at).total_seconds(),
+                    )
 
-            await asyncio.sleep(10)
+            if stale_ticket_ids:
+                await db.transition_ticket(stale_ticket_ids, closed=True)
         except Exception as e:
             logger.error(f"Error in handle_unforwarded_tickets: {e}")
 
+        POLLER_LOOP_SECONDS.set(time.monotonic() - started)
+        next_run = time.monotonic() + interval
+        await asyncio.sleep(interval)
+
+
+async def handle_quiet_ticket(db: DatabaseController, bot: Bot, user_id: int):
+    """
+    Debouncer callback: the user has stopped typing, handle their open unforwarded ticket.
+
+    If ticket uncategorised (support_issue=None) then categorise the issue.
+    Else retrieve additional info from user to complete ticket.
+    """
+    for ticket in await db.get_active_support_tickets(messages_forwarded=False, user_id=user_id):
+        last_msg = ticket.last_message
+        if last_msg is None or last_msg.replied:
+            continue
+
+        # Mark as handled (messages arriving from now on start a new round). The handlers
+        # below get the ticket as fetched, where these messages are still unreplied.
+        await db.transition_ticket(ticket.ticket_id, replied_upto=last_msg.message_id)
+        if not ticket.support_issue:
+            await categorise_ticket(db, bot, ticket)
+        else:
+            await handle_categorised_unforwarded_ticket(db, bot, ticket)
+
 async def categorise_ticket(db: DatabaseController, bot: Bot, ticket):
     try:
-        user_id = ticket.get("user_id")
+        user_id = ticket.user_id
         user = await db.get_user_by_id(user_id)
-        messages = ticket.get("messages", [])
+        messages = ticket.messages
         unread_messages = []
 
         for msg in messages:
-            msg_text = msg.get("user_text")
-            if await is_message_deleted(bot, user_id, msg.get('message_id')):
-                await db.mark_message_as_deleted(msg.get('id'))
+            msg_text = msg.user_text
+            if await is_message_deleted(bot, user_id, msg.message_id):
+                await db.mark_message_as_deleted(msg.id)
                 continue
             unread_messages.append(msg_text)
 
@@ -101,7 +144,7 @@ async def categorise_ticket(db: DatabaseController, bot: Bot, ticket):
             return  # Nothing to respond to
 
         if len(unread_messages) > 50: # Block if spam?
-            await db.set_messages_forwarded_for_ticket(ticket.get('ticket_id'))
+            await db.transition_ticket(ticket.ticket_id, forwarded=True)
             await db.mute_user(user_id)
             # await forward_ticket_to_admin(db, bot, user, ticket, lang)
             return
@@ -110,58 +153,31 @@ async def categorise_ticket(db: DatabaseController, bot: Bot, ticket):
         if all(msg in ["(photo)", "(video)", "(video_note)"] for msg in unread_messages):
             category_key = 'other'
             lang = 'other'
-            await db.set_lang_and_category_for_ticket(category_key, lang, ticket.get('ticket_id'))
+            await db.transition_ticket(ticket.ticket_id, lang=lang, category=category_key)
             await forward_ticket_to_admin(db, bot, user, ticket, lang)
             return
         elif all(msg in ["(voice)", "(audio)"] for msg in unread_messages):
             category_key = 'voice_message'
             lang = 'other'
-            await db.set_lang_and_category_for_ticket(category_key, lang, ticket.get('ticket_id'))
+            await db.transition_ticket(ticket.ticket_id, lang=lang, category=category_key, closed=True)
             prev_support_issue = await db.get_previous_users_category_key(user_id)
-            await db.close_support_ticket(ticket.get('ticket_id'))
             if not prev_support_issue in ["(voice)", "(audio)"]:
                 await handle_voice_message(db, bot, user, ticket, lang) 
             return
         elif all(is_emoji_only(msg) or msg in ["(sticker)", "(animation)", "(document)", "(other)"] for msg in unread_messages):
-            await db.close_support_ticket(ticket.get('ticket_id'))
+            await db.transition_ticket(ticket.ticket_id, closed=True)
             return
 
-        # Use Nano-GPT to classify the issue
+        # Use Nano-GPT to classify the issue (batched with other tickets pending at the same time)
         input_text = "\n".join(unread_messages)
-        prompt = f"""
-Classify the following user messages into:
-
-1. One of the following **categories**:
-\"\"\"{"\n".join(USER_CONVERSATIONS.keys())}\"\"\"
-
-2. One of the following **languages**:
-lv, eng, ru, ee
-
-If you are not more than 80% confident about either the category or the language, use 'other'.
-
-User messages:
-\"\"\"{input_text}\"\"\"
+        classification = await ticket_classifier.classify(ticket.ticket_id, input_text)
 
-Respond **only** in this format (no extra explanation):
-lang:category
-"""
-        
-        lang_and_category_key = await query_nano_gpt(prompt)
-
-        if ':' in lang_and_category_key:
-            lang, category_key = lang_and_category_key.strip().split(':', 1)
-            # Normalize and validate
-            lang = lang.strip().lower()
-            category_key = category_key.strip()
-
-            # Handle unexpected output
-            category_key = 'other' if category_key not in USER_CONVERSATIONS else category_key
-            lang = 'other' if lang not in LANGUAGES else lang
-
-            logger.info(f"Detected language: {lang}")
-            logger.info(f"Detected response category: {category_key}")
+        if classification:
+            lang, category_key = classification
+            log_context = {"user_id": user_id, "ticket_id": ticket.ticket_id}
+            logger.info("Detected language: %s", lang, extra=log_context)
+            logger.info("Detected response category: %s", category_key, extra=log_context)
         else:
-            logger.warning(f"Unexpected format from GPT: '{lang_and_category_key}'")
             lang = 'other'
             category_key = 'other'
 
@@ -173,9 +189,9 @@ lang:category
                 previous_users_category_key = await db.get_previous_users_category_key(user_id)
                 # Close ticket and dont reply if user spamming the same question.
                 if category_key == previous_users_category_key:
-                    await db.close_support_ticket(ticket.get('ticket_id'))
+                    await db.transition_ticket(ticket.ticket_id, closed=True)
                     return
-            await db.set_lang_and_category_for_ticket(category_key, lang, ticket.get('ticket_id'))
+            await db.transition_ticket(ticket.ticket_id, lang=lang, category=category_key)
             if category_key == "cant_find_product_or_drop_or_dead_drop": # Lost drop with proof
                 if any(msg in ["(photo)", "(video)", "(video_note)"] for msg in unread_messages):
                     await forward_ticket_to_admin(db, bot, user, ticket, lang)
@@ -195,11 +211,11 @@ async def handle_categorised_unforwarded_ticket(db: DatabaseController, bot: Bot
     
     """
     try:
-        user_id = ticket.get("user_id")
+        user_id = ticket.user_id
         user = await db.get_user_by_id(user_id)
-        messages = ticket.get("messages", [])
-        support_issue = ticket.get("support_issue")
-        lang = ticket.get("lang")
+        messages = ticket.messages
+        support_issue = ticket.support_issue
+        lang = ticket.lang
         all_messages = []
 
 
@@ -211,13 +227,13 @@ async def handle_categorised_unforwarded_ticket(db: DatabaseController, bot: Bot
         read_messages = []
 
         for msg in messages:
-            msg_text = msg.get("user_text")
+            msg_text = msg.user_text
 
-            if await is_message_deleted(bot, user_id, msg.get("message_id")):
-                await db.mark_message_as_deleted(msg.get("id"))
+            if await is_message_deleted(bot, user_id, msg.message_id):
+                await db.mark_message_as_deleted(msg.id)
                 continue
 
-            if not msg.get("replied", False):
+            if not msg.replied:
                 unread_messages.append(msg_text)
             else:
                 read_messages.append(msg_text)
@@ -227,7 +243,7 @@ async def handle_categorised_unforwarded_ticket(db: DatabaseController, bot: Bot
             return  # Nothing to respond to
 
         if len(all_messages) > 50: # Block if spam?
-            await db.set_messages_forwarded_for_ticket(ticket.get('ticket_id'))
+            await db.transition_ticket(ticket.ticket_id, forwarded=True)
             await db.mute_user(user_id)
             # await forward_ticket_to_admin(db, bot, user, ticket, lang)
             return
@@ -274,9 +290,11 @@ User messages:
 Respond with only one word: Complaint or Resolved.
 """
 
-        message_classification = await query_nano_gpt(prompt)
-        
-        if message_classification.strip().lower() == 'complaint':
+        message_classification = await query_nano_gpt(prompt, call_site="classify_resolution")
+        # No answer (LLM down or circuit open) is treated like "Complaint", as the prompt instructs when unsure
+        message_classification = (message_classification or "Complaint").strip().lower()
+
+        if message_classification == 'complaint':
             if support_issue == "cant_find_product_or_drop_or_dead_drop":
                 message_main = message_variations_courier.get(lang, message_variations_courier["eng"])
                 await bot.send_message(user_id, message_main)
@@ -290,7 +308,7 @@ Respond with only one word: Complaint or Resolved.
                     await bot.send_message(user_id, message_time)
 
                 await forward_ticket_to_admin(db, bot, user, ticket, lang)
-        elif message_classification.strip().lower() == 'resolved':
+        elif message_classification == 'resolved':
             await handle_thanks(db, bot, user, ticket, lang)
 
     except Exception as e:
@@ -1,10 +1,11 @@
 from aiogram import Router
-from aiogram.types import Message, FSInputFile
+from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ChatType
 from utils.logger import logger
 from controllers.db_controller import DatabaseController
 from utils.helpers import is_similar_to_start
+from utils.media_registry import send_cached_photo
 
 router = Router()
 @router.message(lambda message: message.chat.type == ChatType.PRIVATE and is_similar_to_start(message.text))
@@ -15,7 +16,7 @@ async def start_handler(
     try:
         user_id = message.from_user.id
         username = message.from_user.username
-        user_has_orders = await db.get_order_count_for_user(user_id)
+        user_has_orders = await db.is_customer(user_id)
         bot_settings = await db.get_bot_settings()
         bot_username = bot_settings.get('bot_username', '')
 
@@ -60,8 +61,11 @@ async def start_handler(
         )
 
         # Send welcome message
-        await message.answer_photo(
-            photo=FSInputFile("data/narvesen.jpg"),
+        await send_cached_photo(
+            db,
+            message.bot,
+            message.chat.id,
+            "data/narvesen.jpg",
             caption=welcome_text,
             parse_mode="HTML"
         )
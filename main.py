@@ -3,22 +3,45 @@ import asyncio
 from aiogram import Bot, Dispatcher
 from handlers import register_handlers
 from tasks.delete_unused_groups import delete_unused_groups
-from handlers.handle_unforwarded_tickets import handle_unforwarded_tickets
+from handlers.handle_unforwarded_tickets import handle_unforwarded_tickets, handle_quiet_ticket, ticket_classifier
 from config.config import Config
 from controllers.db_controller import DatabaseController
-from middlewares import DatabaseMiddleware, UserMiddleware, AdminMiddleware
+from controllers.db_instrumentation import register_db_collectors
+from middlewares import DatabaseMiddleware, UserMiddleware, AdminMiddleware, BotApiMetricsMiddleware
 from utils.logger import logger
+from utils.metrics import start_metrics_server
+from utils.debouncer import Debouncer
 
 
 async def main():
+    if Config.SUPPORT_ROUTING_MODE == "topics" and not Config.SUPPORT_FORUM_CHAT_ID:
+        raise ValueError("SUPPORT_ROUTING_MODE=topics needs SUPPORT_FORUM_CHAT_ID")
+    if Config.SESSION_STORAGE not in ("files", "postgres"):
+        raise ValueError(f"Unknown SESSION_STORAGE {Config.SESSION_STORAGE!r}, expected files or postgres")
+
     bot = Bot(token=Config.BOT_TOKEN)
     dp = Dispatcher()
 
+    bot.session.middleware(BotApiMetricsMiddleware())
+
     # Initialize database
     db = await DatabaseController(bot).initialize()
 
+    # Optional Prometheus endpoint
+    metrics_runner = None
+    if Config.METRICS_PORT:
+        register_db_collectors(db)
+        metrics_runner = await start_metrics_server(Config.METRICS_HOST, Config.METRICS_PORT)
+
+    # Tickets are handled once their user stops typing
+    ticket_debouncer = Debouncer(
+        Config.TICKET_QUIET_SECONDS,
+        Config.TICKET_MAX_WAIT_SECONDS,
+        lambda user_id: handle_quiet_ticket(db, bot, user_id),
+    )
+
     # Register middlewares
-    dp.update.middleware(UserMiddleware(db, bot))
+    dp.update.middleware(UserMiddleware(db, bot, ticket_debouncer))
     dp.update.middleware(AdminMiddleware(db, bot))
     dp.message.middleware(DatabaseMiddleware(db))
     dp.callback_query.middleware(DatabaseMiddleware(db)) 
@@ -27,7 +50,7 @@ async def main():
     register_handlers(dp)
 
     # Register async tasks
-    asyncio.create_task(handle_unforwarded_tickets(db, bot))
+    asyncio.create_task(handle_unforwarded_tickets(db, bot, ticket_debouncer))
     asyncio.create_task(delete_unused_groups(db))
 
     logger.info("Starting bot polling...")
@@ -36,6 +59,9 @@ async def main():
     except Exception as e:
         logger.error(f"Bot polling failed: {e}")
     finally:
+        await ticket_classifier.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await bot.session.close()
         logger.info("Bot session closed")
         await db.close()
@@ -2,5 +2,6 @@
 from .database import DatabaseMiddleware
 from .user_middleware import UserMiddleware
 from .admin_group_middleware import AdminMiddleware
+from .bot_api_metrics import BotApiMetricsMiddleware
 
-__all__ = ["DatabaseMiddleware", "UserMiddleware", "AdminMiddleware"]
\ No newline at end of file
+__all__ = ["DatabaseMiddleware", "UserMiddleware", "AdminMiddleware", "BotApiMetricsMiddleware"]
\ No newline at end of file
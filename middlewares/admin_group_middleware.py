@@ -2,6 +2,7 @@ from aiogram import BaseMiddleware, Bot
 from aiogram.types import Update, Chat, Message
 from aiogram.enums import ChatType
 from typing import Callable, Awaitable, Any, Dict
+from config.config import Config
 from controllers.db_controller import DatabaseController
 from utils.logger import logger
 
@@ -20,7 +21,16 @@ class AdminMiddleware(BaseMiddleware):
     ) -> Any:
         try:
             msg = event.message
-            if not msg or msg.chat.type != ChatType.GROUP:
+            if not msg:
+                return await handler(event, data)
+
+            # A topic of the forum supergroup (SUPPORT_ROUTING_MODE=topics), or a user's own group
+            in_user_topic = (
+                msg.chat.type == ChatType.SUPERGROUP
+                and msg.chat.id == Config.SUPPORT_FORUM_CHAT_ID
+                and msg.is_topic_message
+            )
+            if msg.chat.type != ChatType.GROUP and not in_user_topic:
                 return await handler(event, data)
 
             user = msg.from_user
@@ -29,12 +39,17 @@ class AdminMiddleware(BaseMiddleware):
 
             is_admin = await self.db.is_role(user.id, 'admin')
             if is_admin:
-                # Fetch chat info from Bot API
-                chat: Chat = await self.bot.get_chat(msg.chat.id)
-                user_id = chat.description  # Assuming description is user_id
+                if in_user_topic:
+                    user_id = await self.db.get_user_by_thread(msg.chat.id, msg.message_thread_id)
+                    if user_id is None: # A topic that isn't a user's
+                        return await handler(event, data)
+                else:
+                    # Fetch chat info from Bot API
+                    chat: Chat = await self.bot.get_chat(msg.chat.id)
+                    user_id = chat.description  # Assuming description is user_id
                 user_active_tickets = await self.db.get_active_support_tickets(user_id=int(user_id))
                 if not user_active_tickets:
-                    await self.bot.send_message(msg.chat.id, "‼️MESSAGE NOT SENT‼️\n\nℹ️ You can't chat with the client until this bot sends another ticket from him!\nℹ️ Write him a private message from your account if you need to talk to him.")
+                    await msg.answer("‼️MESSAGE NOT SENT‼️\n\nℹ️ You can't chat with the client until this bot sends another ticket from him!\nℹ️ Write him a private message from your account if you need to talk to him.")
                     return await handler(event, data)
 
                 # Send the message content to the user
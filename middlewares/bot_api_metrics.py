@@ -0,0 +1,30 @@
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType, Response
+from utils.metrics import BOT_API_REQUESTS, BOT_API_RATE_LIMITED, BOT_API_ERRORS
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Session middleware counting every outgoing Bot API call by method,
+    plus 429 (retry after) responses and other failures.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        BOT_API_REQUESTS.inc(method=api_method)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            BOT_API_RATE_LIMITED.inc(method=api_method)
+            raise
+        except (TelegramAPIError, OSError):
+            BOT_API_ERRORS.inc(method=api_method)
+            raise
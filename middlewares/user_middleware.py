@@ -1,16 +1,33 @@
 from aiogram import BaseMiddleware, Bot
-from aiogram.types import Update, Message
+from aiogram.types import Update, Message, ReplyParameters
 from aiogram.enums import ChatType
 from typing import Callable, Awaitable, Any, Dict
+from config.config import Config
 from controllers.db_controller import DatabaseController
 from utils.logger import logger
 from utils.helpers import is_similar_to_start
+from utils.metrics import FLOOD_DROPPED, FLOOD_MUTED
+from utils.rate_limiter import SlidingWindowLimiter, ALLOW, DROP, MUTE
+from utils.debouncer import Debouncer
 
 
 class UserMiddleware(BaseMiddleware):
-    def __init__(self, db: DatabaseController, bot: Bot):
+    def __init__(self, db: DatabaseController, bot: Bot, debouncer: Debouncer | None = None):
         self.db = db
         self.bot = bot # Aiogram bot
+        self.debouncer = debouncer # Re-armed per user on each message that awaits an automated reply
+        self.flood_limiter = SlidingWindowLimiter(
+            window=Config.FLOOD_WINDOW_SECONDS,
+            limits={
+                "text": Config.FLOOD_LIMIT_TEXT,
+                "media": Config.FLOOD_LIMIT_MEDIA,
+                "edit": Config.FLOOD_LIMIT_EDIT,
+            },
+            mute_factor=Config.FLOOD_MUTE_FACTOR,
+        )
+        # Bursts of edits to one message are handled once, with the final text
+        self.pending_edits: dict[tuple[int, int], str] = {} # (chat_id, message_id) -> latest text
+        self.edit_debouncer = Debouncer(Config.EDIT_COALESCE_SECONDS, Config.EDIT_COALESCE_MAX_WAIT_SECONDS, self.flush_edit)
         super().__init__()
 
     async def __call__(
@@ -25,27 +42,38 @@ class UserMiddleware(BaseMiddleware):
                 return await handler(event, data)
 
             user = msg.from_user
+
             if await self.db.is_muted(int(user.id)):
                 return await handler(event, data)
 
-            if not await self.db.get_order_count_for_user(int(user.id)):
+            if not await self.db.is_customer(int(user.id)):
                 return await handler(event, data)
 
+            # Flood control happens in memory, before this message is written anywhere
+            if msg.chat.type == ChatType.PRIVATE:
+                kind = "edit" if event.edited_message else "text" if msg.text else "media"
+                verdict = self.flood_limiter.check(int(user.id), kind, group=msg.media_group_id)
+                if verdict != ALLOW and await self.has_forwarded_ticket(int(user.id)):
+                    verdict = ALLOW # An admin is handling the ticket, everything reaches them
+                if verdict == MUTE:
+                    FLOOD_MUTED.inc()
+                    logger.warning("Muting user %s for flooding (%s messages)", user.id, kind, extra={"user_id": user.id})
+                    await self.db.mute_user(int(user.id))
+                    return await handler(event, data)
+                if verdict == DROP:
+                    FLOOD_DROPPED.inc(kind=kind)
+                    logger.debug("Dropped %s message %s from user %s over flood limit", kind, msg.message_id, user.id)
+                    return await handler(event, data)
+
             # Handle group/channel messages
             if msg.chat.type != ChatType.PRIVATE:
                 return await handler(event, data)
             
-            # Handle edited messages
+            # Handle edited messages (see flush_edit)
             if event.edited_message:
-                message = await self.db.get_message(msg.chat.id, msg.message_id)
-                new_text = msg.text
-                if not message.get('messages_forwarded'):
-                    # Register the edit only if it hasnt been replied to
-                    await self.db.update_edited_message(msg.chat.id, msg.message_id, new_text)
-                else:
-                    # If messages have been forwarded to admin then send the update to admin
-                    user_group_id = await self.db.get_user_group_id(msg.chat.id)
-                    await self.bot.send_message(chat_id=user_group_id, text=f"(EDITED MESSAGE)\n{new_text}")
+                key = (msg.chat.id, msg.message_id)
+                self.pending_edits[key] = msg.text
+                self.edit_debouncer.touch(key)
                 return await handler(event, data)
 
 
@@ -61,28 +89,33 @@ class UserMiddleware(BaseMiddleware):
             content = self.get_message_content(msg)
 
             user_has_forwarded_and_unclosed_ticket = await self.db.get_active_support_tickets(messages_forwarded=True, user_id=user.id)
+            self.flood_limiter.set_exempt(int(user.id), bool(user_has_forwarded_and_unclosed_ticket))
 
             if user_has_forwarded_and_unclosed_ticket: # Make admin respond
-                user_group_id = await self.db.get_user_group_id(user.id)
-                await self.bot.forward_message(
+                user_group_id, thread_id = await self.db.get_user_chat(user.id)
+                forwarded = await self.bot.forward_message(
                     user_group_id,
                     user.id,
-                    msg.message_id
+                    msg.message_id,
+                    message_thread_id=thread_id
                 )
                 await self.db.save_user_message(
                     user_id=user.id,
                     message_id=msg.message_id,
                     user_text=content,
-                    replied=True
+                    replied=True,
+                    forwarded_message_id=forwarded.message_id
                 )
             else: # Make AI respond
-                await self.db.save_user_message(
+                stored = await self.db.save_user_message(
                     user_id=user.id,
                     message_id=msg.message_id,
                     user_text=content
                 )
+                if stored and self.debouncer:
+                    self.debouncer.touch(user.id)
 
-            logger.info(f"{user.first_name} ({user.id}): {content}")
+            logger.info("%s (%s): %s", user.first_name, user.id, content, extra={"user_id": user.id})
             return await handler(event, data)
 
         except Exception as e:
@@ -91,6 +124,44 @@ class UserMiddleware(BaseMiddleware):
             )
             return await handler(event, data)
 
+    async def has_forwarded_ticket(self, user_id: int) -> bool:
+        """
+        Whether an admin is handling the user's ticket, for messages over the flood limit.
+        Remembered in the limiter's per-user state (refreshed by every stored message),
+        so a flood costs at most one lookup.
+        """
+        forwarded = self.flood_limiter.is_exempt(user_id)
+        if forwarded is None:
+            forwarded = bool(await self.db.get_active_support_tickets(messages_forwarded=True, user_id=user_id))
+            self.flood_limiter.set_exempt(user_id, forwarded)
+        return forwarded
+
+    async def flush_edit(self, key: tuple[int, int]):
+        """Apply the final text of an edited message once the user stopped editing it."""
+        chat_id, message_id = key
+        new_text = self.pending_edits.pop(key, None)
+        message = await self.db.get_message(chat_id, message_id)
+        if not message:
+            return
+
+        if not message.get('messages_forwarded'):
+            # Register the edit only if it hasnt been replied to
+            if await self.db.update_edited_message(chat_id, message_id, new_text) and self.debouncer:
+                self.debouncer.touch(chat_id) # Still typing
+        else:
+            # If messages have been forwarded to admin then send the update to admin, under the forwarded copy
+            user_group_id, thread_id = await self.db.get_user_chat(chat_id)
+            forwarded_message_id = message.get('forwarded_message_id')
+            await self.bot.send_message(
+                chat_id=user_group_id,
+                text=f"(EDITED MESSAGE)\n{new_text}",
+                message_thread_id=thread_id,
+                reply_parameters=ReplyParameters(
+                    message_id=forwarded_message_id,
+                    allow_sending_without_reply=True
+                ) if forwarded_message_id else None
+            )
+
     def get_message_content(self, message: Message) -> str:
         """Determine the content to log and save based on message type."""
         if message.text:
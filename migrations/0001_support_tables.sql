@@ -0,0 +1,35 @@
+-- Support bot tables. The shop bot owns users, orders, drops, bot_settings etc.;
+-- only the tables written by this bot are created here.
+
+CREATE TABLE IF NOT EXISTS support_tickets (
+    ticket_id          BIGSERIAL PRIMARY KEY,
+    user_id            BIGINT    NOT NULL,
+    closed             BOOLEAN   NOT NULL DEFAULT FALSE,
+    messages_forwarded BOOLEAN   NOT NULL DEFAULT FALSE,
+    support_issue      TEXT,
+    lang               TEXT,
+    -- Stored as naive Helsinki time (see tasks/delete_unused_groups.py)
+    created_at         TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'Europe/Helsinki')
+);
+
+CREATE TABLE IF NOT EXISTS support_messages (
+    id         BIGSERIAL   PRIMARY KEY,
+    ticket_id  BIGINT      NOT NULL REFERENCES support_tickets (ticket_id) ON DELETE CASCADE,
+    user_id    BIGINT      NOT NULL,
+    message_id BIGINT      NOT NULL,
+    user_text  TEXT,
+    replied    BOOLEAN     NOT NULL DEFAULT FALSE,
+    is_deleted BOOLEAN     NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS support_group_ids (
+    user_id    BIGINT PRIMARY KEY,
+    group_id   BIGINT NOT NULL,
+    created_by TEXT
+);
+
+CREATE TABLE IF NOT EXISTS support_user_muted (
+    user_id     BIGINT      PRIMARY KEY,
+    muted_until TIMESTAMPTZ NOT NULL
+);
@@ -0,0 +1,38 @@
+-- Indexes for the queries DatabaseController runs on every message / poll.
+
+-- One open ticket per user. Older duplicates are closed first so the index can be built.
+UPDATE support_tickets t
+SET closed = TRUE
+WHERE t.closed = FALSE
+  AND EXISTS (
+      SELECT 1 FROM support_tickets newer
+      WHERE newer.user_id = t.user_id
+        AND newer.closed = FALSE
+        AND newer.ticket_id > t.ticket_id
+  );
+
+-- WHERE user_id = $1 AND closed = FALSE
+CREATE UNIQUE INDEX IF NOT EXISTS support_tickets_open_user_uidx
+    ON support_tickets (user_id)
+    WHERE closed = FALSE;
+
+-- Poller: open tickets filtered by messages_forwarded
+CREATE INDEX IF NOT EXISTS support_tickets_open_forwarded_idx
+    ON support_tickets (messages_forwarded, ticket_id)
+    WHERE closed = FALSE;
+
+-- ORDER BY created_at DESC, ticket_id DESC OFFSET 1 / MAX(created_at) per user
+CREATE INDEX IF NOT EXISTS support_tickets_user_created_idx
+    ON support_tickets (user_id, created_at DESC, ticket_id DESC);
+
+-- Messages of a ticket in chat order (array_agg ORDER BY message_id, mark replied)
+CREATE INDEX IF NOT EXISTS support_messages_ticket_message_idx
+    ON support_messages (ticket_id, message_id);
+
+-- WHERE sm.user_id = $1 AND sm.message_id = $2
+CREATE INDEX IF NOT EXISTS support_messages_user_message_idx
+    ON support_messages (user_id, message_id);
+
+-- Group count per userbot session
+CREATE INDEX IF NOT EXISTS support_group_ids_created_by_idx
+    ON support_group_ids (created_by);
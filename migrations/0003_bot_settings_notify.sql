@@ -0,0 +1,27 @@
+-- Notify the support bot whenever bot_settings changes, so its cached copy
+-- (controllers/bot_settings_cache.py) can be refreshed without polling.
+--
+-- bot_settings belongs to the shop bot; creating a trigger on it requires
+-- owning the table. If this role doesn't, the trigger is skipped with a
+-- warning and the cache falls back to its TTL (BOT_SETTINGS_TTL). Have the
+-- table owner run this file to add it later.
+
+CREATE OR REPLACE FUNCTION notify_bot_settings_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('bot_settings_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    DROP TRIGGER IF EXISTS bot_settings_changed ON bot_settings;
+
+    CREATE TRIGGER bot_settings_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON bot_settings
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION notify_bot_settings_changed();
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE WARNING 'bot_settings_changed trigger not created (% does not own bot_settings); bot_settings cache relies on BOT_SETTINGS_TTL', current_user;
+END
+$$;
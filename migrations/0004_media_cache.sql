@@ -0,0 +1,13 @@
+-- Telegram references for static media (welcome photo, payment screenshots,
+-- group avatar), keyed by the file's content hash so a changed file is
+-- uploaded again automatically.
+--   owner = 'bot'          -> file_ref is a Bot API file_id
+--   owner = <session name> -> file_ref is a JSON-encoded Telethon InputPhoto
+
+CREATE TABLE IF NOT EXISTS support_media_cache (
+    content_hash TEXT        NOT NULL,
+    owner        TEXT        NOT NULL,
+    file_ref     TEXT        NOT NULL,
+    updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (content_hash, owner)
+);
@@ -0,0 +1,8 @@
+-- Bookkeeping for long-running background jobs (e.g. tasks/delete_unused_groups.py),
+-- so a run interrupted by a restart is resumed instead of waiting for the next schedule.
+
+CREATE TABLE IF NOT EXISTS support_task_runs (
+    task_name   TEXT        PRIMARY KEY,
+    started_at  TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ
+);
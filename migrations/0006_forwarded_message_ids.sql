@@ -0,0 +1,4 @@
+-- Id of the copy of a support message forwarded into the user's admin group,
+-- so later notices about that message (e.g. edits) can reply to it there.
+
+ALTER TABLE support_messages ADD COLUMN IF NOT EXISTS forwarded_message_id BIGINT;
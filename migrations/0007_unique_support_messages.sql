@@ -0,0 +1,17 @@
+-- A Telegram message is stored once, so replayed updates can be skipped with
+-- ON CONFLICT (user_id, message_id) DO NOTHING. Older duplicates are dropped
+-- first so the index can be built.
+
+DELETE FROM support_messages m
+WHERE EXISTS (
+    SELECT 1 FROM support_messages newer
+    WHERE newer.user_id = m.user_id
+      AND newer.message_id = m.message_id
+      AND newer.id > m.id
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS support_messages_user_message_uidx
+    ON support_messages (user_id, message_id);
+
+-- Superseded by the unique index above
+DROP INDEX IF EXISTS support_messages_user_message_idx;
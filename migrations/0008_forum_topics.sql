@@ -0,0 +1,10 @@
+-- Forum-topic routing (SUPPORT_ROUTING_MODE=topics): a user's admin chat is a
+-- topic in one bot-owned forum supergroup. group_id is then the forum's chat
+-- id, shared by all users, and thread_id identifies the user's topic.
+
+ALTER TABLE support_group_ids ADD COLUMN IF NOT EXISTS thread_id BIGINT;
+
+-- Admin messages are routed to the user by (chat, message_thread_id)
+CREATE UNIQUE INDEX IF NOT EXISTS support_group_ids_thread_uidx
+    ON support_group_ids (group_id, thread_id)
+    WHERE thread_id IS NOT NULL;
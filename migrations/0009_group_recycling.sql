@@ -0,0 +1,16 @@
+-- Group recycling (GROUP_RECYCLING=true): instead of being deleted, an
+-- inactive group is detached from its user (user_id NULL, freed_at set) and
+-- later reassigned to a new user.
+
+ALTER TABLE support_group_ids DROP CONSTRAINT IF EXISTS support_group_ids_pkey;
+ALTER TABLE support_group_ids ALTER COLUMN user_id DROP NOT NULL;
+ALTER TABLE support_group_ids ADD COLUMN IF NOT EXISTS freed_at TIMESTAMPTZ;
+
+-- Still one group per user; also the ON CONFLICT (user_id) target of set_user_group_id
+CREATE UNIQUE INDEX IF NOT EXISTS support_group_ids_user_uidx
+    ON support_group_ids (user_id);
+
+-- Oldest free group of the given sessions
+CREATE INDEX IF NOT EXISTS support_group_ids_free_idx
+    ON support_group_ids (freed_at)
+    WHERE user_id IS NULL;
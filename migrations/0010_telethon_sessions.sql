@@ -0,0 +1,26 @@
+-- Userbot sessions (SESSION_STORAGE=postgres, see utils/pg_session.py): what
+-- Telethon kept in sessions/narvesensupportbot/<name>.session plus the API
+-- credentials from <name>.json, so sessions don't live on the bot's disk.
+
+CREATE TABLE IF NOT EXISTS telethon_sessions (
+    session_name   TEXT        PRIMARY KEY,
+    api_id         INTEGER     NOT NULL,
+    api_hash       TEXT        NOT NULL,
+    dc_id          INTEGER     NOT NULL DEFAULT 0,
+    server_address TEXT,
+    port           INTEGER,
+    auth_key       BYTEA,
+    takeout_id     BIGINT,
+    updated_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Telethon's entity cache (input peers by id / username / phone)
+CREATE TABLE IF NOT EXISTS telethon_entities (
+    session_name TEXT   NOT NULL REFERENCES telethon_sessions (session_name) ON DELETE CASCADE,
+    id           BIGINT NOT NULL,
+    hash         BIGINT NOT NULL,
+    username     TEXT,
+    phone        TEXT,
+    name         TEXT,
+    PRIMARY KEY (session_name, id)
+);
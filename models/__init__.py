@@ -0,0 +1,4 @@
+# models/__init__.py
+from .ticket import Ticket, SupportMessage
+
+__all__ = ["Ticket", "SupportMessage"]
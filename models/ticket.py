@@ -0,0 +1,130 @@
+# models/ticket.py
+from datetime import datetime
+from typing import Optional
+
+
+class SupportMessage:
+    """
+    A single user message belonging to a support ticket.
+
+    Built directly from a `support_messages` row (or the composite record
+    returned by `array_agg(m ...)`), without an intermediate dict.
+    """
+
+    __slots__ = (
+        "id",
+        "ticket_id",
+        "user_id",
+        "message_id",
+        "user_text",
+        "replied",
+        "is_deleted",
+        "created_at",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        ticket_id: int,
+        user_id: int,
+        message_id: int,
+        user_text: Optional[str],
+        replied: bool,
+        is_deleted: bool,
+        created_at: datetime,
+    ):
+        self.id = id
+        self.ticket_id = ticket_id
+        self.user_id = user_id
+        self.message_id = message_id
+        self.user_text = user_text
+        self.replied = replied
+        self.is_deleted = is_deleted
+        self.created_at = created_at
+
+    @classmethod
+    def from_record(cls, record) -> "SupportMessage":
+        """Create a message from an asyncpg Record (or any mapping with the same keys)."""
+        return cls(
+            record["id"],
+            record["ticket_id"],
+            record["user_id"],
+            record["message_id"],
+            record["user_text"],
+            bool(record["replied"]),
+            bool(record["is_deleted"]),
+            record["created_at"],
+        )
+
+    def __repr__(self) -> str:
+        return f"SupportMessage(id={self.id}, ticket_id={self.ticket_id}, message_id={self.message_id})"
+
+
+class Ticket:
+    """
+    An open or closed support ticket together with its messages.
+
+    `messages` is always ordered by Telegram message_id (oldest first); the
+    ordering is done by Postgres inside `array_agg`, so callers never re-sort.
+    """
+
+    __slots__ = (
+        "ticket_id",
+        "user_id",
+        "closed",
+        "messages_forwarded",
+        "support_issue",
+        "lang",
+        "created_at",
+        "messages",
+    )
+
+    def __init__(
+        self,
+        ticket_id: int,
+        user_id: int,
+        closed: bool,
+        messages_forwarded: bool,
+        support_issue: Optional[str],
+        lang: Optional[str],
+        created_at: datetime,
+        messages: list[SupportMessage],
+    ):
+        self.ticket_id = ticket_id
+        self.user_id = user_id
+        self.closed = closed
+        self.messages_forwarded = messages_forwarded
+        self.support_issue = support_issue
+        self.lang = lang
+        self.created_at = created_at
+        self.messages = messages
+
+    @classmethod
+    def from_record(cls, record) -> "Ticket":
+        """
+        Create a ticket from a row of `support_tickets` joined with an
+        aggregated `messages` column. A ticket without messages yields
+        an empty list (array_agg over a LEFT JOIN returns NULL or [NULL]).
+        """
+        raw_messages = record["messages"] or ()
+        messages = [SupportMessage.from_record(m) for m in raw_messages if m is not None]
+        return cls(
+            record["ticket_id"],
+            record["user_id"],
+            bool(record["closed"]),
+            bool(record["messages_forwarded"]),
+            record["support_issue"],
+            record["lang"],
+            record["created_at"],
+            messages,
+        )
+
+    @property
+    def last_message(self) -> Optional[SupportMessage]:
+        return self.messages[-1] if self.messages else None
+
+    def __repr__(self) -> str:
+        return (
+            f"Ticket(ticket_id={self.ticket_id}, user_id={self.user_id}, "
+            f"closed={self.closed}, messages={len(self.messages)})"
+        )
@@ -1,84 +1,198 @@
 import asyncio
-from zoneinfo import ZoneInfo  # Python 3.9+
+from collections import defaultdict
 from datetime import datetime, timezone, timedelta
-from telethon.tl.functions.messages import DeleteChatRequest
+from telethon.errors import FloodWaitError, ChatIdInvalidError, PeerIdInvalidError
+from telethon.errors import ChatNotModifiedError
+from telethon.tl.functions.messages import DeleteChatRequest, DeleteHistoryRequest, EditChatAboutRequest, EditChatTitleRequest
+from config.config import Config
 from utils.logger import logger
-from utils.telegram_helpers import retrieve_session
+from aiogram.exceptions import TelegramBadRequest
+from utils.telegram_helpers import retrieve_session, sessions_by_creator_key, session_for_creator, TOPIC_CREATOR
 from controllers.db_controller import DatabaseController
 
+TASK_NAME = "delete_unused_groups"
+
 
 async def delete_unused_groups(db: DatabaseController):
     """
     Runs every night at 03:00 UTC. Deletes Telegram groups that are inactive
-    and removes them from the DB using their original session.
+    and removes them from the DB using their original session (forum topics,
+    created by the bot itself, are deleted through the Bot API). With
+    GROUP_RECYCLING the groups are cleared and freed for reuse instead.
+
+    Stale groups come from a single query, grouped by the session that created
+    them. Each session connects once and works through its batch; sessions run
+    in parallel. Every deleted group is removed from support_group_ids right
+    away, so an interrupted run picks up where it stopped: on startup an
+    unfinished run is resumed immediately instead of waiting for 03:00.
     """
     while True:
         try:
-            now = datetime.now(timezone.utc)
-            target_time = now.replace(hour=3, minute=0, second=0, microsecond=0)
-            if now >= target_time:
-                target_time += timedelta(days=1)
+            last_run = await db.get_task_run(TASK_NAME)
+            interrupted = last_run and last_run["finished_at"] is None
+
+            if interrupted:
+                logger.info(f"[Cleanup] Resuming run interrupted at {last_run['started_at']}")
+            else:
+                now = datetime.now(timezone.utc)
+                target_time = now.replace(hour=3, minute=0, second=0, microsecond=0)
+                if now >= target_time:
+                    target_time += timedelta(days=1)
 
-            wait_seconds = (target_time - now).total_seconds()
-            logger.info(f"[Cleanup] Sleeping until next cleanup at {target_time} UTC ({int(wait_seconds)}s)")
-            await asyncio.sleep(wait_seconds)
+                wait_seconds = (target_time - now).total_seconds()
+                logger.info(f"[Cleanup] Sleeping until next cleanup at {target_time} UTC ({int(wait_seconds)}s)")
+                await asyncio.sleep(wait_seconds)
+                await db.mark_task_started(TASK_NAME)
 
             logger.info("[Cleanup] Starting delete_unused_groups check")
             cutoff_date = datetime.now(timezone.utc) - timedelta(days=5)
 
-            groups = await db.get_all_support_groups_with_creator()
+            stale_groups = await db.get_stale_support_groups(cutoff_date)
+            sessions = await sessions_by_creator_key(db)
+            batches = defaultdict(list)
+            for user_id, group_id, created_by in stale_groups:
+                batches[session_for_creator(created_by, sessions)].append((user_id, group_id))
+            logger.info(f"[Cleanup] {len(stale_groups)} stale groups across {len(batches)} sessions")
 
-            for user_id, group_id, created_by in groups:
-                try:
-                    if not created_by:
-                        logger.warning(f"[Cleanup] No session found for user_id {user_id}")
-                        continue
+            semaphore = asyncio.Semaphore(Config.CLEANUP_MAX_PARALLEL_SESSIONS)
+            results = await asyncio.gather(*(
+                cleanup_topics(db, groups) if session_name == TOPIC_CREATOR
+                else cleanup_session_groups(db, session_name, groups, semaphore)
+                for session_name, groups in batches.items()
+            ))
+            logger.info(f"[Cleanup] Finished, deleted {sum(results)}/{len(stale_groups)} groups")
+            await db.mark_task_finished(TASK_NAME)
 
-                    # 1. Check ticket activity
-                    open_tickets = await db.get_user_open_tickets(user_id)
-                    if open_tickets:
-                        continue
+        except Exception as outer_e:
+            logger.error(f"[Cleanup] Unexpected error in cleanup loop: {outer_e}")
 
-                    latest_created_at = await db.get_user_latest_ticket_date(user_id)
-                    
-                    if latest_created_at:
-                        # Assume naive datetime is in Helsinki time
-                        latest_created_at = latest_created_at.replace(tzinfo=ZoneInfo("Europe/Helsinki"))
-                        # Convert to UTC
-                        latest_created_at = latest_created_at.astimezone(timezone.utc)
-                    
-                    if not latest_created_at or latest_created_at > cutoff_date:
-                        continue
+        # Always wait a bit before retrying (e.g., 5 minutes if something goes wrong)
+        await asyncio.sleep(300)
+
+
+async def cleanup_session_groups(
+    db: DatabaseController,
+    session_name: str,
+    groups: list[tuple[int, int]],
+    semaphore: asyncio.Semaphore,
+) -> int:
+    """
+    Delete a batch of groups created by one session over a single connection.
+
+    Deletions are spaced by CLEANUP_DELETE_INTERVAL seconds per session, and
+    FloodWait responses are honoured before retrying the same group.
 
-                    # 2. Load session and credentials
-                    session_name = created_by.strip()
-                    client = await retrieve_session(session_name)
+    Returns:
+        int: Number of groups deleted.
+    """
+    deleted = 0
+    async with semaphore:
+        client = await retrieve_session(db, session_name)
+        if not client:
+            logger.warning(f"[Cleanup] Failed to load client for session {session_name}, skipping {len(groups)} groups")
+            return 0
 
-                    if not client:
-                        logger.warning(f"[Cleanup] Failed to load client for session {session_name}")
+        try:
+            for index, (user_id, group_id) in enumerate(groups):
+                if index:
+                    await asyncio.sleep(Config.CLEANUP_DELETE_INTERVAL)
+                try:
+                    if Config.GROUP_RECYCLING:
+                        if await _recycle_group(client, group_id):
+                            await db.free_support_group(user_id)
+                            logger.info(f"[Cleanup] Freed group {group_id} of user {user_id} for reuse")
+                        else:
+                            await db.delete_support_group(user_id)
+                        deleted += 1
                         continue
-                    if not client.is_connected():
-                        await client.start()
-                    try:
-                        # 3. Delete group
-                        await client(DeleteChatRequest(chat_id=abs(group_id)))
+                    if await _delete_group(client, group_id):
                         logger.info(f"[Cleanup] Deleted Telegram group {group_id}")
-                        
-                        # 4. Delete from DB
-                        await db.delete_support_group(user_id)
-                        await client.disconnect()
-                        logger.info(f"[Cleanup] Deleted group {group_id} for user {user_id} from DB")
-                        await asyncio.sleep(30)
-                    except Exception as e:
-                        logger.warning(f"[Cleanup] Could not delete group {group_id}: {e}")
-                        await client.disconnect()
-                        continue
+                    await db.delete_support_group(user_id)
+                    logger.info(f"[Cleanup] Deleted group {group_id} for user {user_id} from DB")
+                    deleted += 1
+                except Exception as e:
+                    logger.warning(f"[Cleanup] Could not delete group {group_id} ({session_name}): {e}")
+        finally:
+            await client.disconnect()
 
-                except Exception as inner_e:
-                    logger.error(f"[Cleanup] Error with user_id {user_id}, group_id {group_id}: {inner_e}")
+    return deleted
 
-        except Exception as outer_e:
-            logger.error(f"[Cleanup] Unexpected error in cleanup loop: {outer_e}")
 
-        # Always wait a bit before retrying (e.g., 5 minutes if something goes wrong)
-        await asyncio.sleep(300)
+async def cleanup_topics(db: DatabaseController, groups: list[tuple[int, int]]) -> int:
+    """
+    Delete stale forum topics (SUPPORT_ROUTING_MODE=topics) through the Bot API.
+
+    Returns:
+        int: Number of topics deleted.
+    """
+    deleted = 0
+    for index, (user_id, group_id) in enumerate(groups):
+        if index:
+            await asyncio.sleep(Config.CLEANUP_DELETE_INTERVAL)
+        try:
+            user_chat = await db.get_user_chat(user_id)
+            thread_id = user_chat[1] if user_chat else None
+            if thread_id is not None:
+                try:
+                    await db.bot.delete_forum_topic(group_id, thread_id)
+                    logger.info(f"[Cleanup] Deleted topic {thread_id} in {group_id}")
+                except TelegramBadRequest as e:
+                    logger.info(f"[Cleanup] Topic {thread_id} in {group_id} no longer exists on Telegram: {e}")
+            await db.delete_support_group(user_id)
+            logger.info(f"[Cleanup] Deleted topic {thread_id} for user {user_id} from DB")
+            deleted += 1
+        except Exception as e:
+            logger.warning(f"[Cleanup] Could not delete topic of user {user_id}: {e}")
+    return deleted
+
+
+async def _recycle_group(client, group_id: int) -> bool:
+    """
+    Prepare a basic group for reuse: clear its history for everyone and drop
+    the old user's name and id from the title and description. Returns False
+    if Telegram says it no longer exists, in which case only the DB row needs removing.
+    """
+    for attempt in range(2):
+        try:
+            while True:
+                affected = await client(DeleteHistoryRequest(peer=group_id, max_id=0, revoke=True))
+                if not affected.offset:
+                    break
+            for request in (
+                EditChatTitleRequest(chat_id=abs(group_id), title="Support"),
+                EditChatAboutRequest(peer=group_id, about=""),
+            ):
+                try:
+                    await client(request)
+                except ChatNotModifiedError:
+                    pass
+            return True
+        except (ChatIdInvalidError, PeerIdInvalidError):
+            logger.info(f"[Cleanup] Group {group_id} no longer exists on Telegram")
+            return False
+        except FloodWaitError as e:
+            if attempt:
+                raise
+            logger.warning(f"[Cleanup] FloodWait {e.seconds}s while recycling group {group_id}")
+            await asyncio.sleep(e.seconds)
+    return False
+
+
+async def _delete_group(client, group_id: int) -> bool:
+    """
+    Delete a basic group. Returns False if Telegram says it no longer exists,
+    in which case only the DB row needs removing.
+    """
+    for attempt in range(2):
+        try:
+            await client(DeleteChatRequest(chat_id=abs(group_id)))
+            return True
+        except (ChatIdInvalidError, PeerIdInvalidError):
+            logger.info(f"[Cleanup] Group {group_id} no longer exists on Telegram")
+            return False
+        except FloodWaitError as e:
+            if attempt:
+                raise
+            logger.warning(f"[Cleanup] FloodWait {e.seconds}s while deleting group {group_id}")
+            await asyncio.sleep(e.seconds)
+    return False
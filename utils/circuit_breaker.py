@@ -0,0 +1,105 @@
+import time
+from collections import deque
+from utils.logger import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a dependency is unhealthy.
+
+    The outcomes of the last `window` calls are kept; a call counts as failed
+    if it errored or took longer than `slow_call_seconds`. Once at least
+    `min_calls` are recorded and the failed share reaches `failure_rate`, the
+    breaker opens and `admit()` rejects calls for `open_seconds`. After that a
+    single probe call is let through (half-open): success closes the breaker,
+    failure opens it again.
+
+    `admit()` returns the state a call was admitted in, which goes back to
+    `record()`: only the probe decides a half-open breaker, and outcomes of
+    calls admitted before it opened are ignored.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float,
+        min_calls: int | None = None,
+        on_state_change=None,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.min_calls = min_calls or max(1, window // 2)
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = failed
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._on_state_change = on_state_change
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open and not yet due for a probe)."""
+        return self._state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def admit(self) -> str | None:
+        """Returns the state the call is admitted in (CLOSED, or HALF_OPEN for the probe), or None if rejected."""
+        if self._state == CLOSED:
+            return CLOSED
+        if self._state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return None
+            self._set_state(HALF_OPEN)
+        if self._probe_in_flight:
+            return None
+        self._probe_in_flight = True
+        return HALF_OPEN
+
+    def record(self, success: bool, duration: float, admitted_in: str = CLOSED):
+        failed = not success or duration > self.slow_call_seconds
+
+        if admitted_in == HALF_OPEN:
+            self._probe_in_flight = False
+            if self._state != HALF_OPEN:
+                return
+            if failed:
+                self._open()
+            else:
+                self._outcomes.clear()
+                self._set_state(CLOSED)
+            return
+
+        if self._state != CLOSED:
+            return  # admitted before the breaker opened; only the probe decides now
+
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls:
+            failures = sum(self._outcomes)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                logger.warning(
+                    f"Circuit '{self.name}' opening: {failures}/{len(self._outcomes)} recent calls failed or were slow"
+                )
+                self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state == self._state:
+            return
+        logger.info(f"Circuit '{self.name}' {self._state} -> {state}")
+        self._state = state
+        if self._on_state_change:
+            self._on_state_change(state)
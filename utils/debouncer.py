@@ -0,0 +1,61 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+from utils.logger import logger
+
+
+class Debouncer:
+    """
+    Runs `callback(key)` once a key has gone quiet.
+
+    Every `touch(key)` re-arms the key's timer to fire `quiet_period` seconds
+    later, but never later than `max_wait` seconds after the first touch of
+    the current burst. Firing removes the key, so the next touch starts a new
+    burst. Timers are plain loop.call_at handles; nothing polls.
+    """
+
+    def __init__(self, quiet_period: float, max_wait: float, callback: Callable[[Hashable], Awaitable[None]]):
+        self.quiet_period = quiet_period
+        self.max_wait = max(max_wait, quiet_period)
+        self._callback = callback
+        self._timers: dict[Hashable, tuple[float, asyncio.TimerHandle]] = {}  # key -> (burst start, handle)
+        self._running: set[asyncio.Task] = set()
+
+    def touch(self, key: Hashable, delay: float | None = None, started_ago: float = 0.0):
+        """
+        Re-arm `key`. `delay` overrides the quiet period and `started_ago`
+        backdates the burst start, for re-arming tickets found at startup.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        entry = self._timers.get(key)
+        if entry:
+            burst_start = entry[0]
+            entry[1].cancel()
+        else:
+            burst_start = now - started_ago
+
+        fire_at = min(now + (self.quiet_period if delay is None else delay), burst_start + self.max_wait)
+        self._timers[key] = (burst_start, loop.call_at(max(now, fire_at), self._fire, key))
+
+    def cancel(self, key: Hashable):
+        entry = self._timers.pop(key, None)
+        if entry:
+            entry[1].cancel()
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def pending(self) -> int:
+        return len(self._timers)
+
+    def _fire(self, key: Hashable):
+        self._timers.pop(key, None)
+        task = asyncio.create_task(self._run(key))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: Hashable):
+        try:
+            await self._callback(key)
+        except Exception as e:
+            logger.error(f"Debounced callback for {key} failed: {e}")
@@ -0,0 +1,53 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """Recent latencies of successful calls, for picking a hedge delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples: deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        """None until `min_samples` latencies have been recorded."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def hedged(call: Callable[[], Awaitable[T | None]], delay: float | None, on_hedge=None) -> T | None:
+    """
+    Run `call()`; if it hasn't finished after `delay` seconds, start a second
+    identical call. The first non-None result wins and the other call is
+    cancelled. None means failed, so a failed call still waits for the other.
+    """
+    first = asyncio.ensure_future(call())
+    if delay is None:
+        return await first
+
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    if on_hedge:
+        on_hedge()
+    pending = {first, asyncio.ensure_future(call())}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    return result
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
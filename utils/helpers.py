@@ -1,4 +1,7 @@
+import asyncio
 import difflib
+import json
+import time
 import aiohttp
 import socks
 import emoji
@@ -6,25 +9,103 @@ from urllib.parse import quote
 from aiohttp_socks import ProxyConnector
 from config.config import Config
 from utils.logger import logger
+from utils.metrics import (
+    LLM_REQUEST_SECONDS,
+    LLM_COALESCED,
+    LLM_SHORT_CIRCUITED,
+    LLM_HEDGED,
+    LLM_CIRCUIT_OPEN,
+    LLM_STREAM_EARLY_CLOSE,
+)
+from utils.singleflight import SingleFlight
+from utils.circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from utils.hedging import LatencyWindow, hedged
+from utils.llm_profiles import OutputProfile, OUTPUT_PROFILES
+
+
+_llm_requests = SingleFlight()
+_llm_latency = LatencyWindow()
+llm_breaker = CircuitBreaker(
+    "nano-gpt",
+    window=Config.LLM_BREAKER_WINDOW,
+    failure_rate=Config.LLM_BREAKER_FAILURE_RATE,
+    slow_call_seconds=Config.LLM_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=Config.LLM_BREAKER_OPEN_SECONDS,
+    on_state_change=lambda state: LLM_CIRCUIT_OPEN.set(1 if state == OPEN else 0),
+)
 
 
 def is_emoji_only(text: str) -> bool:
     return all(char in emoji.EMOJI_DATA for char in text if not char.isspace())
 
-async def query_nano_gpt(prompt: str, model: str = "gpt-5-mini", temperature: float = 0.0, max_tokens: int = 1000) -> str | None:
+async def query_nano_gpt(
+    prompt: str,
+    model: str = "gpt-5-mini",
+    temperature: float = 0.0,
+    max_tokens: int = 1000,
+    call_site: str = "unknown",
+    profile: OutputProfile | None = None,
+) -> str | None:
     """
     Sends a prompt to the Nano-GPT API and returns the model's response.
 
+    Concurrent calls with the same model, prompt, temperature and output
+    profile share one request (e.g. the same translation prompt for several
+    users). While the circuit breaker is open, returns None right away so
+    callers go straight to their fallbacks. With LLM_HEDGING, a request slower
+    than the recent p95 gets a duplicate and the first answer wins.
+
     Args:
         prompt (str): The prompt to send.
         model (str): The model to use. Default is 'gpt-5-mini'. (gpt-4o-mini and yi-lightning was not as percise in my tests)
         temperature (float): Sampling temperature. (How creative is the model response)
-        max_tokens (int): Max tokens to generate. (For simple single sentence output can limit to small amount of tokens)
+        max_tokens (int): Max tokens to generate, when no output profile applies.
+        call_site (str): Name of the caller, used to label latency metrics and pick the default output profile.
+        profile (OutputProfile | None): Token cap, stop sequences and validator. Defaults to OUTPUT_PROFILES[call_site].
+            With a validator the response is streamed and closed as soon as a valid answer has arrived.
 
     Returns:
         str | None: The model's response, or None on failure.
     """
-    url = "https://nano-gpt.com/api/v1/chat/completions"
+    profile = profile or OUTPUT_PROFILES.get(call_site) or OutputProfile(max_tokens=max_tokens)
+    key = (model, prompt, temperature, profile)
+    admitted_in = CLOSED
+    if _llm_requests.in_flight(key):
+        LLM_COALESCED.inc(call_site=call_site)
+    else:
+        admitted_in = llm_breaker.admit()
+        if admitted_in is None:
+            LLM_SHORT_CIRCUITED.inc(call_site=call_site)
+            return None
+    return await _llm_requests.do(key, lambda: _guarded_nano_gpt(prompt, model, temperature, profile, call_site, admitted_in))
+
+
+async def _guarded_nano_gpt(
+    prompt: str, model: str, temperature: float, profile: OutputProfile, call_site: str, admitted_in: str
+) -> str | None:
+    """One logical request: optionally hedged, outcome fed to the circuit breaker."""
+    def call():
+        return _post_nano_gpt(prompt, model, temperature, profile, call_site)
+
+    started = time.perf_counter()
+    result = None
+    try:
+        if Config.LLM_HEDGING:
+            result = await hedged(call, _llm_latency.percentile(95), lambda: LLM_HEDGED.inc(call_site=call_site))
+        else:
+            result = await call()
+    finally:
+        # Also when raising or cancelled, so a half-open probe always resolves
+        elapsed = time.perf_counter() - started
+        llm_breaker.record(result is not None, elapsed, admitted_in)
+
+    if result is not None:
+        _llm_latency.add(elapsed)
+    return result
+
+
+async def _post_nano_gpt(prompt: str, model: str, temperature: float, profile: OutputProfile, call_site: str) -> str | None:
+    url = Config.NANO_GPT_API_URL
 
     headers = {
         "Authorization": f"Bearer {Config.NANO_GPT_API_KEY}",
@@ -35,18 +116,70 @@ async def query_nano_gpt(prompt: str, model: str = "gpt-5-mini", temperature: fl
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": temperature,
-        "max_tokens": max_tokens,
+        "max_tokens": profile.max_tokens,
     }
+    if profile.stream:
+        json_payload["stream"] = True
 
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        async with aiohttp.ClientSession() as session:
+        timeout = aiohttp.ClientTimeout(total=Config.LLM_TIMEOUT_SECONDS)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
             async with session.post(url, headers=headers, json=json_payload) as resp:
                 resp.raise_for_status()
-                response_json = await resp.json()
-                return response_json["choices"][0]["message"]["content"].strip()
+                if resp.content_type == "text/event-stream":
+                    content = await _read_stream(resp, profile, call_site)
+                else:
+                    response_json = await resp.json()
+                    content = _apply_stop(response_json["choices"][0]["message"]["content"], profile.stop)
+                outcome = "ok"
+                return content.strip()
+    except asyncio.CancelledError:
+        outcome = "cancelled"  # lost a hedge race
+        raise
     except Exception as e:
-        logger.error(f"Nano-GPT API request failed: {e}")
+        logger.error(f"Nano-GPT API request failed ({call_site}): {e}")
         return None
+    finally:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, call_site=call_site, outcome=outcome)
+
+
+async def _read_stream(resp: aiohttp.ClientResponse, profile: OutputProfile, call_site: str) -> str:
+    """
+    Accumulate an SSE chat-completions stream. Returns as soon as the text
+    passes the profile's validator or hits a stop sequence; the connection is
+    closed then instead of waiting for the rest of the generation.
+    """
+    text = ""
+    async for raw_line in resp.content:
+        line = raw_line.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        delta = json.loads(data)["choices"][0].get("delta", {}).get("content") or ""
+        text += delta
+
+        stopped = _apply_stop(text, profile.stop)
+        if stopped != text or (profile.validator and profile.validator(stopped)):
+            LLM_STREAM_EARLY_CLOSE.inc(call_site=call_site)
+            resp.close()
+            return stopped
+    return _apply_stop(text, profile.stop)
+
+
+def _apply_stop(text: str, stop: tuple[str, ...]) -> str:
+    """Cut text at the first stop sequence (not sent to the API, which rejects `stop` for reasoning models)."""
+    # Leading whitespace (e.g. a newline before the answer) doesn't end anything
+    content_start = len(text) - len(text.lstrip())
+    cut = len(text)
+    for sequence in stop:
+        index = text.find(sequence, content_start)
+        if index != -1:
+            cut = min(cut, index)
+    return text[:cut]
 
 def format_number(value):
     # Remove trailing zeros and decimal point if unnecessary
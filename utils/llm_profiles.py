@@ -0,0 +1,73 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """
+    What a call site expects back from the LLM.
+
+    max_tokens caps the generation. gpt-5-mini spends it on reasoning before
+    any visible text, so caps stay at the 1000-token budget; a smaller one can
+    end the response before the answer starts. stop sequences are applied
+    client-side only (reasoning models reject `stop` in the request). With a
+    validator, the response is streamed and the stream is closed as soon as
+    the text so far is a complete, valid answer.
+    """
+    max_tokens: int = 1000
+    stop: tuple[str, ...] = ()
+    validator: Callable[[str], bool] | None = None
+
+    @property
+    def stream(self) -> bool:
+        return self.validator is not None
+
+
+def one_of(*answers: str) -> Callable[[str], bool]:
+    """Valid once the text is exactly one of `answers` (case and trailing dot ignored)."""
+    allowed = {answer.lower() for answer in answers}
+    return lambda text: text.strip().rstrip(".").lower() in allowed
+
+
+def lang_category(languages: list[str], categories: list[str]) -> Callable[[str], bool]:
+    """
+    Valid once the text is `lang:category` with known values. A category that
+    is a prefix of another one (e.g. a streamed "ok" that might become
+    "okay_...") only counts once more text shows it has ended.
+    """
+    langs = {lang.lower() for lang in languages} | {"other"}
+    unambiguous = {c for c in categories if not any(o != c and o.startswith(c) for o in categories)}
+    pattern = re.compile(r"^\s*(\w+)\s*:\s*(\w+)(\s*)$")
+
+    def validate(text: str) -> bool:
+        match = pattern.match(text)
+        if not match or match.group(1).lower() not in langs:
+            return False
+        category = match.group(2)
+        return category in unambiguous or (category in categories and bool(match.group(3)))
+
+    return validate
+
+
+def json_array_of(length: int) -> Callable[[str], bool]:
+    """Valid once the text ends a JSON array with `length` entries."""
+    def validate(text: str) -> bool:
+        text = text.strip()
+        if not text.endswith("]"):
+            return False
+        start = text.find("[")
+        try:
+            parsed = json.loads(text[start:])
+        except ValueError:
+            return False
+        return isinstance(parsed, list) and len(parsed) >= length
+
+    return validate
+
+
+# Defaults by call_site, used when query_nano_gpt isn't given a profile
+OUTPUT_PROFILES: dict[str, OutputProfile] = {
+    "classify_resolution": OutputProfile(stop=("\n",), validator=one_of("Complaint", "Resolved")),
+}
@@ -1,23 +1,80 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config.config import Config
 
 # Silence unnecessary loggers
 logging.getLogger('aiogram').setLevel(logging.WARNING)
 logging.getLogger('asyncio').setLevel(logging.WARNING)
 logging.getLogger('asyncpg').setLevel(logging.WARNING)
 
+# Fields that callers may attach with `extra={...}` and that the JSON formatter emits
+CONTEXT_FIELDS = ("user_id", "ticket_id")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, carrying user_id/ticket_id when passed via `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Merges msg % args and renders the traceback in the calling thread, so
+    mutable args are logged as they were at the call and no frames are kept
+    alive on the queue. Unlike the stock QueueHandler it doesn't run the
+    full formatter here: timestamps, levels and JSON encoding are left to
+    the listener's handlers.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_exception_formatter = logging.Formatter()
+
+
 # Configure logger
 logger = logging.getLogger('bot')
-logger.setLevel(logging.DEBUG)
+logger.setLevel(getattr(logging, Config.LOG_LEVEL, logging.DEBUG))
+logger.propagate = False
 
 # Create formatters
-file_formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-console_formatter = logging.Formatter(
-    '%(name)s - %(levelname)s - %(message)s'
-)
+if Config.LOG_JSON:
+    file_formatter = console_formatter = JsonFormatter()
+else:
+    file_formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    console_formatter = logging.Formatter(
+        '%(name)s - %(levelname)s - %(message)s'
+    )
 
 # File handler (rotating logs)
 file_handler = RotatingFileHandler(
@@ -33,6 +90,10 @@ console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(console_formatter)
 
-# Add handlers to logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
\ No newline at end of file
+# Disk writes, rotation and stdout happen on the listener thread, not in the event loop
+log_queue = queue.SimpleQueue()
+queue_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+queue_listener.start()
+atexit.register(queue_listener.stop)
+
+logger.addHandler(_DeferredQueueHandler(log_queue))
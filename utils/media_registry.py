@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import os
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+from telethon import TelegramClient
+from telethon.errors import RPCError
+from telethon.tl.functions.messages import EditChatPhotoRequest
+from telethon.tl.types import InputChatPhoto, InputChatUploadedPhoto, InputPhoto, MessageActionChatEditPhoto
+from controllers.db_controller import DatabaseController
+from utils.logger import logger
+
+BOT_OWNER = "bot"
+
+# Bot API errors that mean a stored file_id is no longer usable; anything else
+# (e.g. a caption that fails to parse) would fail an upload just the same
+FILE_ID_ERRORS = ("file identifier", "file_id", "file reference", "media_empty")
+
+
+def is_file_id_error(error: TelegramBadRequest) -> bool:
+    message = str(error.message).lower()
+    return any(fragment in message for fragment in FILE_ID_ERRORS)
+
+
+class MediaRegistry:
+    """
+    Remembers what Telegram handed back for each static media file, so it is
+    uploaded once and re-sent by reference afterwards.
+
+    Entries are keyed by (sha256 of the file content, owner) and persisted in
+    support_media_cache, so a restart doesn't trigger re-uploads and editing a
+    file under data/ invalidates its entry automatically.
+    """
+
+    def __init__(self):
+        self._hashes: dict[str, tuple[float, str]] = {}  # path -> (mtime, sha256)
+        self._refs: dict[tuple[str, str], str] = {}  # (sha256, owner) -> file_ref
+
+    async def content_hash(self, path: str) -> str:
+        """sha256 of the file, cached per mtime; the stat and read run in a worker thread."""
+        return await asyncio.to_thread(self._content_hash, path)
+
+    def _content_hash(self, path: str) -> str:
+        mtime = os.path.getmtime(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._hashes[path] = (mtime, digest)
+        return digest
+
+    async def get(self, db: DatabaseController, path: str, owner: str) -> str | None:
+        key = (await self.content_hash(path), owner)
+        if key not in self._refs:
+            file_ref = await db.get_cached_media_ref(*key)
+            if not file_ref:
+                return None
+            self._refs[key] = file_ref
+        return self._refs[key]
+
+    async def remember(self, db: DatabaseController, path: str, owner: str, file_ref: str):
+        key = (await self.content_hash(path), owner)
+        if self._refs.get(key) == file_ref:
+            return
+        self._refs[key] = file_ref
+        await db.set_cached_media_ref(*key, file_ref)
+
+    async def forget(self, db: DatabaseController, path: str, owner: str):
+        key = (await self.content_hash(path), owner)
+        self._refs.pop(key, None)
+        await db.delete_cached_media_ref(*key)
+
+
+media_registry = MediaRegistry()
+
+
+async def send_cached_photo(db: DatabaseController, bot: Bot, chat_id: int, path: str, **kwargs) -> Message:
+    """
+    Send a local photo, reusing its Bot API file_id when one is known.
+
+    Falls back to uploading the file if the stored file_id is rejected.
+    """
+    file_id = await media_registry.get(db, path, BOT_OWNER)
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id, file_id, **kwargs)
+        except TelegramBadRequest as e:
+            if not is_file_id_error(e):
+                raise
+            logger.warning(f"Cached file_id for {path} rejected, uploading again: {e}")
+            await media_registry.forget(db, path, BOT_OWNER)
+
+    message = await bot.send_photo(chat_id, FSInputFile(path), **kwargs)
+    await media_registry.remember(db, path, BOT_OWNER, message.photo[-1].file_id)
+    return message
+
+
+async def send_cached_media_group(
+    db: DatabaseController, bot: Bot, chat_id: int, photos: list[tuple[str, dict]]
+) -> list[Message]:
+    """
+    Send an album of local photos, reusing known file_ids.
+
+    Args:
+        photos: (path, InputMediaPhoto kwargs such as caption/parse_mode) per photo, in album order.
+    """
+    cached_ids = [await media_registry.get(db, path, BOT_OWNER) for path, _ in photos]
+
+    if any(cached_ids):
+        media = [
+            InputMediaPhoto(media=file_id or FSInputFile(path), **options)
+            for (path, options), file_id in zip(photos, cached_ids)
+        ]
+        try:
+            messages = await bot.send_media_group(chat_id, media)
+            await _remember_album(db, photos, messages)
+            return messages
+        except TelegramBadRequest as e:
+            if not is_file_id_error(e):
+                raise
+            logger.warning(f"Cached file_ids for album rejected, uploading again: {e}")
+            for (path, _), file_id in zip(photos, cached_ids):
+                if file_id:
+                    await media_registry.forget(db, path, BOT_OWNER)
+
+    media = [InputMediaPhoto(media=FSInputFile(path), **options) for path, options in photos]
+    messages = await bot.send_media_group(chat_id, media)
+    await _remember_album(db, photos, messages)
+    return messages
+
+
+async def _remember_album(db: DatabaseController, photos: list[tuple[str, dict]], messages: list[Message]):
+    for (path, _), message in zip(photos, messages):
+        if message.photo:
+            await media_registry.remember(db, path, BOT_OWNER, message.photo[-1].file_id)
+
+
+async def set_cached_chat_photo(db: DatabaseController, client: TelegramClient, session_name: str, chat_id: int, path: str):
+    """
+    Set a basic group's photo through a userbot session.
+
+    Telethon upload handles are short-lived, so what gets stored is the
+    resulting InputPhoto (id, access_hash, file_reference). Access hashes are
+    per account, hence the session name as the registry owner.
+    """
+    stored = await media_registry.get(db, path, session_name)
+    if stored:
+        try:
+            ref = json.loads(stored)
+            photo = InputPhoto(
+                id=ref["id"],
+                access_hash=ref["access_hash"],
+                file_reference=bytes.fromhex(ref["file_reference"]),
+            )
+            await client(EditChatPhotoRequest(chat_id=chat_id, photo=InputChatPhoto(photo)))
+            return
+        except (RPCError, ValueError, KeyError) as e:
+            logger.warning(f"Cached chat photo for {session_name} rejected, uploading again: {e}")
+            await media_registry.forget(db, path, session_name)
+
+    uploaded_file = await client.upload_file(path)
+    result = await client(EditChatPhotoRequest(chat_id=chat_id, photo=InputChatUploadedPhoto(uploaded_file)))
+
+    for update in getattr(result, "updates", []):
+        action = getattr(getattr(update, "message", None), "action", None)
+        if isinstance(action, MessageActionChatEditPhoto) and getattr(action.photo, "access_hash", None):
+            ref = {
+                "id": action.photo.id,
+                "access_hash": action.photo.access_hash,
+                "file_reference": action.photo.file_reference.hex(),
+            }
+            await media_registry.remember(db, path, session_name, json.dumps(ref))
+            break
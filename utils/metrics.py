@@ -0,0 +1,236 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable
+from aiohttp import web
+from utils.logger import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items(), key=lambda item: tuple(map(str, item[0]))):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # [per-bucket counts..., sum, count]
+            state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[index] += 1
+                break
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for key, state in sorted(self._values.items(), key=lambda item: tuple(map(str, item[0]))):
+            cumulative = 0
+            for index, bound in enumerate(self.buckets):
+                cumulative += state[index]
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text-format registry.
+
+    Collectors are async callables run right before each scrape, for values
+    that are cheaper to read on demand (pool size, ticket counts) than to
+    keep updated.
+    """
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], Awaitable[None]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Awaitable[None]]):
+        self._collectors.append(collector)
+
+    async def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                await collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Database
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "support_db_query_seconds", "DatabaseController method latency.", ("method",)))
+DB_QUERY_ERRORS = registry.register(Counter(
+    "support_db_query_errors_total", "DatabaseController methods that raised.", ("method",)))
+DB_ACQUIRE_WAIT_SECONDS = registry.register(Histogram(
+    "support_db_acquire_wait_seconds", "Time DatabaseController methods waited for a pool connection.", ("method",)))
+DB_EXECUTE_SECONDS = registry.register(Histogram(
+    "support_db_execute_seconds", "DatabaseController method latency excluding pool wait.", ("method",)))
+DB_ROWS = registry.register(Counter(
+    "support_db_rows_total", "Rows returned by DatabaseController methods.", ("method",)))
+DB_SLOW_QUERIES = registry.register(Counter(
+    "support_db_slow_queries_total", "DatabaseController calls slower than DB_SLOW_QUERY_MS.", ("method",)))
+DB_POOL_SIZE = registry.register(Gauge(
+    "support_db_pool_size", "Open connections in the asyncpg pool."))
+DB_POOL_IN_USE = registry.register(Gauge(
+    "support_db_pool_in_use", "Pool connections currently acquired."))
+
+# LLM
+LLM_REQUEST_SECONDS = registry.register(Histogram(
+    "support_llm_request_seconds", "query_nano_gpt latency by call site and outcome.", ("call_site", "outcome")))
+LLM_COALESCED = registry.register(Counter(
+    "support_llm_coalesced_total", "query_nano_gpt calls that joined an identical in-flight request.", ("call_site",)))
+LLM_SHORT_CIRCUITED = registry.register(Counter(
+    "support_llm_short_circuited_total", "query_nano_gpt calls rejected while the circuit breaker was open.", ("call_site",)))
+LLM_HEDGED = registry.register(Counter(
+    "support_llm_hedged_total", "LLM requests that got a duplicate after exceeding the p95 latency.", ("call_site",)))
+LLM_STREAM_EARLY_CLOSE = registry.register(Counter(
+    "support_llm_stream_early_close_total", "Streamed LLM responses closed once a valid answer had arrived.", ("call_site",)))
+LLM_CIRCUIT_OPEN = registry.register(Gauge(
+    "support_llm_circuit_open", "1 while the LLM circuit breaker is open."))
+
+# Telegram Bot API
+BOT_API_REQUESTS = registry.register(Counter(
+    "support_bot_api_requests_total", "Bot API calls by method.", ("method",)))
+BOT_API_RATE_LIMITED = registry.register(Counter(
+    "support_bot_api_rate_limited_total", "Bot API calls answered with 429 (retry after).", ("method",)))
+BOT_API_ERRORS = registry.register(Counter(
+    "support_bot_api_errors_total", "Bot API calls that failed.", ("method",)))
+
+# Flood control
+FLOOD_DROPPED = registry.register(Counter(
+    "support_flood_dropped_total", "User messages dropped by the flood limiter before reaching the DB.", ("kind",)))
+FLOOD_MUTED = registry.register(Counter(
+    "support_flood_muted_total", "Users muted automatically for exceeding the flood limit."))
+
+# Customer index
+CUSTOMER_INDEX_LOOKUPS = registry.register(Counter(
+    "support_customer_index_lookups_total", "Customer checks by how they were answered.", ("result",)))
+CUSTOMER_INDEX_SIZE = registry.register(Gauge(
+    "support_customer_index_size", "User ids in the in-memory customer index."))
+
+# Tickets / poller
+TICKETS_OPEN = registry.register(Gauge(
+    "support_tickets_open", "Unclosed support tickets."))
+TICKETS_UNFORWARDED = registry.register(Gauge(
+    "support_tickets_unforwarded", "Unclosed tickets not yet forwarded to an admin."))
+POLLER_LOOP_SECONDS = registry.register(Gauge(
+    "support_poller_loop_seconds", "Duration of the last ticket poller iteration."))
+POLLER_LAG_SECONDS = registry.register(Gauge(
+    "support_poller_lag_seconds", "How late the last poller iteration started compared to its schedule."))
+
+# Runtime
+BACKGROUND_TASKS = registry.register(Gauge(
+    "support_background_tasks", "asyncio tasks alive in the event loop."))
+
+
+async def _collect_runtime():
+    BACKGROUND_TASKS.set(len(asyncio.all_tasks()))
+
+
+registry.add_collector(_collect_runtime)
+
+
+async def _handle_metrics(_: web.Request) -> web.Response:
+    body = await registry.render()
+    return web.Response(text=body, content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve GET /metrics on host:port. Returns the runner so the caller can clean it up."""
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import sqlite3
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+
+from utils.logger import logger
+
+
+class SessionLeaseHeld(Exception):
+    """The session is connected by another process."""
+
+
+class PostgresSession(MemorySession):
+    """
+    Telethon session kept in Postgres (telethon_sessions / telethon_entities)
+    instead of a .session SQLite file, for SESSION_STORAGE=postgres.
+
+    Create with `await PostgresSession.load(db, name)`, which also takes the
+    session's lease (DatabaseController.acquire_session_lease) until close(),
+    so an overlapping deploy or the import CLI can't connect the same auth key.
+    Telethon (1.45, as pinned) awaits save() and close(), which write the DC / auth key
+    and the entities cached since the previous save, so nothing is written per update.
+    """
+
+    def __init__(self, db, session_name: str, api_id: int, api_hash: str):
+        super().__init__()
+        self.db = db
+        self.session_name = session_name
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self._unsaved_entities: dict[int, tuple] = {}  # id -> (id, hash, username, phone, name)
+        self._lease = None  # Connection holding the session's advisory lock
+
+    @classmethod
+    async def load(cls, db, session_name: str) -> "PostgresSession | None":
+        """Raises SessionLeaseHeld if another process has the session connected."""
+        lease = await db.acquire_session_lease(session_name)
+        if lease is None:
+            raise SessionLeaseHeld(f"session {session_name} is in use by another process")
+        try:
+            row = await db.get_telethon_session(session_name)
+        except Exception:
+            await lease.close()
+            raise
+        if not row:
+            await lease.close()
+            return None
+        session = cls(db, session_name, row["api_id"], row["api_hash"])
+        session._lease = lease
+        session._dc_id = row["dc_id"] or 0
+        session._server_address = row["server_address"]
+        session._port = row["port"]
+        session._auth_key = AuthKey(bytes(row["auth_key"])) if row["auth_key"] else None
+        session._takeout_id = row["takeout_id"]
+        session._entities = set(row["entities"])
+        return session
+
+    def process_entities(self, tlo):
+        rows = self._entities_to_rows(tlo)
+        if not rows:
+            return
+        for row in rows:
+            self._unsaved_entities[row[0]] = row
+        self._entities |= set(rows)
+
+    async def save(self):
+        entities, self._unsaved_entities = list(self._unsaved_entities.values()), {}
+        try:
+            await self.db.upsert_telethon_session(
+                self.session_name,
+                self.api_id,
+                self.api_hash,
+                self._dc_id,
+                self._server_address,
+                self._port,
+                self._auth_key.key if self._auth_key else None,
+                self._takeout_id,
+                entities,
+            )
+        except Exception:
+            # Retried on the next save
+            for row in entities:
+                self._unsaved_entities.setdefault(row[0], row)
+            raise
+
+    async def close(self):
+        try:
+            await self.save()
+        finally:
+            await self._release()
+
+    async def delete(self):
+        try:
+            await self.db.delete_telethon_session(self.session_name)
+        finally:
+            await self._release()
+
+    async def _release(self):
+        lease, self._lease = self._lease, None
+        if lease is not None:
+            await lease.close()
+
+
+def read_session_files(session_dir: str, session_name: str) -> dict:
+    """
+    Reads a Telethon .session SQLite file and its .json API credentials into
+    DatabaseController.upsert_telethon_session() keyword arguments.
+    """
+    with open(os.path.join(session_dir, session_name + ".json"), "r") as f:
+        creds = json.load(f)
+    if not creds.get("app_id") or not creds.get("app_hash"):
+        raise ValueError("missing API credentials")
+
+    conn = sqlite3.connect(os.path.join(session_dir, session_name + ".session"))
+    try:
+        row = conn.execute("SELECT dc_id, server_address, port, auth_key, takeout_id FROM sessions").fetchone()
+        if not row:
+            raise ValueError("no auth key")
+        entities = conn.execute("SELECT id, hash, username, phone, name FROM entities").fetchall()
+    finally:
+        conn.close()
+
+    dc_id, server_address, port, auth_key, takeout_id = row
+    return {
+        "session_name": session_name,
+        "api_id": int(creds["app_id"]),
+        "api_hash": creds["app_hash"],
+        "dc_id": dc_id,
+        "server_address": server_address,
+        "port": port,
+        "auth_key": auth_key,
+        "takeout_id": takeout_id,
+        "entities": entities,
+    }
+
+
+async def import_session_files(db, session_dir: str) -> int:
+    """Copies every <name>.session/<name>.json pair in `session_dir` into Postgres. Returns how many were imported."""
+    imported = 0
+    for file_name in sorted(os.listdir(session_dir)):
+        if not file_name.endswith(".session"):
+            continue
+        session_name = file_name[:-len(".session")]
+        try:
+            await db.upsert_telethon_session(**read_session_files(session_dir, session_name))
+        except Exception as e:
+            logger.error(f"Skipping session {session_name}: {e}")
+            continue
+        imported += 1
+        logger.info(f"Imported session {session_name}")
+    return imported
+
+
+async def _cli():
+    import argparse
+    import asyncpg
+
+    from controllers.db_controller import DatabaseController
+    from controllers.db_instrumentation import InstrumentedPool
+    from utils.telegram_helpers import SESSION_DIR
+
+    parser = argparse.ArgumentParser(description="Copy Telethon session files into Postgres (SESSION_STORAGE=postgres).")
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("session_dir", nargs="?", default=SESSION_DIR, help=f"Directory of .session/.json pairs (default: {SESSION_DIR})")
+    args = parser.parse_args()
+
+    db = DatabaseController(bot=None)
+    db.pool = InstrumentedPool(await asyncpg.create_pool(**{**db.config, "min_size": 1, "max_size": 2}))
+    try:
+        imported = await import_session_files(db, args.session_dir)
+        print(f"Imported {imported} session(s)")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_cli())
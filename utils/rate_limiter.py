@@ -0,0 +1,101 @@
+import time
+from collections import deque
+
+ALLOW = "allow"
+DROP = "drop"
+MUTE = "mute"
+
+
+class SlidingWindowLimiter:
+    """
+    Per-user sliding-window flood control, with a separate limit per kind of
+    message (e.g. text, media, edit).
+
+    Each active user has one bounded deque of timestamps per kind, sized to the
+    mute threshold, so memory per user is fixed. Users with nothing in the
+    last `window` seconds are evicted on a periodic sweep.
+
+    Messages sharing a `group` (a Telegram album's media_group_id) count as one
+    event: the first one is checked, the rest get the same verdict.
+
+    Callers may mark an active user exempt (e.g. an admin is handling them);
+    the flag lives in the user's state and is evicted with it.
+
+    `check()` returns:
+        ALLOW - within the limit
+        DROP  - over the limit, the message should not be stored
+        MUTE  - reached `mute_factor` x the limit; returned once, later
+                messages are DROP until the user goes idle
+    """
+
+    def __init__(self, window: float, limits: dict[str, int], mute_factor: float = 2.0):
+        self.window = window
+        self.limits = limits
+        self.mute_factor = mute_factor
+        self._buckets: dict[int, dict[str, deque[float]]] = {}
+        self._groups: dict[int, dict[str, tuple[float, str]]] = {}  # user_id -> group -> (first seen, verdict)
+        self._muted: set[int] = set()
+        self._exempt: dict[int, bool] = {}
+        self._last_sweep = time.monotonic()
+
+    def check(self, user_id: int, kind: str, group: str | None = None) -> str:
+        now = time.monotonic()
+        if now - self._last_sweep > self.window:
+            self._evict_idle(now)
+
+        if group is not None:
+            groups = self._groups.setdefault(user_id, {})
+            seen = groups.get(group)
+            if seen is not None and seen[0] > now - self.window:
+                return ALLOW if seen[1] == ALLOW else DROP
+            for stale in [g for g, (first_seen, _) in groups.items() if first_seen <= now - self.window]:
+                del groups[stale]
+            verdict = self._check(user_id, kind, now)
+            groups[group] = (now, verdict)
+            return verdict
+        return self._check(user_id, kind, now)
+
+    def _check(self, user_id: int, kind: str, now: float) -> str:
+        limit = self.limits.get(kind)
+        if limit is None:
+            return ALLOW
+        mute_at = max(limit + 1, int(limit * self.mute_factor))
+
+        buckets = self._buckets.setdefault(user_id, {})
+        hits = buckets.get(kind)
+        if hits is None:
+            hits = buckets[kind] = deque(maxlen=mute_at)
+        hits.append(now)
+        while hits[0] <= now - self.window:
+            hits.popleft()
+
+        if len(hits) <= limit:
+            return ALLOW
+        if len(hits) >= mute_at and user_id not in self._muted:
+            self._muted.add(user_id)
+            return MUTE
+        return DROP
+
+    def is_exempt(self, user_id: int) -> bool | None:
+        """The flag last set for an active user, or None if unknown."""
+        return self._exempt.get(user_id)
+
+    def set_exempt(self, user_id: int, exempt: bool):
+        if user_id in self._buckets:
+            self._exempt[user_id] = exempt
+
+    def active_users(self) -> int:
+        return len(self._buckets)
+
+    def _evict_idle(self, now: float):
+        cutoff = now - self.window
+        idle = [
+            user_id for user_id, buckets in self._buckets.items()
+            if all(not hits or hits[-1] <= cutoff for hits in buckets.values())
+        ]
+        for user_id in idle:
+            del self._buckets[user_id]
+            self._groups.pop(user_id, None)
+            self._exempt.pop(user_id, None)
+            self._muted.discard(user_id)
+        self._last_sweep = now
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from telethon.errors import FloodWaitError, UnauthorizedError
+from utils.logger import logger
+
+# Failure kinds, see SessionScheduler.record_failure
+AUTH = "auth"
+CONNECT = "connect"
+ERROR = "error"
+
+
+@dataclass
+class SessionHealth:
+    name: str
+    connect_seconds: float | None = None  # Moving average of successful connects
+    group_count: int = 0
+    failures: int = 0  # Consecutive failures, reset on success
+    quarantined_until: float = 0.0  # time.monotonic()
+    flood_wait_until: float = 0.0
+    last_error: str | None = None
+
+    def available_at(self) -> float:
+        return max(self.quarantined_until, self.flood_wait_until)
+
+
+class SessionScheduler:
+    """
+    Picks the userbot session to create the next support group with.
+
+    Tracks, per session: connect latency, group count,
+    FloodWait deadlines and failures. Failing sessions are quarantined with
+    exponential backoff (auth failures straight for `max_backoff`), so a bad
+    session or proxy isn't connected to and retried on every forward.
+    """
+
+    def __init__(self, group_limit: int, base_backoff: float, max_backoff: float):
+        self.group_limit = group_limit
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.sessions: dict[str, SessionHealth] = {}
+
+    def _health(self, name: str) -> SessionHealth:
+        health = self.sessions.get(name)
+        if health is None:
+            health = self.sessions[name] = SessionHealth(name)
+        return health
+
+    def set_group_counts(self, counts: dict[str, int]):
+        for name, health in self.sessions.items():
+            health.group_count = counts.get(name, 0)
+        for name, count in counts.items():
+            if name and name not in self.sessions:
+                self._health(name).group_count = count
+
+    def candidates(self, names: list[str], excluded: set[str] = frozenset(), ignore_group_limit: bool = False) -> list[str]:
+        """
+        Eligible session names out of `names`, best first. `ignore_group_limit`
+        is for work that doesn't add a group, e.g. reusing a free one.
+        """
+        now = time.monotonic()
+        eligible = []
+        for name in names:
+            health = self._health(name)
+            if name in excluded or health.available_at() > now:
+                continue
+            if health.group_count >= self.group_limit and not ignore_group_limit:
+                continue
+            eligible.append(health)
+        # Sessions not connected to yet count as fast, so each gets tried
+        eligible.sort(key=lambda h: (h.failures, h.connect_seconds or 0.0, h.group_count))
+        return [health.name for health in eligible]
+
+    def next_available_in(self) -> float | None:
+        """Seconds until a quarantined/flood-waiting session under the group limit is usable again."""
+        now = time.monotonic()
+        waits = [
+            health.available_at() - now for health in self.sessions.values()
+            if health.group_count < self.group_limit and health.available_at() > now
+        ]
+        return min(waits) if waits else None
+
+    def record_connect(self, name: str, seconds: float):
+        health = self._health(name)
+        health.connect_seconds = seconds if health.connect_seconds is None else 0.7 * health.connect_seconds + 0.3 * seconds
+
+    def record_success(self, name: str):
+        health = self._health(name)
+        health.failures = 0
+        health.last_error = None
+
+    def record_group_created(self, name: str):
+        self._health(name).group_count += 1
+
+    def record_failure(self, name: str, error: BaseException | str, kind: str | None = None):
+        """
+        Quarantine a session after a failure. FloodWaitError only blocks the
+        session for the requested time; `kind` is inferred from `error` if not given.
+        """
+        health = self._health(name)
+        health.last_error = str(error)
+        if isinstance(error, FloodWaitError):
+            health.flood_wait_until = time.monotonic() + error.seconds
+            logger.warning(f"Session {name} hit FloodWait, unavailable for {error.seconds}s")
+            return
+
+        kind = kind or classify_failure(error)
+        health.failures += 1
+        if kind == AUTH:
+            backoff = self.max_backoff
+        else:
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (health.failures - 1))
+        health.quarantined_until = time.monotonic() + backoff
+        logger.warning(f"Session {name} quarantined for {backoff:.0f}s after {kind} failure #{health.failures}: {error}")
+
+
+def classify_failure(error: BaseException | str) -> str:
+    if isinstance(error, UnauthorizedError):
+        return AUTH
+    # Also covers python-socks ProxyConnectionError / ProxyTimeoutError
+    if isinstance(error, (ConnectionError, OSError, asyncio.TimeoutError)):
+        return CONNECT
+    return ERROR
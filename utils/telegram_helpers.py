@@ -1,111 +1,189 @@
 import os
-import random
 import json
+import time
+import asyncio
+from collections import defaultdict
 from aiogram import Bot
 from telethon import TelegramClient
-from telethon.tl.functions.messages import CreateChatRequest, EditChatAboutRequest, EditChatPhotoRequest, EditChatAdminRequest
-from telethon.tl.types import InputChatUploadedPhoto
+from telethon.tl.types import TypeInputPeer, User
+from telethon.errors import ChatIdInvalidError, ChatNotModifiedError, PeerIdInvalidError
+from telethon.tl.functions.messages import CreateChatRequest, EditChatAboutRequest, EditChatAdminRequest, EditChatTitleRequest
 from keyboards.inline import close_ticket
 from utils.helpers import get_socks5_sticky_proxy, escape_markdown_v1
+from utils.media_registry import set_cached_chat_photo
 from utils.logger import logger
+from utils.pg_session import PostgresSession, SessionLeaseHeld
+from utils.session_scheduler import SessionScheduler, AUTH
 from config.config import Config
 from controllers.db_controller import DatabaseController
 
-async def get_random_available_session(db: DatabaseController, group_limit: int = 45, excluded_session_names: list[str] = None) -> TelegramClient:
+SESSION_DIR = "sessions/narvesensupportbot"
+
+# support_group_ids.created_by of topics created by the bot itself (SUPPORT_ROUTING_MODE=topics)
+TOPIC_CREATOR = "bot"
+
+session_scheduler = SessionScheduler(
+    group_limit=Config.SESSION_GROUP_LIMIT,
+    base_backoff=Config.SESSION_BACKOFF_SECONDS,
+    max_backoff=Config.SESSION_MAX_BACKOFF_SECONDS,
+)
+
+
+# Per session, since access hashes are per account: input entities of the support bot
+# and admin (keyed with their usernames, which come from bot_settings) and get_me()
+_session_entities: dict[tuple[str, str, str], tuple[TypeInputPeer, TypeInputPeer]] = {}
+_session_me: dict[str, User] = {}
+
+
+async def get_session_entities(client: TelegramClient, session_name: str, bot_settings) -> tuple[TypeInputPeer, TypeInputPeer]:
+    """Return (support bot, support admin) input entities for this session, resolving them once."""
+    support_bot_username = bot_settings.get('support_bot_username')
+    if Config.DEVELOPMENT_MODE:
+        admin_username = Config.SUPPORT_ADMIN_USERNAME
+    else:
+        admin_username = bot_settings.get('support_username')
+
+    key = (session_name, support_bot_username, admin_username)
+    entities = _session_entities.get(key)
+    if entities is None:
+        entities = await asyncio.gather(
+            client.get_input_entity(support_bot_username),
+            client.get_input_entity(admin_username),
+        )
+        entities = _session_entities[key] = tuple(entities)
+    return entities
+
+
+async def get_session_me(client: TelegramClient, session_name: str) -> User:
+    me = _session_me.get(session_name)
+    if me is None:
+        me = _session_me[session_name] = await client.get_me()
+    return me
+
+
+async def list_session_names(db: DatabaseController) -> list[str]:
+    """Names of all userbot sessions, from Postgres or SESSION_DIR depending on SESSION_STORAGE."""
+    if Config.SESSION_STORAGE == "postgres":
+        return await db.list_telethon_sessions()
+    return [f[:-len(".session")] for f in os.listdir(SESSION_DIR) if f.endswith(".session")]
+
+
+def creator_key(name: str) -> str:
     """
-    Find a usable Telethon session from the directory that owns fewer than `group_limit` groups,
-    excluding any in the `excluded_session_names` list.
+    support_group_ids.created_by is '+' and the account's phone, while session
+    names may or may not start with '+'; both are compared on this key.
     """
-    excluded_session_names = excluded_session_names or []
-    session_dir = "sessions/narvesensupportbot"
-    session_files = [f for f in os.listdir(session_dir) if f.endswith(".session")]
-    random.shuffle(session_files)
+    return name.strip().lstrip("+")
 
-    for session_file in session_files:
-        session_name = session_file.replace(".session", "")
 
-        if session_name in excluded_session_names:
-            continue
+async def sessions_by_creator_key(db: DatabaseController) -> dict[str, str]:
+    """creator_key -> session name, for mapping created_by values back to sessions."""
+    return {creator_key(name): name for name in await list_session_names(db)}
+
+
+def session_for_creator(created_by: str, sessions: dict[str, str]) -> str:
+    """The session name that created_by refers to (as-is if no such session exists)."""
+    return sessions.get(creator_key(created_by), created_by.strip())
 
-        session_path = os.path.join(session_dir, session_name)
-        json_path = os.path.join(session_dir, session_name + ".json")
 
-        # Load API credentials
+async def open_session(db: DatabaseController, session_name: str) -> TelegramClient:
+    """
+    Build (but don't connect) the Telethon client of a session, from its Postgres row
+    or its .session/.json files. Raises ValueError if the session or its API credentials are missing,
+    and SessionLeaseHeld if another process has the session connected. disconnect() the
+    client when done, which also releases a Postgres session's lease.
+    """
+    proxy = get_socks5_sticky_proxy(session_name)
+    if Config.SESSION_STORAGE == "postgres":
+        session = await PostgresSession.load(db, session_name)
+        if not session:
+            raise ValueError(f"session {session_name} is not in the database")
         try:
-            with open(json_path, "r") as f:
-                json_data = json.load(f)
-                api_id = json_data.get("app_id")
-                api_hash = json_data.get("app_hash")
-                if not api_id or not api_hash:
-                    logger.warning(f"Missing API credentials in {json_path}")
-                    continue
-        except Exception as e:
-            logger.warning(f"Failed to read JSON for session {session_name}: {e}")
-            continue
+            return TelegramClient(session, session.api_id, session.api_hash, proxy=proxy)
+        except Exception:
+            await session.close()
+            raise
+
+    json_path = os.path.join(SESSION_DIR, session_name + ".json")
+    with open(json_path, "r") as f:
+        json_data = json.load(f)
+    api_id = json_data.get("app_id")
+    api_hash = json_data.get("app_hash")
+    if not api_id or not api_hash:
+        raise ValueError(f"missing API credentials in {json_path}")
+    return TelegramClient(os.path.join(SESSION_DIR, session_name), api_id, api_hash, proxy=proxy)
+
 
-        # Check how many groups this session has created
+async def get_available_session(db: DatabaseController, excluded_session_names: list[str] = None) -> tuple[str | None, TelegramClient | None]:
+    """
+    Connect the healthiest usable Telethon session (see utils/session_scheduler.py) that owns
+    fewer than SESSION_GROUP_LIMIT groups, excluding any in the `excluded_session_names` list.
+
+    Returns (session_name, client), or (None, None) if no session is usable right now.
+    """
+    excluded_session_names = set(excluded_session_names or [])
+    sessions = await sessions_by_creator_key(db)
+    group_counts = defaultdict(int)
+    for created_by, count in (await db.count_groups_by_creator()).items():
+        group_counts[session_for_creator(created_by, sessions)] += count
+    session_scheduler.set_group_counts(group_counts)
+
+    for session_name in session_scheduler.candidates(list(sessions.values()), excluded_session_names):
+        # Load the session and its API credentials
         try:
-            group_count = await db.count_of_groups_created_by(session_name)
-            if group_count >= group_limit:
-                logger.info(f"Session {session_name} already created {group_count} groups. Skipping session.")
-                continue
+            client = await open_session(db, session_name)
+        except SessionLeaseHeld as e:
+            logger.info(f"Skipping session {session_name}: {e}")
+            continue
         except Exception as e:
-            logger.error(f"Failed to get group count for session {session_name}: {e}")
+            logger.warning(f"Failed to load session {session_name}: {e}")
+            session_scheduler.record_failure(session_name, e, kind=AUTH)
             continue
 
-        proxy = get_socks5_sticky_proxy(session_name)
-
-        # Initialize and authorize Telethon client
+        # Connect and authorize Telethon client
         try:
-            client = TelegramClient(session_path, api_id, api_hash, proxy=proxy)
             bot_settings = await db.get_bot_settings()
-            support_bot_username = bot_settings.get('support_bot_username')
+            started = time.monotonic()
             await client.connect()
-            await client.get_entity(support_bot_username)
+            session_scheduler.record_connect(session_name, time.monotonic() - started)
+            await get_session_entities(client, session_name, bot_settings)
 
             if not await client.is_user_authorized():
                 logger.warning(f"Session {session_name} is not authorized. Skipping session.")
+                session_scheduler.record_failure(session_name, "not authorized", kind=AUTH)
                 await client.disconnect()
                 continue
 
-            logger.info(f"Using session {session_name} ({group_count} existing groups)")
-            return client
+            logger.info(f"Using session {session_name} ({session_scheduler.sessions[session_name].group_count} existing groups)")
+            return session_name, client
 
         except Exception as e:
             logger.error(f"Failed to initialize or connect session {session_name}: {e}")
+            session_scheduler.record_failure(session_name, e)
             await client.disconnect()
             continue
 
-    logger.error("FAILED TO RETRIEVE AVAILABLE SESSION - ALL SESSIONS HAVE GROUP LIMIT REACHED OR BANNED")
-    return None
-
+    retry_in = session_scheduler.next_available_in()
+    logger.error(
+        "FAILED TO RETRIEVE AVAILABLE SESSION - ALL SESSIONS HAVE GROUP LIMIT REACHED, BANNED OR QUARANTINED"
+        + (f" (next one usable in {retry_in:.0f}s)" if retry_in is not None else "")
+    )
+    return None, None
 
-async def retrieve_session(session_name):
-    session_dir = "sessions/narvesensupportbot"
-    session_path = os.path.join(session_dir, session_name)
-    json_path = os.path.join(session_dir, session_name + ".json")
 
-    if not os.path.exists(json_path):
-        logger.warning(f"[Cleanup] JSON file missing for {session_name}")
+async def retrieve_session(db: DatabaseController, session_name):
+    if not get_socks5_sticky_proxy(session_name):
+        logger.warning(f"[Cleanup] Unable to retrieve proxy for {session_name}")
         return None
 
-    with open(json_path, "r") as f:
-        creds = json.load(f)
-        api_id = creds.get("app_id")
-        api_hash = creds.get("app_hash")
-
-    if not api_id or not api_hash:
-        logger.warning(f"[Cleanup] Incomplete credentials for {session_name}")
-        return None
-    
-    proxy = get_socks5_sticky_proxy(session_name)
-    if not proxy:
-        logger.warning(f"[Cleanup] Unable to retrieve proxy for {session_name}")
+    try:
+        client = await open_session(db, session_name)
+    except Exception as e:
+        logger.warning(f"[Cleanup] Failed to load session {session_name}: {e}")
         return None
 
-    # Initialize and authorize Telethon client
+    # Connect and authorize Telethon client
     try:
-        client = TelegramClient(session_path, api_id, api_hash, proxy=proxy)
         await client.connect()
         if not await client.is_user_authorized():
             logger.warning(f"[Cleanup] Session {session_name} is not authorized.")
@@ -116,44 +194,107 @@ async def retrieve_session(session_name):
         return client
     except Exception as e:
         logger.error(f"[Cleanup] Failed to initialize or connect session {session_name}: {e}")
-        if client:
-            await client.disconnect()
+        await client.disconnect()
         return None
     
+def chat_title(user) -> str:
+    """The user's full name as a group/topic title (at most 128 characters), or their ID if they have none."""
+    first_name = user.get("first_name") or ""
+    last_name = user.get("last_name")
+    return (first_name + (" " + last_name if last_name else "")).strip()[:128] or str(user.get("user_id"))
+
+
+async def reuse_free_group(db: DatabaseController, user) -> int | None:
+    """
+    Reassign a group freed by the nightly cleanup (GROUP_RECYCLING) to the user
+    by retitling it and pointing its description at them. Free groups that no
+    longer exist on Telegram are dropped and the next one is tried. Returns
+    its ID, or None if no free group could be reused.
+    """
+    user_id = user.get("user_id")
+    group_name = chat_title(user)
+
+    names = await sessions_by_creator_key(db)
+    sessions = {creator_key(name): name for name in session_scheduler.candidates(list(names.values()), ignore_group_limit=True)}
+    while sessions:
+        claimed = await db.claim_free_support_group(user_id, list(sessions))
+        if not claimed:
+            return None
+        group_id, created_by = claimed
+        session_name = session_for_creator(created_by, sessions)
+
+        client = None
+        try:
+            client = await retrieve_session(db, session_name)
+            if not client:
+                raise ConnectionError(f"could not connect session {session_name}")
+            for request in (
+                EditChatTitleRequest(chat_id=abs(group_id), title=group_name),
+                EditChatAboutRequest(peer=group_id, about=str(user_id)),
+            ):
+                try:
+                    await client(request)
+                except ChatNotModifiedError:
+                    pass
+            session_scheduler.record_success(session_name)
+            logger.info(f"Reused free group {group_id} of {session_name} for user {user_id}")
+            return group_id
+
+        except (ChatIdInvalidError, PeerIdInvalidError):
+            logger.warning(f"Free group {group_id} no longer exists on Telegram, dropping it")
+            try:
+                await db.delete_support_group(user_id)
+            except Exception as e:
+                # The caller creates a fresh group, which replaces this row
+                logger.error(f"Failed to drop free group {group_id}: {e}")
+                return None
+        except Exception as e:
+            logger.error(f"Failed to reuse free group {group_id} for user {user_id}: {e}")
+            # Back to the pool; the session is quarantined meanwhile, so it isn't claimed again right away
+            session_scheduler.record_failure(session_name, e)
+            sessions.pop(creator_key(created_by), None)
+            try:
+                await db.free_support_group(user_id)
+            except Exception as free_error:
+                logger.error(f"Failed to release free group {group_id}: {free_error}")
+                return None
+        finally:
+            if client:
+                await client.disconnect()
+    return None
+
+
 async def create_user_group(db: DatabaseController, bot: Bot, user) -> int:
-    """Create a user group and return its ID."""
-    session_dir = "sessions/narvesensupportbot"
-    session_files = [f for f in os.listdir(session_dir) if f.endswith(".session")]
+    """Create a user group (or, with GROUP_RECYCLING, reuse a free one) and return its ID."""
+    if Config.GROUP_RECYCLING:
+        group_id = await reuse_free_group(db, user)
+        if group_id:
+            return group_id
+
     excluded_sessions = []
-    max_retries = len(session_files)
+    max_retries = len(await list_session_names(db))
 
     user_id = user.get("user_id")
-    first_name = user.get("first_name")
-    last_name = user.get("last_name")
-    group_name = first_name + (" " + last_name if last_name else "")
+    group_name = chat_title(user)
 
     for attempt in range(max_retries):
         client = None
+        session_name = None
         try:
-            client = await get_random_available_session(
+            session_name, client = await get_available_session(
                 db,
                 excluded_session_names=excluded_sessions
             )
             if not client:
-                raise RuntimeError("No suitable session found.")
+                # Every session is excluded, quarantined or full, further attempts would fail the same way
+                logger.error(f"[Attempt {attempt + 1}] No suitable session found for user {user_id}")
+                break
 
             if not client.is_connected():
                 await client.start()
 
             bot_settings = await db.get_bot_settings()
-            support_bot_username = bot_settings.get('support_bot_username')
-            bot_entity = await client.get_entity(support_bot_username)
-
-            if Config.DEVELOPMENT_MODE:
-                admin_entity = await client.get_entity(Config.SUPPORT_ADMIN_USERNAME)
-            else:
-                support_username = bot_settings.get('support_username')
-                admin_entity = await client.get_entity(support_username)
+            bot_entity, admin_entity = await get_session_entities(client, session_name, bot_settings)
 
             if not bot_entity or not admin_entity:
                 raise ValueError("Failed to retrieve bot or admin entity.")
@@ -163,8 +304,8 @@ async def create_user_group(db: DatabaseController, bot: Bot, user) -> int:
                 users=[bot_entity, admin_entity],
                 title=group_name
             ))
-            group_id = -result.updates.chats[0].id
-            group_entity = await client.get_entity(group_id)
+            chat_id = result.updates.chats[0].id
+            group_id = -chat_id
 
             # SET GROUP DESCRIPTION
             try:
@@ -178,50 +319,54 @@ async def create_user_group(db: DatabaseController, bot: Bot, user) -> int:
                 # ⛔ Retry required if this fails
                 raise e
 
-            me = await client.get_me()
+            me = await get_session_me(client, session_name)
             created_by = '+' + me.phone
-            await db.set_user_group_id(user_id, group_id, created_by)
-            logger.info(f"Created new group '{group_name}' for user {user_id}")
 
             # OPTIONAL: Promote admin
-            try:
-                await client(EditChatAdminRequest(
-                    chat_id=group_entity.id,
-                    user_id=admin_entity,
-                    is_admin=True
-                ))
-                logger.info(f"Promoted admin to group: {admin_entity.id}")
-            except Exception as e:
-                logger.warning(f"Failed to promote admin: {e}")
+            async def promote_admin():
+                try:
+                    await client(EditChatAdminRequest(
+                        chat_id=chat_id,
+                        user_id=admin_entity,
+                        is_admin=True
+                    ))
+                    logger.info(f"Promoted admin to group: {group_id}")
+                except Exception as e:
+                    logger.warning(f"Failed to promote admin: {e}")
 
             # OPTIONAL: Set group photo
-            try:
-                photo_path = "data/warning.jpg"
-                if os.path.exists(photo_path):
-                    uploaded_file = await client.upload_file(photo_path)
-                    input_photo = InputChatUploadedPhoto(uploaded_file)
-                    await client(EditChatPhotoRequest(
-                        chat_id=group_entity.id,
-                        photo=input_photo
-                    ))
-                    logger.info("Set group profile picture.")
-                else:
-                    logger.warning(f"Photo not found: {photo_path}")
-            except Exception as e:
-                logger.warning(f"Failed to set group profile picture: {e}")
+            async def set_photo():
+                try:
+                    photo_path = "data/warning.jpg"
+                    if os.path.exists(photo_path):
+                        await set_cached_chat_photo(db, client, created_by, chat_id, photo_path)
+                        logger.info("Set group profile picture.")
+                    else:
+                        logger.warning(f"Photo not found: {photo_path}")
+                except Exception as e:
+                    logger.warning(f"Failed to set group profile picture: {e}")
+
+            # Independent of each other once the description is set
+            saved, _, _ = await asyncio.gather(
+                db.set_user_group_id(user_id, group_id, created_by),
+                promote_admin(),
+                set_photo(),
+                return_exceptions=True,
+            )
+            if isinstance(saved, Exception):
+                raise saved
+            session_scheduler.record_success(session_name)
+            session_scheduler.record_group_created(session_name)
+            logger.info(f"Created new group '{group_name}' for user {user_id}")
 
             # Success, no need to retry further
             return group_id
 
         except Exception as e:
             logger.error(f"[Attempt {attempt + 1}] Failed to create group for user {user_id}: {e}")
-            if client:
-                try:
-                    me = await client.get_me()
-                    session_name = '+' + me.phone
-                    excluded_sessions.append(session_name)
-                except Exception as ex:
-                    logger.warning(f"Could not retrieve session name to exclude: {ex}")
+            if session_name:
+                session_scheduler.record_failure(session_name, e)
+                excluded_sessions.append(session_name)
             continue
 
         finally:
@@ -243,7 +388,7 @@ async def create_user_group(db: DatabaseController, bot: Bot, user) -> int:
     )
 
 
-async def ask(db: DatabaseController, bot: Bot, user_id: int, group_id: int):
+async def ask(db: DatabaseController, bot: Bot, user_id: int, group_id: int, thread_id: int = None):
     """Handle automatic /ask for user when he writes for the first time, splitting response if over 4096 chars."""
     try:
         group_id = group_id 
@@ -254,7 +399,7 @@ async def ask(db: DatabaseController, bot: Bot, user_id: int, group_id: int):
         )
 
         if not result or not result.get("user"):
-            await bot.send_message(group_id, "ERROR: User not found in database.")
+            await bot.send_message(group_id, "ERROR: User not found in database.", message_thread_id=thread_id)
             return
 
         user = result["user"]
@@ -327,14 +472,14 @@ async def ask(db: DatabaseController, bot: Bot, user_id: int, group_id: int):
         max_length = 4096
 
         if len(full_response) <= max_length:
-            await bot.send_message(group_id, full_response, parse_mode="Markdown")
+            await bot.send_message(group_id, full_response, parse_mode="Markdown", message_thread_id=thread_id)
         else:
             # Try splitting: user info + summary in part 1, drops table in part 2
             part1 = user_info + summary
             part2 = drops_table
             if len(part1) < max_length and len(part2) < max_length:
-                await bot.send_message(group_id, f"Part 1/2\n{part1}", parse_mode="Markdown")
-                await bot.send_message(group_id, f"Part 2/2\n{part2}", parse_mode="Markdown")
+                await bot.send_message(group_id, f"Part 1/2\n{part1}", parse_mode="Markdown", message_thread_id=thread_id)
+                await bot.send_message(group_id, f"Part 2/2\n{part2}", parse_mode="Markdown", message_thread_id=thread_id)
             else:
                 # Split drops table
                 table_header = (
@@ -380,13 +525,13 @@ async def ask(db: DatabaseController, bot: Bot, user_id: int, group_id: int):
                         + table_footer
                         + summary
                     )
-                    await bot.send_message(group_id, f"Part 1/2\n{part1}", parse_mode="Markdown")
+                    await bot.send_message(group_id, f"Part 1/2\n{part1}", parse_mode="Markdown", message_thread_id=thread_id)
                 if part2_rows:
                     part2 = table_header + "".join(part2_rows) + table_footer + summary
-                    await bot.send_message(group_id, f"Part 2/2\n{part2}", parse_mode="Markdown")
+                    await bot.send_message(group_id, f"Part 2/2\n{part2}", parse_mode="Markdown", message_thread_id=thread_id)
 
     except Exception as e:
-        await bot.send_message(group_id, "An error occurred while retrieving user data.")
+        await bot.send_message(group_id, "An error occurred while retrieving user data.", message_thread_id=thread_id)
         logger.error(f"Error processing /ask for {user_id}: {e}")
 
 async def is_message_deleted(bot: Bot, chat_id: int, message_id: int) -> bool:
@@ -413,53 +558,83 @@ async def is_message_deleted(bot: Bot, chat_id: int, message_id: int) -> bool:
             logger.error(f"Error in is_message_deleted: {e}")
             return False
         
-async def forward_ticket_to_admin(db: DatabaseController, bot: Bot, user, ticket, lang): # DO NOT edit these params
+async def create_user_topic(db: DatabaseController, bot: Bot, user) -> tuple[int, int] | None:
+    """Create the user's topic in the forum supergroup (SUPPORT_ROUTING_MODE=topics) and return (chat id, thread id)."""
+    user_id = user.get("user_id")
+    topic_name = chat_title(user)
+
     try:
-        # Check if a private group exists for this user
-        user_group_id = None
-        user_id = user.get('user_id')
-        user_group_id = await db.get_user_group_id(user_id)
+        topic = await bot.create_forum_topic(Config.SUPPORT_FORUM_CHAT_ID, name=topic_name)
+        await db.set_user_group_id(user_id, Config.SUPPORT_FORUM_CHAT_ID, TOPIC_CREATOR, topic.message_thread_id)
+        logger.info(f"Created topic '{topic_name}' ({topic.message_thread_id}) for user {user_id}")
+        return Config.SUPPORT_FORUM_CHAT_ID, topic.message_thread_id
+    except Exception as e:
+        logger.error(f"Failed to create topic for user {user_id}: {e}")
+        return None
 
 
-        if not user_group_id:
-            
+async def get_or_create_user_chat(db: DatabaseController, bot: Bot, user) -> tuple[int, int | None] | None:
+    """
+    Return (chat id, thread id) of the user's admin conversation, creating it
+    if needed: a topic in topics mode, otherwise a userbot-created group (thread id None).
+    """
+    user_chat = await db.get_user_chat(user.get('user_id'))
+    if user_chat:
+        return user_chat
+    if Config.SUPPORT_ROUTING_MODE == "topics":
+        return await create_user_topic(db, bot, user)
+    user_group_id = await create_user_group(db, bot, user)
+    return (user_group_id, None) if user_group_id else None
+
 
-            user_group_id = await create_user_group(db, bot, user)
+async def forward_ticket_to_admin(db: DatabaseController, bot: Bot, user, ticket, lang): # DO NOT edit these params
+    user_group_id = None
+    thread_id = None
+    try:
+        # Check if a private group (or topic) exists for this user
+        user_id = user.get('user_id')
+        user_chat = await get_or_create_user_chat(db, bot, user)
+        if user_chat:
+            user_group_id, thread_id = user_chat
 
         if user_group_id:
-            await db.set_messages_forwarded_for_ticket(ticket.get('ticket_id'))
-            ticket = await db.get_ticket(ticket.get('ticket_id'))
+            ticket = await db.transition_ticket(ticket.ticket_id, forwarded=True)
             # Call a /ask at the start of ticket
-            await ask(db, bot, user_id, user_group_id)
+            await ask(db, bot, user_id, user_group_id, thread_id)
 
-            # Forward all user sent messages to the target group
-            messages = ticket.get("messages", [])
-            messages = sorted(messages, key=lambda msg: msg.get("created_at"))
+            # Forward all user sent messages to the target group (already in chat order)
+            messages = ticket.messages
 
             await bot.send_message(
                 user_group_id,
-                f"<b>Ticket topic:</b> '{ticket.get("support_issue", "Unknown")}'\n\nNOTE: You can't edit or delete the messages you send to user",
+                f"<b>Ticket topic:</b> '{ticket.support_issue or "Unknown"}'\n\nNOTE: You can't edit or delete the messages you send to user",
                 parse_mode="HTML",
-                reply_markup=close_ticket(ticket.get("ticket_id"))
+                reply_markup=close_ticket(ticket.ticket_id),
+                message_thread_id=thread_id
             )
 
+            forwarded = [] # (message_id, forwarded_message_id), so edits can reply to the copy
             for msg in messages: 
-                msg_id = msg.get("message_id")
-                is_deleted = msg.get("is_deleted")
+                msg_id = msg.message_id
+                is_deleted = msg.is_deleted
                 if not is_deleted:
                     try:
-                        await bot.forward_message(
+                        sent = await bot.forward_message(
                             chat_id=user_group_id,
                             from_chat_id=user_id,
                             message_id=msg_id,
+                            message_thread_id=thread_id,
                         )
+                        forwarded.append((msg_id, sent.message_id))
                     except Exception as e:
                         logger.error(f"Failed to forward message {msg_id} from user {user_id}: {e}")
                 else:
                     await bot.send_message(
                         chat_id=user_group_id,
-                        text=f"(DELETED MESSAGE)\n{msg.get("user_text")}"
+                        text=f"(DELETED MESSAGE)\n{msg.user_text}",
+                        message_thread_id=thread_id
                     )
+            await db.set_forwarded_message_ids(user_id, forwarded)
         else:
             logger.error("Error sending messages")
         
@@ -470,5 +645,6 @@ async def forward_ticket_to_admin(db: DatabaseController, bot: Bot, user, ticket
         logger.error(f"Error making the group or forwarding the messages to group: {e}")
         await bot.send_message(
             chat_id=user_group_id,
-            text=f"ERROR FORWARDING USER TICKET TO THIS GROUP:\n{e}"
+            text=f"ERROR FORWARDING USER TICKET TO THIS GROUP:\n{e}",
+            message_thread_id=thread_id
         )
\ No newline at end of file
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import re
+from utils.helpers import query_nano_gpt, llm_breaker
+from utils.llm_profiles import OutputProfile, lang_category, json_array_of
+from utils.logger import logger
+
+
+class TicketClassifier:
+    """
+    Micro-batching lang/category classifier for support tickets.
+
+    `classify()` calls that arrive within `max_wait` seconds of each other are
+    sent as one prompt (up to `max_batch` tickets) that asks for a JSON array
+    of {ticket_id, lang, category}. A lone ticket uses the single-ticket
+    `lang:category` prompt. Batch entries that are missing or invalid are
+    retried individually, so one bad entry doesn't fail the whole batch.
+    """
+
+    def __init__(self, categories: list[str], languages: list[str], max_batch: int, max_wait: float):
+        self.categories = list(categories)
+        self.languages = list(languages)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._single_profile = OutputProfile(stop=("\n",), validator=lang_category(self.languages, self.categories))
+        self._pending: list[tuple[int, str, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+
+    async def classify(self, ticket_id: int, text: str) -> tuple[str, str] | None:
+        """
+        Returns (lang, category), with values outside the allowed lists
+        replaced by 'other', or None if the model gave no usable answer.
+        """
+        if llm_breaker.is_open:
+            return None  # don't hold the ticket for a batch that would be rejected anyway
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((ticket_id, text, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def close(self):
+        """Cancel queued and in-flight batches; their callers get None."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        for _, _, future in batch:
+            _resolve(future, None)
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run_batch(self, batch: list[tuple[int, str, asyncio.Future]]):
+        try:
+            if len(batch) == 1:
+                ticket_id, text, future = batch[0]
+                _resolve(future, await self._classify_one(ticket_id, text))
+                return
+
+            results = await self._classify_many([(ticket_id, text) for ticket_id, text, _ in batch])
+            if results is None:
+                # Request failed outright; retrying each ticket would only multiply the load
+                for _, _, future in batch:
+                    _resolve(future, None)
+                return
+
+            retry = [(ticket_id, text, future) for ticket_id, text, future in batch if ticket_id not in results]
+            for ticket_id, _, future in batch:
+                if ticket_id in results:
+                    _resolve(future, results[ticket_id])
+            if retry:
+                logger.warning(f"Batch classification missing {len(retry)}/{len(batch)} tickets, retrying individually")
+                await asyncio.gather(*(self._retry_one(*entry) for entry in retry))
+        except Exception as e:
+            logger.error(f"Ticket classification batch failed: {e}")
+        finally:
+            # Also on cancellation, so no caller waits forever
+            for _, _, future in batch:
+                _resolve(future, None)
+
+    async def _retry_one(self, ticket_id: int, text: str, future: asyncio.Future):
+        _resolve(future, await self._classify_one(ticket_id, text))
+
+    async def _classify_one(self, ticket_id: int, text: str) -> tuple[str, str] | None:
+        categories = "\n".join(self.categories)
+        prompt = f"""
+Classify the following user messages into:
+
+1. One of the following **categories**:
+\"\"\"{categories}\"\"\"
+
+2. One of the following **languages**:
+{", ".join(self.languages)}
+
+If you are not more than 80% confident about either the category or the language, use 'other'.
+
+User messages:
+\"\"\"{text}\"\"\"
+
+Respond **only** in this format (no extra explanation):
+lang:category
+"""
+        response = await query_nano_gpt(prompt, call_site="categorise_ticket", profile=self._single_profile)
+        if not response or ':' not in response:
+            logger.warning(f"Unexpected format from GPT for ticket {ticket_id}: '{response}'")
+            return None
+        lang, category = response.strip().split(':', 1)
+        return self._normalise(lang, category)
+
+    async def _classify_many(self, tickets: list[tuple[int, str]]) -> dict[int, tuple[str, str]] | None:
+        """Returns the valid entries by ticket_id, or None if the request itself failed."""
+        tickets_json = json.dumps(
+            [{"ticket_id": ticket_id, "messages": text} for ticket_id, text in tickets],
+            ensure_ascii=False,
+        )
+        categories = "\n".join(self.categories)
+        prompt = f"""
+Classify each of the following support tickets into:
+
+1. One of the following **categories**:
+\"\"\"{categories}\"\"\"
+
+2. One of the following **languages**:
+{", ".join(self.languages)}
+
+If you are not more than 80% confident about either the category or the language of a ticket, use 'other'.
+
+Tickets:
+{tickets_json}
+
+Respond **only** with a JSON array with one object per ticket (no extra explanation):
+[{{"ticket_id": <ticket_id>, "lang": "<language>", "category": "<category>"}}]
+"""
+        # The usual reasoning budget plus roughly 40 tokens per entry
+        profile = OutputProfile(max_tokens=1000 + 40 * len(tickets), validator=json_array_of(len(tickets)))
+        response = await query_nano_gpt(prompt, call_site="categorise_batch", profile=profile)
+        if response is None:
+            return None
+
+        wanted = {ticket_id for ticket_id, _ in tickets}
+        results = {}
+        for entry in _parse_json_array(response):
+            if not isinstance(entry, dict):
+                continue
+            try:
+                ticket_id = int(entry.get("ticket_id"))
+            except (TypeError, ValueError):
+                continue
+            lang, category = entry.get("lang"), entry.get("category")
+            if ticket_id in wanted and isinstance(lang, str) and isinstance(category, str):
+                results[ticket_id] = self._normalise(lang, category)
+        return results
+
+    def _normalise(self, lang: str, category: str) -> tuple[str, str]:
+        lang = lang.strip().lower()
+        category = category.strip()
+        return (
+            lang if lang in self.languages else 'other',
+            category if category in self.categories else 'other',
+        )
+
+
+def _parse_json_array(response: str) -> list:
+    # Models sometimes wrap JSON in ``` fences or add a sentence around it
+    match = re.search(r"\[.*\]", response, re.S)
+    if not match:
+        logger.warning(f"Batch classification response is not a JSON array: '{response[:200]}'")
+        return []
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        logger.warning(f"Could not parse batch classification response: {e}")
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def _resolve(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)